@@ -2,6 +2,10 @@ from rest_framework import generics, status
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from django.contrib.auth.models import User
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.views import TokenObtainPairView
+from cart.guest import merge_guest_cart
+from ecommerce_api.pagination import OptionalCursorPagination
 from .serializers import UserSerializer, UserRegistrationSerializer
 
 
@@ -48,6 +52,29 @@ class UserListView(generics.ListAPIView):
     """
     Admin-only endpoint to view all registered users.
     """
-    queryset = User.objects.all()
+    queryset = User.objects.order_by('id')
     serializer_class = UserSerializer
     permission_classes = [IsAuthenticated]  # Optionally restrict to admin
+
+    # ?pagination=cursor → keyset pagination on the primary key
+    pagination_class = OptionalCursorPagination
+    cursor_ordering_fields = ['id']
+
+
+
+class CartMergeTokenObtainPairView(TokenObtainPairView):
+    """
+    JWT login (POST /api/token/) that also moves the visitor's
+    guest cart, sent in the X-Cart-Token header, into the user's
+    cart with one upsert.
+    """
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        try:
+            serializer.is_valid(raise_exception=True)
+        except TokenError as exc:
+            raise InvalidToken(exc.args[0])
+
+        merge_guest_cart(request, serializer.user)
+        return Response(serializer.validated_data, status=status.HTTP_200_OK)
@@ -23,13 +23,18 @@ class CartAdmin(admin.ModelAdmin):
         'user',
         'total_items',
         'total_price',
-        'created_at'
+        'created_at',
+        'last_activity'
     ]
 
     inlines = [CartItemInline]  # Embed CartItems in Cart page
 
+    def get_queryset(self, request):
+        # Totals in the list query, not two queries per row
+        return super().get_queryset(request).with_totals()
+
     readonly_fields = [
-        'total_items', 'total_price', 'created_at'
+        'total_items', 'total_price', 'created_at', 'last_activity'
     ]
 
 
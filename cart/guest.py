@@ -0,0 +1,126 @@
+import re
+import secrets
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .operations import (
+    CartBatchError, InsufficientStock, fold_operations, merge_items,
+    on_user_cart, purchasable_stock, referenced_products,
+)
+from products.models import Product
+
+
+# Request/response header carrying the guest cart token
+TOKEN_HEADER = 'X-Cart-Token'
+
+GUEST_CART_KEY = 'guest-cart:{token}'
+
+# Defaults for settings.GUEST_CART_TIMEOUT / GUEST_CART_MAX_LINES
+DEFAULT_TIMEOUT = 60 * 60 * 24 * 7
+DEFAULT_MAX_LINES = 100
+
+TOKEN_PATTERN = re.compile(r'^[A-Za-z0-9_-]{20,64}$')
+
+
+def new_token():
+    return secrets.token_urlsafe(24)
+
+
+def request_token(request):
+    """
+    The guest cart token sent with the request, or None
+    (also for anything that does not look like one of our tokens).
+    """
+    token = request.headers.get(TOKEN_HEADER, '')
+    return token if TOKEN_PATTERN.match(token) else None
+
+
+class GuestCart:
+    """
+    Cart of an anonymous visitor, kept in the cache (never in the
+    database) under an opaque token the client sends back in the
+    X-Cart-Token header.
+
+    The stored value is only {product_id: quantity}; product data is
+    read when the cart is displayed. Every write refreshes the TTL
+    (settings.GUEST_CART_TIMEOUT), so abandoned carts expire on their
+    own. On login the lines are merged into the user's Cart with
+    merge_guest_cart().
+    """
+
+    def __init__(self, token=None, quantities=None):
+        self.token = token
+        self.quantities = quantities or {}
+
+    @classmethod
+    def load(cls, token):
+        """
+        The cart stored under `token`; an empty, unsaved cart
+        if there is none (or it expired).
+        """
+        if token is None:
+            return cls()
+        return cls(token, cache.get(GUEST_CART_KEY.format(token=token)))
+
+    @property
+    def timeout(self):
+        return getattr(settings, 'GUEST_CART_TIMEOUT', DEFAULT_TIMEOUT)
+
+    @property
+    def max_lines(self):
+        return getattr(settings, 'GUEST_CART_MAX_LINES', DEFAULT_MAX_LINES)
+
+    def save(self):
+        if self.token is None:
+            self.token = new_token()
+        cache.set(GUEST_CART_KEY.format(token=self.token), self.quantities, self.timeout)
+
+    def clear(self):
+        self.quantities = {}
+        if self.token is not None:
+            cache.delete(GUEST_CART_KEY.format(token=self.token))
+
+    # Same rules and errors as the database cart operations
+
+    def add(self, product_id, quantity):
+        """
+        Raises Product.DoesNotExist or InsufficientStock, like add_item().
+        """
+        stock = purchasable_stock([product_id])
+        if product_id not in stock:
+            raise Product.DoesNotExist(f"Product {product_id} does not exist.")
+
+        in_cart = self.quantities.get(product_id, 0)
+        if in_cart + quantity > stock[product_id]:
+            raise InsufficientStock(product_id, max(stock[product_id] - in_cart, 0), in_cart)
+
+        self.set_quantities({**self.quantities, product_id: in_cart + quantity})
+
+    def apply_batch(self, operations):
+        """
+        Raises CartBatchError, like apply_batch(); cart item ids
+        do not exist in a guest cart.
+        """
+        stock = purchasable_stock(referenced_products(operations))
+        self.set_quantities(fold_operations(self.quantities, operations, stock))
+
+    def set_quantities(self, quantities):
+        quantities = {pk: quantity for pk, quantity in quantities.items() if quantity}
+        if len(quantities) > self.max_lines:
+            raise CartBatchError([{'error': f"A guest cart holds at most {self.max_lines} products."}])
+        self.quantities = quantities
+        self.save()
+
+
+def merge_guest_cart(request, user):
+    """
+    Moves the guest cart of this request (if any) into the user's
+    cart with one upsert, then drops it from the cache.
+    """
+    guest_cart = GuestCart.load(request_token(request))
+    if not guest_cart.quantities:
+        return 0
+    merged = on_user_cart(user, merge_items, guest_cart.quantities)
+    guest_cart.clear()
+    return merged
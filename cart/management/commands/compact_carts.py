@@ -0,0 +1,76 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from cart.models import Cart, CartItem
+
+
+DEFAULT_MAX_AGE_DAYS = 30
+
+
+class Command(BaseCommand):
+    """
+    Deletes carts (and their items) with no activity for longer
+    than --days (default settings.CART_RETENTION_DAYS).
+
+    Works through the cart table in primary-key ranges of
+    --batch-size ids, one short transaction per range, so no
+    table is locked for long and the job can run while the
+    shop is live. Safe to interrupt and re-run.
+
+    Usage:
+        python manage.py compact_carts
+        python manage.py compact_carts --days 90 --batch-size 5000
+        python manage.py compact_carts --dry-run
+    """
+    help = "Delete carts inactive for longer than the retention period."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int,
+            default=getattr(settings, 'CART_RETENTION_DAYS', DEFAULT_MAX_AGE_DAYS),
+            help="Delete carts inactive for more than this many days"
+        )
+        parser.add_argument('--batch-size', type=int, default=1000, help="Cart ids per range")
+        parser.add_argument('--dry-run', action='store_true', help="Only count what would be deleted")
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        batch_size = options['batch_size']
+        started = time.monotonic()
+
+        bounds = Cart.objects.aggregate(low=Min('id'), high=Max('id'))
+        carts = items = 0
+
+        if bounds['low'] is not None:
+            for start in range(bounds['low'], bounds['high'] + 1, batch_size):
+                stale = Cart.objects.filter(
+                    id__gte=start, id__lt=start + batch_size, last_activity__lt=cutoff
+                )
+                if options['dry_run']:
+                    carts += stale.count()
+                    items += CartItem.objects.filter(cart__in=stale).count()
+                    continue
+
+                with transaction.atomic():
+                    _, deleted = stale.delete()
+                carts += deleted.get(Cart._meta.label, 0)
+                items += deleted.get(CartItem._meta.label, 0)
+
+                if options['verbosity'] > 1:
+                    self.stdout.write(f"ids {start}–{start + batch_size - 1}: {carts} carts so far")
+
+        elapsed = time.monotonic() - started
+        rows = carts + items
+        rate = f"{rows / elapsed:.0f}" if elapsed else "n/a"
+        verb = "Would delete" if options['dry_run'] else "Deleted"
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {carts} carts and {items} cart items inactive since "
+            f"{cutoff:%Y-%m-%d %H:%M} in {elapsed:.2f}s ({rate} rows/s)."
+        ))
@@ -0,0 +1,28 @@
+# Generated by Django 6.0 on 2026-10-18 06:20
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import F
+
+
+def set_last_activity(apps, schema_editor):
+    # No earlier activity is known: start from the creation time,
+    # so old carts are not all treated as just used
+    Cart = apps.get_model('cart', 'Cart')
+    Cart.objects.update(last_activity=F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cart', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cart',
+            name='last_activity',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+        migrations.RunPython(set_last_activity, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,36 @@
+from decimal import Decimal
+
 from django.db import models
+from django.db.models import Count, DecimalField, F, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 from django.contrib.auth.models import User
 from products.models import Product
 
+
+# Output type of quantity × price sums
+PRICE_FIELD = DecimalField(max_digits=12, decimal_places=2)
+
+
+class CartQuerySet(models.QuerySet):
+
+    def with_totals(self):
+        """
+        Annotates the cart totals, computed by the database
+        in the same query as the cart row:
+        - annotated_total_items → number of cart lines
+        - annotated_total_price → SUM(quantity × product price)
+        """
+        return self.annotate(
+            annotated_total_items=Count('items'),
+            annotated_total_price=Coalesce(
+                Sum(F('items__quantity') * F('items__product__price'), output_field=PRICE_FIELD),
+                Value(Decimal('0')),
+                output_field=PRICE_FIELD,
+            ),
+        )
+
+
 class Cart(models.Model):
     """
     A shopping cart belongs to a single user.
@@ -10,19 +39,40 @@ class Cart(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='cart')
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # Last write through the cart endpoints, updated at most once per
+    # CART_ACTIVITY_INTERVAL (see cart.operations.touch_cart).
+    # compact_carts deletes carts inactive for too long.
+    last_activity = models.DateTimeField(default=timezone.now, db_index=True)
+
+    objects = CartQuerySet.as_manager()
+
     def __str__(self):
         return f"{self.user.username}'s Cart"
 
     @property
     def total_items(self):
-        return self.items.count()
+        """
+        Uses the with_totals() annotation when present,
+        otherwise counts with one query.
+        """
+        count = getattr(self, 'annotated_total_items', None)
+        if count is None:
+            count = self.items.count()
+        return count
 
     @property
     def total_price(self):
         """
         Calculates total price of all items in cart.
+        Uses the with_totals() annotation when present,
+        otherwise sums in the database with one query.
         """
-        return sum(item.subtotal for item in self.items.all())
+        total = getattr(self, 'annotated_total_price', None)
+        if total is None:
+            total = self.items.aggregate(
+                total=Sum(F('quantity') * F('product__price'), output_field=PRICE_FIELD)
+            )['total'] or Decimal('0')
+        return total
 
 
 class CartItem(models.Model):
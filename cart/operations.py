@@ -0,0 +1,437 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from products.models import Product
+from .models import Cart, CartItem
+
+
+# user id → cart id, so writes skip the Cart lookup.
+# Dropped when the cart is deleted (see cart.signals).
+CART_ID_KEY = 'cart-id:{user_id}'
+CART_ID_TIMEOUT = 60 * 60 * 24
+
+# Marker set when a cart's last_activity is written; while it
+# exists, further activity on the cart does not touch the row.
+CART_TOUCHED_KEY = 'cart-touched:{cart_id}'
+DEFAULT_ACTIVITY_INTERVAL = 300
+
+
+class InsufficientStock(Exception):
+    """
+    The product cannot be bought, or not in the requested quantity.
+    """
+
+    def __init__(self, product_id, available, in_cart):
+        self.product_id = product_id
+        self.available = available
+        self.in_cart = in_cart
+        super().__init__(f"Only {available} of product {product_id} can be added.")
+
+
+class CartBatchError(Exception):
+    """
+    A batch was rejected as a whole. `errors` lists the offending
+    operations; `not_found` tells unknown products/items apart
+    from stock conflicts.
+    """
+
+    def __init__(self, errors, not_found=False):
+        self.errors = errors
+        self.not_found = not_found
+        super().__init__(f"{len(errors)} cart operation(s) failed.")
+
+
+# -----------------------------------------
+# CART ID
+# -----------------------------------------
+
+def get_cart_id(user):
+    """
+    Id of the user's cart (created if missing), cached per user.
+    """
+    key = CART_ID_KEY.format(user_id=user.pk)
+    cart_id = cache.get(key)
+    if cart_id is None:
+        cart, _ = Cart.objects.get_or_create(user=user)
+        cart_id = cart.pk
+        cache.set(key, cart_id, CART_ID_TIMEOUT)
+    return cart_id
+
+
+def forget_cart_id(user_id):
+    cache.delete(CART_ID_KEY.format(user_id=user_id))
+
+
+def touch_cart(cart_id):
+    """
+    Records activity on a cart: at most one UPDATE of last_activity
+    per CART_ACTIVITY_INTERVAL seconds, throttled with cache.add()
+    (atomic, so concurrent requests never both write).
+    """
+    interval = getattr(settings, 'CART_ACTIVITY_INTERVAL', DEFAULT_ACTIVITY_INTERVAL)
+    if cache.add(CART_TOUCHED_KEY.format(cart_id=cart_id), 1, interval):
+        Cart.objects.filter(pk=cart_id).update(last_activity=timezone.now())
+
+
+def on_user_cart(user, write, *args):
+    """
+    Runs write(cart_id, *args) on the user's cart and records the
+    activity. If the cached cart id points to a cart deleted
+    meanwhile (write raises Cart.DoesNotExist), the id is dropped
+    and the write retried.
+    """
+    cart_id = get_cart_id(user)
+    try:
+        result = write(cart_id, *args)
+    except Cart.DoesNotExist:
+        forget_cart_id(user.pk)
+        cart_id = get_cart_id(user)
+        result = write(cart_id, *args)
+    touch_cart(cart_id)
+    return result
+
+
+def add_to_cart(user, product_id, quantity):
+    return on_user_cart(user, add_item, product_id, quantity)
+
+
+def apply_cart_batch(user, operations):
+    return on_user_cart(user, apply_batch, operations)
+
+
+# -----------------------------------------
+# ADD TO CART
+# -----------------------------------------
+
+def supports_upsert():
+    """
+    INSERT ... ON CONFLICT DO UPDATE ... RETURNING
+    (PostgreSQL, SQLite 3.35+).
+    """
+    return (
+        connection.vendor in ('postgresql', 'sqlite') and
+        connection.features.can_return_rows_from_bulk_insert
+    )
+
+
+def add_item(cart_id, product_id, quantity):
+    """
+    Adds `quantity` units of a product to a cart, as one atomic
+    statement where the database supports it:
+
+        INSERT INTO cart_cartitem (cart_id, product_id, quantity)
+        SELECT cart.id, product.id, <n> FROM products_product, cart_cart
+         WHERE cart.id = <cart> AND product.id = <product>
+           AND is_available AND stock_quantity >= <n>
+        ON CONFLICT (cart_id, product_id) DO UPDATE
+           SET quantity = cart_cartitem.quantity + excluded.quantity
+         WHERE cart_cartitem.quantity + excluded.quantity <= <stock>
+        RETURNING quantity
+
+    Concurrent adds of the same product both count, and the line
+    never exceeds the product's stock. Returns the new quantity.
+
+    Raises Cart.DoesNotExist / Product.DoesNotExist for an unknown
+    cart or product and InsufficientStock when the product is unavailable or the
+    line would exceed its stock.
+    """
+    if supports_upsert():
+        new_quantity = upsert_item(cart_id, product_id, quantity)
+    else:
+        new_quantity = update_or_create_item(cart_id, product_id, quantity)
+
+    if new_quantity is None:
+        raise add_failure(cart_id, product_id)
+    return new_quantity
+
+
+def upsert_item(cart_id, product_id, quantity):
+    item_table = connection.ops.quote_name(CartItem._meta.db_table)
+    product_table = connection.ops.quote_name(Product._meta.db_table)
+    cart_table = connection.ops.quote_name(Cart._meta.db_table)
+
+    # The cart is joined so a stale cart id inserts nothing
+    # (instead of failing on the foreign key)
+    sql = (
+        f"INSERT INTO {item_table} (cart_id, product_id, quantity) "
+        f"SELECT c.id, p.id, %s FROM {product_table} p, {cart_table} c "
+        f"WHERE c.id = %s AND p.id = %s AND p.is_available = %s AND p.stock_quantity >= %s "
+        f"ON CONFLICT (cart_id, product_id) DO UPDATE "
+        f"SET quantity = {item_table}.quantity + excluded.quantity "
+        f"WHERE {item_table}.quantity + excluded.quantity <= ("
+        f"SELECT stock_quantity FROM {product_table} WHERE id = excluded.product_id) "
+        f"RETURNING quantity"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [quantity, cart_id, product_id, True, quantity])
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def update_or_create_item(cart_id, product_id, quantity):
+    """
+    Fallback for databases without ON CONFLICT: a conditional
+    `quantity = quantity + n` UPDATE, then an INSERT if no line exists.
+    """
+    stock = (
+        Product.objects.filter(pk=product_id, is_available=True)
+        .values_list('stock_quantity', flat=True)
+        .first()
+    )
+    if stock is None or stock < quantity:
+        return None
+
+    items = CartItem.objects.filter(cart_id=cart_id, product_id=product_id)
+    for _ in range(2):
+        if items.filter(quantity__lte=stock - quantity).update(quantity=F('quantity') + quantity):
+            return items.values_list('quantity', flat=True).first()
+        if items.exists() or not Cart.objects.filter(pk=cart_id).exists():
+            return None
+        try:
+            with transaction.atomic():
+                CartItem.objects.create(cart_id=cart_id, product_id=product_id, quantity=quantity)
+            return quantity
+        except IntegrityError:
+            # Created concurrently: retry the UPDATE
+            continue
+    return None
+
+
+def add_failure(cart_id, product_id):
+    """
+    Why an add was refused (only runs on the failure path).
+    """
+    if not Cart.objects.filter(pk=cart_id).exists():
+        return Cart.DoesNotExist(f"Cart {cart_id} does not exist.")
+
+    product = (
+        Product.objects.filter(pk=product_id)
+        .values('is_available', 'stock_quantity')
+        .first()
+    )
+    if product is None:
+        return Product.DoesNotExist(f"Product {product_id} does not exist.")
+
+    in_cart = (
+        CartItem.objects.filter(cart_id=cart_id, product_id=product_id)
+        .values_list('quantity', flat=True)
+        .first()
+    ) or 0
+    available = max(product['stock_quantity'] - in_cart, 0) if product['is_available'] else 0
+    return InsufficientStock(product_id, available, in_cart)
+
+
+# -----------------------------------------
+# SET QUANTITY
+# -----------------------------------------
+
+def set_item_quantity(item, quantity):
+    """
+    Sets the quantity of a cart line with one conditional UPDATE:
+
+        UPDATE cart_cartitem SET quantity = <n>
+         WHERE id = <item>
+           AND (quantity >= <n> OR product_id IN (
+                SELECT id FROM products_product
+                 WHERE id = <product> AND is_available AND stock_quantity >= <n>))
+
+    As in a batch, stock is only checked when the line grows, so a
+    line can always be reduced. Returns the new quantity.
+
+    Raises CartItem.DoesNotExist when the line was deleted meanwhile
+    and InsufficientStock when the product is unavailable or has
+    fewer than `quantity` units.
+    """
+    stocked = Product.objects.filter(
+        pk=item.product_id, is_available=True, stock_quantity__gte=quantity
+    ).values('id')
+    updated = (
+        CartItem.objects.filter(pk=item.pk)
+        .filter(Q(quantity__gte=quantity) | Q(product_id__in=stocked))
+        .update(quantity=quantity)
+    )
+    if updated:
+        return quantity
+
+    # Failure path only
+    in_cart = CartItem.objects.filter(pk=item.pk).values_list('quantity', flat=True).first()
+    if in_cart is None:
+        raise CartItem.DoesNotExist(f"Cart item {item.pk} does not exist.")
+    available = purchasable_stock([item.product_id]).get(item.product_id, 0)
+    raise InsufficientStock(item.product_id, available, in_cart)
+
+
+# -----------------------------------------
+# BATCH
+# -----------------------------------------
+
+def referenced_products(operations):
+    return {op['product'] for op in operations if 'product' in op}
+
+
+def purchasable_stock(product_ids):
+    """
+    {product_id: units that can be bought} with one query;
+    0 for unavailable products, unknown ids are missing.
+    """
+    return {
+        pk: stock if is_available else 0
+        for pk, is_available, stock in Product.objects.filter(id__in=product_ids)
+        .values_list('id', 'is_available', 'stock_quantity')
+    }
+
+
+def fold_operations(current, operations, stock, item_products=None):
+    """
+    Applies operations in memory to `current` ({product_id: quantity}).
+
+    Returns the new {product_id: quantity} (0 = remove the line).
+    Raises CartBatchError for items / products that do not exist
+    (`item_products` maps this cart's item ids to product ids), or
+    for lines that grow beyond `stock` ({product_id: purchasable units}).
+    Stock is only checked for lines that grow, so a cart can always
+    be reduced.
+    """
+    item_products = item_products or {}
+
+    errors = []
+    for index, op in enumerate(operations):
+        if 'item' in op and op['item'] not in item_products:
+            errors.append({'index': index, 'item': op['item'], 'error': "Cart item not found."})
+        elif 'product' in op and op['product'] not in stock:
+            errors.append({'index': index, 'product': op['product'], 'error': "Product not found."})
+    if errors:
+        raise CartBatchError(errors, not_found=True)
+
+    quantities = dict(current)
+    for op in operations:
+        product_id = op['product'] if 'product' in op else item_products[op['item']]
+        if op['op'] == 'add':
+            quantities[product_id] = quantities.get(product_id, 0) + op['quantity']
+        elif op['op'] == 'set':
+            quantities[product_id] = op['quantity']
+        else:
+            quantities[product_id] = 0
+
+    for product_id, quantity in quantities.items():
+        if quantity > current.get(product_id, 0) and quantity > stock[product_id]:
+            errors.append({
+                'product': product_id,
+                'requested': quantity,
+                'available': stock[product_id],
+                'error': "Not enough stock for the requested quantity.",
+            })
+    if errors:
+        raise CartBatchError(errors)
+
+    return quantities
+
+
+def apply_batch(cart_id, operations):
+    """
+    Applies validated CartOperationSerializer operations in order,
+    in one transaction, all or nothing:
+
+    1. lock the cart row (batches on one cart run one at a time)
+    2. one SELECT for every referenced cart line (by product or
+       item id, restricted to this cart → ownership check)
+    3. one SELECT for every referenced product (existence/stock)
+    4. fold the operations into final quantities in memory
+    5. one DELETE for lines that drop to 0 and one
+       INSERT ... ON CONFLICT DO UPDATE for the changed lines
+
+    Raises CartBatchError, or Cart.DoesNotExist.
+    """
+    product_ids = referenced_products(operations)
+    item_ids = {op['item'] for op in operations if 'item' in op}
+
+    with transaction.atomic():
+        if not list(Cart.objects.select_for_update().filter(pk=cart_id).values_list('id', flat=True)):
+            raise Cart.DoesNotExist(f"Cart {cart_id} does not exist.")
+
+        current = {}
+        item_products = {}
+        lines = (
+            CartItem.objects.filter(cart_id=cart_id)
+            .filter(Q(product_id__in=product_ids) | Q(id__in=item_ids))
+            .values_list('id', 'product_id', 'quantity')
+        )
+        for item_id, product_id, quantity in lines:
+            current[product_id] = quantity
+            item_products[item_id] = product_id
+
+        stock = purchasable_stock(product_ids | set(item_products.values()))
+        quantities = fold_operations(current, operations, stock, item_products)
+
+        removed = [
+            product_id for product_id, quantity in quantities.items()
+            if quantity == 0 and product_id in current
+        ]
+        changed = [
+            CartItem(cart_id=cart_id, product_id=product_id, quantity=quantity)
+            for product_id, quantity in quantities.items()
+            if quantity and quantity != current.get(product_id)
+        ]
+
+        if removed:
+            CartItem.objects.filter(cart_id=cart_id, product_id__in=removed).delete()
+        if changed:
+            CartItem.objects.bulk_create(
+                changed,
+                update_conflicts=True,
+                unique_fields=['cart', 'product'],
+                update_fields=['quantity'],
+            )
+
+    return {'updated': len(changed), 'removed': len(removed)}
+
+
+# -----------------------------------------
+# GUEST CART MERGE
+# -----------------------------------------
+
+def merge_items(cart_id, quantities):
+    """
+    Adds {product_id: quantity} (e.g. a guest cart) to a cart with
+    one SELECT of its lines, one SELECT of the products and one
+    bulk INSERT ... ON CONFLICT DO UPDATE.
+
+    Quantities are added to existing lines, capped at the current
+    purchasable stock (an existing line is never reduced); unknown
+    and unavailable products are skipped. Returns the number of
+    lines written. Raises Cart.DoesNotExist.
+    """
+    if not quantities:
+        return 0
+
+    with transaction.atomic():
+        if not list(Cart.objects.select_for_update().filter(pk=cart_id).values_list('id', flat=True)):
+            raise Cart.DoesNotExist(f"Cart {cart_id} does not exist.")
+
+        current = dict(
+            CartItem.objects.filter(cart_id=cart_id, product_id__in=quantities)
+            .values_list('product_id', 'quantity')
+        )
+        stock = purchasable_stock(quantities)
+
+        lines = []
+        for product_id, quantity in quantities.items():
+            if product_id not in stock:
+                continue
+            existing = current.get(product_id, 0)
+            merged = max(existing, min(existing + quantity, stock[product_id]))
+            if merged != existing:
+                lines.append(CartItem(cart_id=cart_id, product_id=product_id, quantity=merged))
+
+        if lines:
+            CartItem.objects.bulk_create(
+                lines,
+                update_conflicts=True,
+                unique_fields=['cart', 'product'],
+                update_fields=['quantity'],
+            )
+
+    return len(lines)
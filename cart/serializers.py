@@ -7,6 +7,7 @@ class CartItemSerializer(serializers.ModelSerializer):
     """
     Represents a single item in the cart.
     Includes nested ProductSerializer for better API detail.
+    Only the quantity of an existing line can be changed.
     """
     product_details = ProductSerializer(source="product", read_only=True)
 
@@ -16,7 +17,7 @@ class CartItemSerializer(serializers.ModelSerializer):
             'id', 'product', 'product_details',
             'quantity', 'subtotal'
         ]
-        read_only_fields = ['id', 'subtotal', 'product_details']
+        read_only_fields = ['id', 'product', 'subtotal', 'product_details']
 
 
 
@@ -41,3 +42,48 @@ class CartSerializer(serializers.ModelSerializer):
             'id', 'user', 'total_items',
             'total_price', 'created_at'
         ]
+
+
+
+class AddToCartSerializer(serializers.Serializer):
+    """
+    Input of POST /api/cart/add/.
+    """
+    product = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1, default=1)
+
+
+class CartOperationSerializer(serializers.Serializer):
+    """
+    One operation of POST /api/cart/batch/:
+
+      {"op": "add", "product": 7, "quantity": 2}   → quantity += 2
+      {"op": "set", "item": 31, "quantity": 5}     → quantity = 5 (0 removes)
+      {"op": "remove", "product": 7}               → delete the line
+
+    Lines are referenced by product id or by cart item id.
+    """
+    op = serializers.ChoiceField(choices=['add', 'set', 'remove'])
+    product = serializers.IntegerField(required=False)
+    item = serializers.IntegerField(required=False)
+    quantity = serializers.IntegerField(min_value=0, required=False)
+
+    def validate(self, attrs):
+        if ('product' in attrs) == ('item' in attrs):
+            raise serializers.ValidationError("Give either 'product' or 'item'.")
+
+        quantity = attrs.get('quantity')
+        if attrs['op'] == 'add':
+            if quantity == 0:
+                raise serializers.ValidationError({'quantity': ["Must be at least 1."]})
+            attrs.setdefault('quantity', 1)
+        elif attrs['op'] == 'set' and quantity is None:
+            raise serializers.ValidationError({'quantity': ["This field is required."]})
+        return attrs
+
+
+class CartBatchSerializer(serializers.Serializer):
+    """
+    Input of POST /api/cart/batch/, applied in order, all or nothing.
+    """
+    operations = CartOperationSerializer(many=True, allow_empty=False, max_length=200)
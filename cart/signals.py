@@ -0,0 +1,24 @@
+from django.contrib.auth.signals import user_logged_in
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from .guest import merge_guest_cart
+from .models import Cart
+from .operations import forget_cart_id
+
+
+@receiver(post_delete, sender=Cart)
+def forget_deleted_cart(sender, instance, **kwargs):
+    """
+    Drops the cached cart id, so the next write creates a new cart.
+    """
+    forget_cart_id(instance.user_id)
+
+
+@receiver(user_logged_in)
+def merge_guest_cart_on_login(sender, request, user, **kwargs):
+    """
+    Session logins (JWT logins merge in the token view).
+    """
+    if request is not None:
+        merge_guest_cart(request, user)
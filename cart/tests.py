@@ -1,3 +1,514 @@
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from categories.models import Category
+from products.models import Product
+from .models import Cart, CartItem
+from .operations import InsufficientStock, add_item, get_cart_id, touch_cart
+
+
+class CartReadModelTests(TestCase):
+    """
+    The cart response is built from one annotated, prefetched
+    queryset, so its query count does not depend on the cart size.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('shopper', 'shopper@example.com', 'password')
+        cls.category = Category.objects.create(name='Groceries')
+        cls.products = Product.objects.bulk_create([
+            Product(
+                name=f'Product {number}',
+                description='',
+                price=Decimal('2.50') + number,
+                category=cls.category,
+                stock_quantity=100,
+            )
+            for number in range(10)
+        ])
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.cart = Cart.objects.create(user=self.user)
+
+    def fill_cart(self, count):
+        CartItem.objects.bulk_create([
+            CartItem(cart=self.cart, product=product, quantity=2)
+            for product in self.products[:count]
+        ])
+
+    def test_cart_query_count_does_not_grow_with_items(self):
+        for count in (1, 10):
+            CartItem.objects.all().delete()
+            self.fill_cart(count)
+            with self.assertNumQueries(2):
+                response = self.client.get('/api/cart/')
+            self.assertEqual(len(response.data['items']), count)
+
+    def test_totals_are_computed_by_the_database(self):
+        self.fill_cart(3)
+        response = self.client.get('/api/cart/')
+
+        expected = sum(2 * product.price for product in self.products[:3])
+        self.assertEqual(response.data['total_items'], 3)
+        self.assertEqual(Decimal(str(response.data['total_price'])), expected)
+
+        subtotals = [Decimal(str(item['subtotal'])) for item in response.data['items']]
+        self.assertEqual(sum(subtotals), expected)
+
+    def test_empty_cart_totals(self):
+        response = self.client.get('/api/cart/')
+        self.assertEqual(response.data['total_items'], 0)
+        self.assertEqual(Decimal(str(response.data['total_price'])), Decimal('0'))
+
+    def test_cart_is_created_on_first_read(self):
+        self.cart.delete()
+        response = self.client.get('/api/cart/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(Cart.objects.filter(user=self.user).exists())
+
+    def test_sparse_product_fields_load_no_deferred_columns(self):
+        self.fill_cart(5)
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/cart/?product_fields=id,name')
+        self.assertEqual(set(response.data['items'][0]['product_details']), {'id', 'name'})
+
+    def test_add_to_cart_query_count_does_not_grow_with_items(self):
+        touch_cart(get_cart_id(self.user))
+        counts = []
+        for count in (1, 9):
+            CartItem.objects.all().delete()
+            self.fill_cart(count)
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(
+                    '/api/cart/add/', {'product': self.products[9].pk, 'quantity': 1}
+                )
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data['total_items'], count + 1)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+
+class AddToCartTests(TestCase):
+    """
+    Add-to-cart is one upsert that increments the line and checks stock.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('shopper', 'shopper@example.com', 'password')
+        category = Category.objects.create(name='Groceries')
+        cls.product = Product.objects.create(
+            name='Rice', description='', price=Decimal('3.00'),
+            category=category, stock_quantity=5,
+        )
+        cls.unavailable = Product.objects.create(
+            name='Beans', description='', price=Decimal('1.00'),
+            category=category, stock_quantity=5, is_available=False,
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def add(self, product, quantity=1):
+        return self.client.post('/api/cart/add/', {'product': product.pk, 'quantity': quantity})
+
+    def test_adding_twice_increments_the_line(self):
+        self.add(self.product, 2)
+        response = self.add(self.product, 3)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['items'][0]['quantity'], 5)
+        self.assertEqual(CartItem.objects.count(), 1)
+
+    def test_write_path_query_count(self):
+        self.add(self.product)
+        # upsert + cart + items
+        with self.assertNumQueries(3):
+            self.add(self.product)
+
+    def test_more_than_stock_is_a_conflict(self):
+        self.add(self.product, 4)
+        response = self.add(self.product, 2)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['available'], 1)
+        self.assertEqual(response.data['in_cart'], 4)
+        self.assertEqual(CartItem.objects.get().quantity, 4)
+
+    def test_unavailable_product_is_a_conflict(self):
+        response = self.add(self.unavailable)
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(CartItem.objects.exists())
+
+    def test_unknown_product_is_not_found(self):
+        response = self.client.post('/api/cart/add/', {'product': 999999})
+        self.assertEqual(response.status_code, 404)
+
+    def test_stale_cached_cart_id_is_replaced(self):
+        self.add(self.product)
+        Cart.objects.all().delete()
+        cache.set(f'cart-id:{self.user.pk}', 999999)
+        response = self.add(self.product)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['total_items'], 1)
+
+    def test_invalid_quantity_is_rejected(self):
+        response = self.add(self.product, 0)
+        self.assertEqual(response.status_code, 400)
+
+    def test_fallback_without_upsert(self):
+        cart = Cart.objects.create(user=self.user)
+        with mock.patch('cart.operations.supports_upsert', return_value=False):
+            self.assertEqual(add_item(cart.pk, self.product.pk, 2), 2)
+            self.assertEqual(add_item(cart.pk, self.product.pk, 3), 5)
+            with self.assertRaises(InsufficientStock):
+                add_item(cart.pk, self.product.pk, 1)
+            with self.assertRaises(Product.DoesNotExist):
+                add_item(cart.pk, 999999, 1)
+
+
+class CartBatchTests(TestCase):
+    """
+    POST /api/cart/batch/ applies all operations or none.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('shopper', 'shopper@example.com', 'password')
+        cls.other = User.objects.create_user('other', 'other@example.com', 'password')
+        category = Category.objects.create(name='Groceries')
+        cls.products = Product.objects.bulk_create([
+            Product(
+                name=f'Product {number}', description='', price=Decimal('1.00'),
+                category=category, stock_quantity=10,
+            )
+            for number in range(30)
+        ])
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.cart = Cart.objects.create(user=self.user)
+
+    def batch(self, *operations):
+        return self.client.post('/api/cart/batch/', {'operations': list(operations)}, format='json')
+
+    def quantities(self):
+        return dict(self.cart.items.values_list('product_id', 'quantity'))
+
+    def test_operations_are_applied_in_order(self):
+        first, second, third = self.products[:3]
+        item = CartItem.objects.create(cart=self.cart, product=third, quantity=4)
+
+        response = self.batch(
+            {'op': 'add', 'product': first.pk, 'quantity': 2},
+            {'op': 'add', 'product': first.pk},
+            {'op': 'add', 'product': second.pk, 'quantity': 5},
+            {'op': 'remove', 'product': second.pk},
+            {'op': 'set', 'item': item.pk, 'quantity': 7},
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['total_items'], 2)
+        self.assertEqual(self.quantities(), {first.pk: 3, third.pk: 7})
+
+    def test_set_to_zero_removes_the_line(self):
+        CartItem.objects.create(cart=self.cart, product=self.products[0], quantity=4)
+        self.batch({'op': 'set', 'product': self.products[0].pk, 'quantity': 0})
+        self.assertEqual(self.quantities(), {})
+
+    def test_query_count_does_not_grow_with_operations(self):
+        touch_cart(get_cart_id(self.user))
+        counts = []
+        for size in (2, 30):
+            CartItem.objects.all().delete()
+            operations = [
+                {'op': 'add', 'product': product.pk, 'quantity': 1}
+                for product in self.products[:size]
+            ]
+            with CaptureQueriesContext(connection) as queries:
+                response = self.batch(*operations)
+            self.assertEqual(response.status_code, 200)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_stock_conflict_applies_nothing(self):
+        response = self.batch(
+            {'op': 'add', 'product': self.products[0].pk, 'quantity': 1},
+            {'op': 'add', 'product': self.products[1].pk, 'quantity': 11},
+        )
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['errors'][0]['available'], 10)
+        self.assertEqual(self.quantities(), {})
+
+    def test_items_of_other_carts_are_not_found(self):
+        other_cart = Cart.objects.create(user=self.other)
+        item = CartItem.objects.create(cart=other_cart, product=self.products[0], quantity=1)
+
+        response = self.batch({'op': 'remove', 'item': item.pk})
+
+        self.assertEqual(response.status_code, 404)
+        self.assertTrue(CartItem.objects.filter(pk=item.pk).exists())
+
+    def test_invalid_operations_are_rejected(self):
+        response = self.batch({'op': 'set', 'product': self.products[0].pk})
+        self.assertEqual(response.status_code, 400)
+        response = self.batch({'op': 'add'})
+        self.assertEqual(response.status_code, 400)
+
+
+class CartItemEndpointTests(TestCase):
+    """
+    The item update/remove endpoints only reach the user's own
+    cart, and a quantity change is checked against the stock.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.other = User.objects.bulk_create([
+            User(username='shopper', email='shopper@example.com'),
+            User(username='other', email='other@example.com'),
+        ])
+        category = Category.objects.create(name='Groceries')
+        cls.product = Product.objects.create(
+            name='Rice', description='', price=Decimal('3.00'),
+            category=category, stock_quantity=5,
+        )
+        cls.unavailable = Product.objects.create(
+            name='Beans', description='', price=Decimal('1.00'),
+            category=category, stock_quantity=5, is_available=False,
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.item = CartItem.objects.create(
+            cart=Cart.objects.create(user=self.user), product=self.product, quantity=2
+        )
+        self.other_item = CartItem.objects.create(
+            cart=Cart.objects.create(user=self.other), product=self.product, quantity=1
+        )
+
+    def patch(self, item, quantity):
+        return self.client.patch(f'/api/cart/item/{item.pk}/update/', {'quantity': quantity}, format='json')
+
+    def test_patch_sets_the_quantity(self):
+        response = self.patch(self.item, 5)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['quantity'], 5)
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.quantity, 5)
+
+    def test_patch_beyond_stock_is_a_conflict(self):
+        response = self.patch(self.item, 6)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['available'], 5)
+        self.assertEqual(response.data['in_cart'], 2)
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.quantity, 2)
+
+    def test_unavailable_line_can_only_be_reduced(self):
+        self.item.product = self.unavailable
+        self.item.quantity = 3
+        self.item.save()
+
+        self.assertEqual(self.patch(self.item, 4).status_code, 409)
+        self.assertEqual(self.patch(self.item, 1).status_code, 200)
+
+    def test_product_of_a_line_cannot_be_changed(self):
+        response = self.client.patch(
+            f'/api/cart/item/{self.item.pk}/update/',
+            {'product': self.unavailable.pk, 'quantity': 3}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.item.refresh_from_db()
+        self.assertEqual((self.item.product_id, self.item.quantity), (self.product.pk, 3))
+
+    def test_items_of_other_carts_cannot_be_updated(self):
+        self.assertEqual(self.patch(self.other_item, 3).status_code, 404)
+        self.other_item.refresh_from_db()
+        self.assertEqual(self.other_item.quantity, 1)
+
+    def test_items_of_other_carts_cannot_be_removed(self):
+        response = self.client.delete(f'/api/cart/item/{self.other_item.pk}/remove/')
+        self.assertEqual(response.status_code, 404)
+        self.assertTrue(CartItem.objects.filter(pk=self.other_item.pk).exists())
+
+    def test_remove_own_item(self):
+        response = self.client.delete(f'/api/cart/item/{self.item.pk}/remove/')
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(CartItem.objects.filter(pk=self.item.pk).exists())
+
+
+class GuestCartTests(TestCase):
+    """
+    Anonymous carts live in the cache and are merged on login.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('shopper', 'shopper@example.com', 'password')
+        category = Category.objects.create(name='Groceries')
+        cls.rice, cls.beans = Product.objects.bulk_create([
+            Product(name='Rice', description='', price=Decimal('3.00'), category=category, stock_quantity=5),
+            Product(name='Beans', description='', price=Decimal('1.50'), category=category, stock_quantity=5),
+        ])
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def add(self, product, quantity=1, token=None):
+        headers = {'HTTP_X_CART_TOKEN': token} if token else {}
+        return self.client.post(
+            '/api/cart/add/', {'product': product.pk, 'quantity': quantity}, **headers
+        )
+
+    def test_guest_cart_writes_no_rows(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.add(self.rice, 2)
+            token = response['X-Cart-Token']
+            self.add(self.beans, 1, token)
+            self.add(self.rice, 1, token)
+            response = self.client.get('/api/cart/', HTTP_X_CART_TOKEN=token)
+
+        self.assertFalse(any(
+            query['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))
+            for query in queries.captured_queries
+        ))
+        self.assertEqual(response.data['token'], token)
+        self.assertEqual(response.data['total_items'], 2)
+        self.assertEqual(Decimal(str(response.data['total_price'])), Decimal('10.50'))
+        self.assertFalse(Cart.objects.exists())
+
+    def test_guest_stock_is_checked(self):
+        token = self.add(self.rice, 4)['X-Cart-Token']
+        response = self.add(self.rice, 2, token)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['available'], 1)
+
+    def test_guest_batch(self):
+        token = self.add(self.rice, 1)['X-Cart-Token']
+        response = self.client.post('/api/cart/batch/', {'operations': [
+            {'op': 'set', 'product': self.rice.pk, 'quantity': 3},
+            {'op': 'add', 'product': self.beans.pk, 'quantity': 2},
+            {'op': 'remove', 'product': self.beans.pk},
+        ]}, format='json', HTTP_X_CART_TOKEN=token)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['quantity'] for item in response.data['items']], [3])
+
+    def test_unknown_token_is_an_empty_cart(self):
+        response = self.client.get('/api/cart/', HTTP_X_CART_TOKEN='x' * 32)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['items'], [])
+
+    def test_jwt_login_merges_the_guest_cart(self):
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, product=self.rice, quantity=2)
+
+        token = self.add(self.rice, 2)['X-Cart-Token']
+        self.add(self.beans, 1, token)
+
+        response = self.client.post(
+            '/api/token/', {'username': 'shopper', 'password': 'password'},
+            HTTP_X_CART_TOKEN=token
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('access', response.data)
+        self.assertEqual(
+            dict(cart.items.values_list('product_id', 'quantity')),
+            {self.rice.pk: 4, self.beans.pk: 1}
+        )
+        # The guest cart is gone
+        response = self.client.get('/api/cart/', HTTP_X_CART_TOKEN=token)
+        self.assertEqual(response.data['items'], [])
+
+    def test_merge_is_capped_at_stock(self):
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, product=self.rice, quantity=4)
+        token = self.add(self.rice, 3)['X-Cart-Token']
+
+        self.client.post(
+            '/api/token/', {'username': 'shopper', 'password': 'password'},
+            HTTP_X_CART_TOKEN=token
+        )
+
+        self.assertEqual(cart.items.get().quantity, 5)
+
+
+class CartActivityTests(TestCase):
+    """
+    last_activity is touched by cart writes (throttled), and
+    compact_carts removes carts inactive for too long.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Groceries')
+        cls.product = Product.objects.create(
+            name='Rice', description='', price=Decimal('3.00'),
+            category=category, stock_quantity=50,
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def make_cart(self, username, days_ago):
+        user = User.objects.create_user(username, f'{username}@example.com', 'password')
+        cart = Cart.objects.create(user=user)
+        CartItem.objects.create(cart=cart, product=self.product, quantity=1)
+        Cart.objects.filter(pk=cart.pk).update(
+            last_activity=timezone.now() - timedelta(days=days_ago)
+        )
+        return cart
+
+    def test_writes_touch_last_activity_once_per_interval(self):
+        cart = self.make_cart('shopper', days_ago=60)
+        client = APIClient()
+        client.force_authenticate(cart.user)
+
+        client.post('/api/cart/add/', {'product': self.product.pk})
+        cart.refresh_from_db()
+        self.assertGreater(cart.last_activity, timezone.now() - timedelta(minutes=1))
+
+        with CaptureQueriesContext(connection) as queries:
+            client.post('/api/cart/add/', {'product': self.product.pk})
+        self.assertFalse(any(
+            query['sql'].startswith('UPDATE "cart_cart"') for query in queries.captured_queries
+        ))
+
+    def test_compact_carts_deletes_only_inactive_carts(self):
+        old = [self.make_cart(f'old{number}', days_ago=45) for number in range(5)]
+        recent = self.make_cart('recent', days_ago=2)
+
+        output = StringIO()
+        call_command('compact_carts', days=30, batch_size=2, stdout=output)
+
+        self.assertEqual(list(Cart.objects.values_list('id', flat=True)), [recent.pk])
+        self.assertFalse(CartItem.objects.filter(cart_id__in=[cart.pk for cart in old]).exists())
+        self.assertIn('Deleted 5 carts and 5 cart items', output.getvalue())
 
-# Create your tests here.
+    def test_compact_carts_dry_run(self):
+        self.make_cart('old', days_ago=45)
+        output = StringIO()
+        call_command('compact_carts', days=30, dry_run=True, stdout=output)
+        self.assertEqual(Cart.objects.count(), 1)
+        self.assertIn('Would delete 1 carts', output.getvalue())
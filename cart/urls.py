@@ -2,6 +2,7 @@ from django.urls import path
 from .views import (
     CartView,
     AddToCartView,
+    CartBatchView,
     UpdateCartItemView,
     RemoveCartItemView,
     ClearCartView
@@ -14,6 +15,9 @@ urlpatterns = [
     # Add product to cart
     path('add/', AddToCartView.as_view(), name='cart-add'),
 
+    # Apply several add/set/remove operations at once
+    path('batch/', CartBatchView.as_view(), name='cart-batch'),
+
     # Update quantity of a cart item
     path('item/<int:pk>/update/', UpdateCartItemView.as_view(), name='cart-item-update'),
 
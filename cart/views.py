@@ -1,82 +1,292 @@
+from decimal import Decimal
+
 from rest_framework import generics, status
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
+from django.db.models import Prefetch
 
+from .guest import TOKEN_HEADER, GuestCart, request_token
 from .models import Cart, CartItem
-from .serializers import CartSerializer, CartItemSerializer
+from .operations import (
+    CartBatchError, InsufficientStock, add_to_cart, apply_cart_batch,
+    set_item_quantity, touch_cart
+)
+from .serializers import (
+    AddToCartSerializer, CartBatchSerializer, CartSerializer, CartItemSerializer
+)
 from products.models import Product
+from products.serializers import ProductSerializer
+
+
+# -----------------------------------------
+# READ MODEL
+# -----------------------------------------
+
+def cart_queryset(request):
+    """
+    Carts with their totals annotated and their items prefetched
+    with the product columns the response shows:
+
+        1. SELECT cart.*, COUNT(item), SUM(quantity * price) ... GROUP BY cart
+        2. SELECT item.*, product.<selected columns> ... WHERE cart_id = X
+
+    so a cart costs two queries however many items it holds.
+    Supports ?product_fields= / ?product_omit= for product_details.
+    """
+    # Subtotals always need the product price
+    fields = ProductSerializer.selected_fields(request.query_params, nested=True)
+    items = ProductSerializer.prune_queryset(
+        CartItem.objects.order_by('id'),
+        [*fields, 'price'],
+        prefix='product__',
+        keep=['id', 'cart', 'product', 'quantity']
+    )
+    return Cart.objects.with_totals().prefetch_related(Prefetch('items', queryset=items))
+
+
+def load_cart(request):
+    """
+    The user's cart through cart_queryset(), created if missing.
+    """
+    queryset = cart_queryset(request)
+    try:
+        return queryset.get(user=request.user)
+    except Cart.DoesNotExist:
+        Cart.objects.get_or_create(user=request.user)
+        return queryset.get(user=request.user)
+
+
+def guest_cart_data(request, guest_cart):
+    """
+    A guest cart in the CartSerializer format (no id, user or
+    created_at), built from the cached quantities and one query
+    for the products. Products deleted meanwhile are left out.
+    """
+    fields = ProductSerializer.selected_fields(request.query_params, nested=True)
+    products = ProductSerializer.prune_queryset(
+        Product.objects.all(), [*fields, 'price']
+    ).in_bulk(guest_cart.quantities)
+
+    items = [
+        CartItem(product=products[product_id], quantity=quantity)
+        for product_id, quantity in guest_cart.quantities.items()
+        if product_id in products
+    ]
+    return {
+        'id': None,
+        'user': None,
+        'token': guest_cart.token,
+        'items': CartItemSerializer(items, many=True, context={'request': request}).data,
+        'total_items': len(items),
+        'total_price': sum((item.subtotal for item in items), Decimal('0')),
+        'created_at': None,
+    }
+
+
+def cart_response(request, guest_cart=None, status_code=status.HTTP_200_OK):
+    """
+    Response with the current cart, as returned by every endpoint
+    that changes the cart: the user's cart, or for anonymous
+    requests the guest cart (its token is also sent back in the
+    X-Cart-Token header).
+    """
+    if request.user.is_authenticated:
+        cart = load_cart(request)
+        return Response(
+            CartSerializer(cart, context={'request': request}).data,
+            status=status_code
+        )
+
+    if guest_cart is None:
+        guest_cart = GuestCart.load(request_token(request))
+    response = Response(guest_cart_data(request, guest_cart), status=status_code)
+    if guest_cart.token:
+        response[TOKEN_HEADER] = guest_cart.token
+    return response
 
 
 class CartView(generics.RetrieveAPIView):
     """
     Returns the authenticated user's cart.
     If the cart does not exist, it is created automatically.
+    Anonymous visitors get the guest cart of their X-Cart-Token
+    (empty without one).
+    Supports ?product_fields= / ?product_omit= for product_details.
     """
     serializer_class = CartSerializer
-    permission_classes = [IsAuthenticated]
+    permission_classes = [AllowAny]
 
-    def get_object(self):
-        cart, created = Cart.objects.get_or_create(user=self.request.user)
-        return cart
+    def retrieve(self, request, *args, **kwargs):
+        return cart_response(request)
 
 
 class AddToCartView(generics.CreateAPIView):
     """
     Adds a product to the user's cart.
     If the product already exists, increase its quantity.
+
+    The line is written with one atomic upsert that also checks
+    the product's stock (see cart.operations.add_item), so
+    concurrent adds never lose an increment.
+    Anonymous visitors add to a guest cart held in the cache; the
+    first add creates it and returns its token (X-Cart-Token).
+    - unknown product → 404
+    - unavailable, or more than the stock allows → 409
     """
-    serializer_class = CartItemSerializer
-    permission_classes = [IsAuthenticated]
+    serializer_class = AddToCartSerializer
+    permission_classes = [AllowAny]
 
     def post(self, request):
-        cart, created = Cart.objects.get_or_create(user=request.user)
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        product_id = serializer.validated_data['product']
+        quantity = serializer.validated_data['quantity']
 
-        product_id = request.data.get("product")
-        quantity = int(request.data.get("quantity", 1))
+        guest_cart = None
+        try:
+            if request.user.is_authenticated:
+                add_to_cart(request.user, product_id, quantity)
+            else:
+                guest_cart = GuestCart.load(request_token(request))
+                guest_cart.add(product_id, quantity)
+        except Product.DoesNotExist:
+            return Response({"error": "Product not found."},
+                            status=status.HTTP_404_NOT_FOUND)
+        except InsufficientStock as exc:
+            return Response(
+                {
+                    "error": "Not enough stock for the requested quantity.",
+                    "available": exc.available,
+                    "in_cart": exc.in_cart,
+                },
+                status=status.HTTP_409_CONFLICT
+            )
+        except CartBatchError as exc:
+            return Response({"error": exc.errors[0]['error']},
+                            status=status.HTTP_409_CONFLICT)
 
-        product = get_object_or_404(Product, id=product_id)
+        return cart_response(request, guest_cart)
 
-        cart_item, created = CartItem.objects.get_or_create(
-            cart=cart,
-            product=product
-        )
 
-        cart_item.quantity += quantity
-        cart_item.save()
+class CartBatchView(generics.GenericAPIView):
+    """
+    Applies a list of add/set/remove operations to the user's cart
+    in one transaction and returns the final cart once.
+    Used by clients that sync an offline cart.
 
-        return Response(
-            CartSerializer(cart).data,
-            status=status.HTTP_200_OK
-        )
+    POST /api/cart/batch/
+    {"operations": [
+        {"op": "add", "product": 7, "quantity": 2},
+        {"op": "set", "item": 31, "quantity": 5},
+        {"op": "remove", "product": 9}
+    ]}
+
+    Anonymous visitors apply operations to their guest cart
+    (products only; guest lines have no item ids).
+
+    Nothing is applied if any operation fails:
+    - unknown product / cart item → 404
+    - more than the stock allows → 409
+    """
+    serializer_class = CartBatchSerializer
+    permission_classes = [AllowAny]
+
+    def post(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        operations = serializer.validated_data['operations']
+
+        guest_cart = None
+        try:
+            if request.user.is_authenticated:
+                apply_cart_batch(request.user, operations)
+            else:
+                guest_cart = GuestCart.load(request_token(request))
+                guest_cart.apply_batch(operations)
+        except CartBatchError as exc:
+            return Response(
+                {"error": "No operation was applied.", "errors": exc.errors},
+                status=status.HTTP_404_NOT_FOUND if exc.not_found else status.HTTP_409_CONFLICT
+            )
+
+        return cart_response(request, guest_cart)
 
 
 class UpdateCartItemView(generics.UpdateAPIView):
     """
-    Updates the quantity of a cart item.
+    Updates the quantity of an item of the user's cart.
+
+    The quantity is written with one conditional UPDATE that checks
+    the product's stock when the line grows (see
+    cart.operations.set_item_quantity).
+    - item of another user's cart → 404
+    - unavailable, or more than the stock allows → 409
     """
     serializer_class = CartItemSerializer
     permission_classes = [IsAuthenticated]
-    queryset = CartItem.objects.all()
+
+    def get_queryset(self):
+        return CartItem.objects.filter(cart__user=self.request.user).select_related('product')
+
+    def update(self, request, *args, **kwargs):
+        item = self.get_object()
+        serializer = self.get_serializer(item, data=request.data, partial=kwargs.get('partial', False))
+        serializer.is_valid(raise_exception=True)
+
+        quantity = serializer.validated_data.get('quantity', item.quantity)
+        try:
+            item.quantity = set_item_quantity(item, quantity)
+        except CartItem.DoesNotExist:
+            return Response({"error": "Cart item not found."},
+                            status=status.HTTP_404_NOT_FOUND)
+        except InsufficientStock as exc:
+            return Response(
+                {
+                    "error": "Not enough stock for the requested quantity.",
+                    "available": exc.available,
+                    "in_cart": exc.in_cart,
+                },
+                status=status.HTTP_409_CONFLICT
+            )
+
+        touch_cart(item.cart_id)
+        return Response(self.get_serializer(item).data)
 
 
 class RemoveCartItemView(generics.DestroyAPIView):
     """
-    Removes a single item from the cart.
+    Removes a single item from the user's cart
+    (404 for items of another user's cart).
     """
     permission_classes = [IsAuthenticated]
-    queryset = CartItem.objects.all()
+
+    def get_queryset(self):
+        return CartItem.objects.filter(cart__user=self.request.user)
+
+    def perform_destroy(self, instance):
+        instance.delete()
+        touch_cart(instance.cart_id)
 
 
 class ClearCartView(generics.DestroyAPIView):
     """
-    Clears all items from the authenticated user's cart.
+    Clears all items from the authenticated user's cart
+    (or drops the guest cart of an anonymous visitor).
     """
-    permission_classes = [IsAuthenticated]
+    permission_classes = [AllowAny]
 
     def delete(self, request):
+        if not request.user.is_authenticated:
+            GuestCart.load(request_token(request)).clear()
+            return Response(
+                {"message": "Cart cleared successfully"},
+                status=status.HTTP_200_OK
+            )
+
         cart = get_object_or_404(Cart, user=request.user)
         cart.items.all().delete()
+        touch_cart(cart.pk)
 
         return Response(
             {"message": "Cart cleared successfully"},
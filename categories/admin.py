@@ -10,9 +10,14 @@ class CategoryAdmin(admin.ModelAdmin):
 
     list_display = [
         'name',
+        'parent',
+        'path',
         'created_at'
     ]
 
+    list_select_related = ['parent']
+    ordering = ['path']
+
     search_fields = [
         'name'
     ]
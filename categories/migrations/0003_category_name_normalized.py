@@ -0,0 +1,60 @@
+# Generated by Django 6.0 on 2026-10-18 09:40
+
+from django.db import migrations, models
+
+
+def normalize(name):
+    # Same rule as categories.models.normalize_name
+    return ' '.join(name.split()).casefold()
+
+
+def check_normalized_names(apps, schema_editor):
+    """
+    name_normalized becomes unique: stop before touching the table
+    if existing names only differ in case or spacing.
+    """
+    Category = apps.get_model('categories', 'Category')
+    groups = {}
+    for pk, name in Category.objects.order_by('pk').values_list('id', 'name'):
+        groups.setdefault(normalize(name), []).append((pk, name))
+
+    clashes = [group for group in groups.values() if len(group) > 1]
+    if clashes:
+        raise ValueError(
+            "These categories only differ in case or spacing; rename or merge "
+            "them before migrating: " + "; ".join(
+                ", ".join(f"{name!r} (id {pk})" for pk, name in group)
+                for group in clashes
+            )
+        )
+
+
+def set_normalized_names(apps, schema_editor):
+    Category = apps.get_model('categories', 'Category')
+    categories = list(Category.objects.only('id', 'name'))
+    for category in categories:
+        category.name_normalized = normalize(category.name)
+    Category.objects.bulk_update(categories, ['name_normalized'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('categories', '0002_category_tree'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_normalized_names, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='category',
+            name='name_normalized',
+            field=models.CharField(default='', editable=False, max_length=100),
+            preserve_default=False,
+        ),
+        migrations.RunPython(set_normalized_names, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='category',
+            name='name_normalized',
+            field=models.CharField(editable=False, max_length=100, unique=True),
+        ),
+    ]
@@ -1,4 +1,120 @@
-from django.db import models
+from django.apps import apps
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.db.models import Count, F, Q, Subquery, Value
+from django.db.models.query import ModelIterable
+from django.db.models.functions import Concat, Substr
+
+
+def normalize_name(name):
+    """
+    Case- and whitespace-insensitive form of a category name:
+    "  Home   & Garden " → "home & garden".
+    """
+    return ' '.join((name or '').split()).casefold()
+
+
+class CategoryQuerySet(models.QuerySet):
+
+    def subtree(self, **lookup):
+        """
+        The category matching `lookup` and all its descendants,
+        with one prefix match on the materialized path:
+
+            Category.objects.subtree(name__iexact='Electronics')
+        """
+        root_path = Category.objects.filter(**lookup).values('path')[:1]
+        return self.filter(path__startswith=Subquery(root_path))
+
+    def with_product_counts(self):
+        """
+        Sets product counts, descendants included, on every fetched category:
+        - annotated_product_count   → all products
+        - annotated_available_count → can be bought (available and in stock)
+        - annotated_in_stock_count  → stock_quantity > 0
+
+        The counts come from one grouped query per evaluation, over
+        the subtrees of the fetched categories only (see
+        ProductCountIterable), whatever the number of categories.
+        """
+        clone = self._chain()
+        clone._iterable_class = ProductCountIterable
+        return clone
+
+    def as_tree(self):
+        """
+        Nested [{id, name, path, depth, children: [...]}, ...],
+        children sorted by name, built from one query.
+        """
+        nodes = {}
+        roots = []
+        for row in self.order_by('depth', 'name').values('id', 'name', 'parent_id', 'path', 'depth'):
+            node = {
+                'id': row['id'], 'name': row['name'],
+                'path': row['path'], 'depth': row['depth'], 'children': [],
+            }
+            nodes[row['id']] = node
+            parent = nodes.get(row['parent_id'])
+            (parent['children'] if parent else roots).append(node)
+        return roots
+
+
+def subtree_product_counts(paths):
+    """
+    {category_id: (products, available, in stock)}, descendants included,
+    for the categories at `paths`, from one GROUP BY category query
+    over their subtrees only, rolled up along the category paths (as
+    products.facets.rollup_category_counts does).
+    """
+    # Paths inside another fetched subtree add nothing to the filter
+    roots = []
+    for path in sorted(paths):
+        if not roots or not path.startswith(roots[-1]):
+            roots.append(path)
+
+    Product = apps.get_model('products', 'Product')
+    rows = (
+        Product.objects
+        .filter(Q(*[Q(category__path__startswith=path) for path in roots], _connector=Q.OR))
+        .order_by()
+        .values('category_id', 'category__path')
+        .annotate(
+            total=Count('id'),
+            available=Count('id', filter=Q(is_available=True, stock_quantity__gt=0)),
+            in_stock=Count('id', filter=Q(stock_quantity__gt=0)),
+        )
+    )
+
+    counts = {}
+    for row in rows:
+        for pk in row['category__path'].strip('/').split('/'):
+            total, available, in_stock = counts.get(int(pk), (0, 0, 0))
+            counts[int(pk)] = (
+                total + row['total'],
+                available + row['available'],
+                in_stock + row['in_stock'],
+            )
+    return counts
+
+
+class ProductCountIterable(ModelIterable):
+    """
+    Yields the categories of a with_product_counts() queryset with
+    their annotated_*_count attributes set.
+    """
+
+    def __iter__(self):
+        categories = list(super().__iter__())
+        if categories:
+            counts = subtree_product_counts({category.path for category in categories})
+            for category in categories:
+                (
+                    category.annotated_product_count,
+                    category.annotated_available_count,
+                    category.annotated_in_stock_count,
+                ) = counts.get(category.pk, (0, 0, 0))
+        yield from categories
+
 
 class Category(models.Model):
     """
@@ -6,10 +122,33 @@ class Category(models.Model):
     Examples: Electronics, Fruits, Clothing, Beverages.
     """
     name = models.CharField(max_length=100, unique=True)
+
+    # normalize_name(name), kept by save(). Case-insensitive lookups
+    # ("?category=electronics") hit its unique index instead of
+    # scanning UPPER(name).
+    name_normalized = models.CharField(max_length=100, unique=True, editable=False)
     description = models.TextField(blank=True)
+
+    # Tree structure, e.g. Electronics > Phones > Accessories
+    parent = models.ForeignKey(
+        'self',
+        on_delete=models.PROTECT,  # Move or delete subcategories first
+        null=True,
+        blank=True,
+        related_name='children'
+    )
+
+    # Materialized path of ids, "/1/5/12/" for 12 under 5 under 1.
+    # The subtree of a category is every row whose path starts with
+    # its path, so descendants are found with one indexed prefix match.
+    path = models.CharField(max_length=255, db_index=True, editable=False, default='')
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
+
     created_at = models.DateTimeField(auto_now_add=True)  # When category was added
     updated_at = models.DateTimeField(auto_now=True)      # Updated anytime admin edits
 
+    objects = CategoryQuerySet.as_manager()
+
     class Meta:
         verbose_name_plural = "Categories"
         ordering = ['name']  # Alphabetical order
@@ -17,10 +156,75 @@ class Category(models.Model):
     def __str__(self):
         return self.name
 
+    def clean(self):
+        if self.parent_id and self.path and self.parent.path.startswith(self.path):
+            raise ValidationError({'parent': "A category cannot be placed under itself or its subcategories."})
+
+    def save(self, *args, **kwargs):
+        """
+        Saves the row (with its normalized name), then (re)computes
+        its path and depth. Moving a category rewrites the paths of its whole subtree
+        with one UPDATE.
+        """
+        self.name_normalized = normalize_name(self.name)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'name' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'name_normalized'}
+
+        with transaction.atomic():
+            old_path = self.path
+            super().save(*args, **kwargs)
+
+            parent_path = self.parent.path if self.parent_id else '/'
+            new_path = f'{parent_path}{self.pk}/'
+            if new_path == old_path:
+                return
+
+            new_depth = new_path.count('/') - 2
+            Category.objects.filter(pk=self.pk).update(path=new_path, depth=new_depth)
+
+            if old_path:
+                Category.objects.filter(path__startswith=old_path).exclude(pk=self.pk).update(
+                    path=Concat(Value(new_path), Substr('path', len(old_path) + 1)),
+                    depth=F('depth') + (new_depth - self.depth),
+                )
+
+            self.path, self.depth = new_path, new_depth
+
+    @property
+    def ancestor_ids(self):
+        return [int(pk) for pk in self.path.strip('/').split('/')[:-1] if pk]
+
+    def subtree_products(self):
+        """
+        Products of this category and of all its descendants.
+        """
+        Product = apps.get_model('products', 'Product')
+        return Product.objects.filter(category__path__startswith=self.path)
+
     @property
     def product_count(self):
         """
-        Returns how many products belong to this category.
-        Used to show category stats without extra work.
+        Returns how many products belong to this category
+        or one of its descendants.
+        Uses the with_product_counts() annotation when present,
+        otherwise counts with one query.
         """
-        return self.products.count()
+        count = getattr(self, 'annotated_product_count', None)
+        if count is None:
+            count = self.subtree_products().count()
+        return count
+
+    @property
+    def available_count(self):
+        count = getattr(self, 'annotated_available_count', None)
+        if count is None:
+            count = self.subtree_products().filter(is_available=True, stock_quantity__gt=0).count()
+        return count
+
+    @property
+    def in_stock_count(self):
+        count = getattr(self, 'annotated_in_stock_count', None)
+        if count is None:
+            count = self.subtree_products().filter(stock_quantity__gt=0).count()
+        return count
@@ -0,0 +1,106 @@
+import threading
+import time
+
+from django.conf import settings
+from django.utils.text import slugify
+
+from ecommerce_api.cache import get_versions
+from .models import Category, normalize_name
+
+
+VERSION_LABEL = 'categories.Category'
+
+# Seconds after which the map is reloaded even if the version did not change
+DEFAULT_MAX_AGE = 60
+
+
+class CategoryRegistry:
+    """
+    In-process map of category names and slugs → category ids.
+
+    Turns "?category=Home & Garden" (or "home-garden") into the ids
+    of that category and its subcategories without touching the
+    database, so product filters become a plain indexed
+    `category_id IN (...)` with no join to the category table.
+
+    The map is loaded with one query and reloaded when the
+    'categories.Category' cache version changes, i.e. after any
+    category save/delete in any process (see categories.signals).
+    The version is only shared between processes with a shared cache
+    (Redis); with a per-process cache, the map of the other workers
+    is refreshed every CATEGORY_REGISTRY_MAX_AGE seconds instead.
+    """
+
+    def __init__(self):
+        self.version = None
+        self.loaded_at = None
+        self.subtrees = {}
+        self.lock = threading.Lock()
+
+    @property
+    def max_age(self):
+        return getattr(settings, 'CATEGORY_REGISTRY_MAX_AGE', DEFAULT_MAX_AGE)
+
+    def is_current(self, version):
+        return (
+            version == self.version
+            and self.loaded_at is not None
+            and time.monotonic() - self.loaded_at <= self.max_age
+        )
+
+    def ensure_loaded(self):
+        version = get_versions(VERSION_LABEL)[VERSION_LABEL]
+        if self.is_current(version):
+            return
+        with self.lock:
+            if not self.is_current(version):
+                self.reload()
+                # Read before loading: a save made during the load
+                # bumps the version again and triggers another reload
+                self.version = version
+
+    def reload(self):
+        rows = list(
+            Category.objects.order_by('path').values_list('id', 'name', 'name_normalized', 'path')
+        )
+
+        # Sorted by path, every subtree is a contiguous run of rows
+        subtree_ids = {}
+        for start, (pk, _, _, path) in enumerate(rows):
+            ids = [pk]
+            for other_pk, _, _, other_path in rows[start + 1:]:
+                if not other_path.startswith(path):
+                    break
+                ids.append(other_pk)
+            subtree_ids[pk] = ids
+
+        subtrees = {}
+        for pk, name, name_normalized, _ in rows:
+            subtrees[name_normalized] = subtree_ids[pk]
+        # Names win over slugs when the two collide
+        for pk, name, _, _ in rows:
+            slug = slugify(name)
+            if slug:
+                subtrees.setdefault(slug, subtree_ids[pk])
+
+        self.subtrees = subtrees
+        self.loaded_at = time.monotonic()
+
+    def subtree_ids(self, value):
+        """
+        Ids of the category named (or slugged) `value` and of all its
+        descendants; [] for an unknown category.
+        """
+        self.ensure_loaded()
+        subtrees = self.subtrees
+        return subtrees.get(normalize_name(value)) or subtrees.get(slugify(value)) or []
+
+
+_registry = None
+
+
+def get_category_registry():
+    global _registry
+    if _registry is None:
+        _registry = CategoryRegistry()
+    return _registry
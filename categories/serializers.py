@@ -1,26 +1,46 @@
 from rest_framework import serializers
-from .models import Category
+from .models import Category, normalize_name
 
 
 class CategorySerializer(serializers.ModelSerializer):
     """
     Serializes categories.
-    Includes a dynamic field `product_count`
-    showing how many products belong to each category.
-    This improves API usefulness without extra queries.
+    Includes product counts (total, available, in stock),
+    subcategories included. CategoryViewSet sets them with one
+    grouped query per list page or retrieve (with_product_counts()).
     """
-    product_count = serializers.SerializerMethodField()
+    product_count = serializers.IntegerField(read_only=True)
+    available_count = serializers.IntegerField(read_only=True)
+    in_stock_count = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = Category
         fields = [
             'id', 'name', 'description',
-            'product_count', 'created_at'
+            'parent', 'path', 'depth',
+            'product_count', 'available_count', 'in_stock_count',
+            'created_at'
         ]
-        read_only_fields = ['id', 'created_at']
+        read_only_fields = ['id', 'path', 'depth', 'created_at']
 
-    def get_product_count(self, obj):
+    def validate_name(self, name):
         """
-        Count products inside the category.
+        Names must also be unique ignoring case and spacing
+        ("Electronics" vs "electronics "), like name_normalized.
         """
-        return obj.products.count()
+        clashes = Category.objects.filter(name_normalized=normalize_name(name))
+        if self.instance:
+            clashes = clashes.exclude(pk=self.instance.pk)
+        if clashes.exists():
+            raise serializers.ValidationError("A category with this name already exists.")
+        return name
+
+    def validate_parent(self, parent):
+        """
+        A category cannot be moved under itself or its own subcategories.
+        """
+        if parent and self.instance and parent.path.startswith(self.instance.path):
+            raise serializers.ValidationError(
+                "A category cannot be placed under itself or its subcategories."
+            )
+        return parent
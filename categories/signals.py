@@ -0,0 +1,16 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from ecommerce_api.cache import bump_version_on_commit
+from .models import Category
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def bump_category_version(sender, using=None, **kwargs):
+    """
+    Invalidates cached responses built from categories
+    (and the category registry) once the save commits,
+    i.e. after Category.save() has rewritten the paths.
+    """
+    bump_version_on_commit('categories.Category', using=using)
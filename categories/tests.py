@@ -1,3 +1,327 @@
-from django.test import TestCase
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from ecommerce_api.cache import get_versions
+from .models import Category
+from .registry import CategoryRegistry
+
+
+def category_version():
+    return get_versions('categories.Category')['categories.Category']
+
+
+class CategoryCacheInvalidationTests(TestCase):
+    """
+    The category version is bumped after the save commits,
+    once the materialized paths have been rewritten.
+    """
+
+    def setUp(self):
+        cache.clear()
+
+    def test_move_bumps_the_version_on_commit(self):
+        root = Category.objects.create(name='Root')
+        child = Category.objects.create(name='Child')
+        before = category_version()
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            child.parent = root
+            child.save()
+            self.assertEqual(category_version(), before)
+
+        self.assertTrue(callbacks)
+        self.assertGreater(category_version(), before)
+        self.assertEqual(
+            Category.objects.get(pk=child.pk).path, f'/{root.pk}/{child.pk}/'
+        )
+
+    def test_tree_response_is_refreshed_after_commit(self):
+        Category.objects.create(name='Toys')
+        self.client.get('/api/categories/tree/')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(name='Games')
+
+        names = [node['name'] for node in self.client.get('/api/categories/tree/').data]
+        self.assertIn('Games', names)
+
+
+class CategoryConditionalGetTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        Category.objects.create(name='Music')
+
+    def test_list_revalidation_returns_304_without_counting_products(self):
+        response = self.client.get('/api/categories/')
+        self.assertEqual(response.status_code, 200)
+
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/categories/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_if_modified_since_returns_304(self):
+        response = self.client.get('/api/categories/')
+        response = self.client.get('/api/categories/', HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+
+class CategoryProductCountTests(TestCase):
+    """
+    with_product_counts() counts the products of each category and
+    of its subcategories: one query for the categories, one grouped
+    query for the counts, whatever the number of categories.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        Product = apps.get_model('products', 'Product')
+        cls.home = Category.objects.create(name='Home')
+        cls.kitchen = Category.objects.create(name='Kitchen', parent=cls.home)
+        cls.knives = Category.objects.create(name='Knives', parent=cls.kitchen)
+        cls.empty = Category.objects.create(name='Empty')
+
+        def product(category, stock, available=True):
+            return Product(
+                name=f'{category.name} {stock}', description='', price=Decimal('5.00'),
+                category=category, stock_quantity=stock, is_available=available,
+            )
+
+        Product.objects.bulk_create([
+            product(cls.home, 3),
+            product(cls.kitchen, 0),
+            product(cls.kitchen, 2, available=False),
+            product(cls.knives, 4),
+            product(cls.knives, 1),
+        ])
+
+    def counts(self, categories):
+        return {
+            category.name: (category.product_count, category.available_count, category.in_stock_count)
+            for category in categories
+        }
+
+    def test_counts_include_subcategories(self):
+        with self.assertNumQueries(2):
+            counts = self.counts(Category.objects.with_product_counts())
+
+        self.assertEqual(counts, {
+            'Home': (5, 3, 4),
+            'Kitchen': (4, 2, 3),
+            'Knives': (2, 2, 2),
+            'Empty': (0, 0, 0),
+        })
+
+    def test_counts_without_the_annotation_match(self):
+        self.assertEqual(
+            self.counts(Category.objects.all()),
+            self.counts(Category.objects.with_product_counts())
+        )
+
+    def test_counts_query_only_the_fetched_subtrees(self):
+        categories = Category.objects.filter(name__in=['Kitchen', 'Knives', 'Empty']).with_product_counts()
+        with CaptureQueriesContext(connection) as queries:
+            counts = self.counts(categories)
+
+        self.assertEqual(counts, {'Kitchen': (4, 2, 3), 'Knives': (2, 2, 2), 'Empty': (0, 0, 0)})
+        # Knives is inside Kitchen's subtree: two prefixes, not three
+        grouped = queries[1]['sql']
+        self.assertIn(self.kitchen.path, grouped)
+        self.assertIn(self.empty.path, grouped)
+        self.assertNotIn(self.knives.path, grouped)
+
+    def test_only_reads_compute_the_counts(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create(username='editor'))
+
+        with mock.patch('categories.models.subtree_product_counts', return_value={}) as counts:
+            response = client.patch(
+                f'/api/categories/{self.empty.pk}/', {'description': 'Nothing yet'}, format='json'
+            )
+            self.assertEqual(response.status_code, 200)
+            self.assertFalse(counts.called)
+
+            client.get(f'/api/categories/{self.empty.pk}/')
+            self.assertTrue(counts.called)
+
+    def test_list_endpoint_serializes_the_counts(self):
+        cache.clear()
+        response = self.client.get('/api/categories/')
+        rows = response.data['results'] if isinstance(response.data, dict) else response.data
+        self.assertEqual([row['name'] for row in rows], ['Empty', 'Home', 'Kitchen', 'Knives'])
+        self.assertEqual(
+            {row['name']: (row['product_count'], row['available_count'], row['in_stock_count']) for row in rows},
+            {'Home': (5, 3, 4), 'Kitchen': (4, 2, 3), 'Knives': (2, 2, 2), 'Empty': (0, 0, 0)}
+        )
+
+
+class CategoryRegistryTests(TestCase):
+    """
+    Names and slugs resolve to whole subtrees, and the map follows
+    renames and deletes through the version bump, or through its
+    max age when the version is not shared.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.home = Category.objects.create(name='Home & Garden')
+        self.kitchen = Category.objects.create(name='Kitchen', parent=self.home)
+        self.knives = Category.objects.create(name='Knives', parent=self.kitchen)
+        self.toys = Category.objects.create(name='Toys')
+        self.registry = CategoryRegistry()
+
+    def test_subtree_resolution(self):
+        self.assertEqual(
+            set(self.registry.subtree_ids('Home & Garden')),
+            {self.home.pk, self.kitchen.pk, self.knives.pk}
+        )
+        self.assertEqual(set(self.registry.subtree_ids('  KITCHEN ')), {self.kitchen.pk, self.knives.pk})
+        self.assertEqual(self.registry.subtree_ids('home-garden'), self.registry.subtree_ids('Home & Garden'))
+        self.assertEqual(self.registry.subtree_ids('Knives'), [self.knives.pk])
+        self.assertEqual(self.registry.subtree_ids('Unknown'), [])
+
+    def test_lookups_do_not_query_once_loaded(self):
+        self.registry.subtree_ids('Toys')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.registry.subtree_ids('Toys'), [self.toys.pk])
+
+    def test_rename_reloads(self):
+        self.assertEqual(self.registry.subtree_ids('Toys'), [self.toys.pk])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.toys.name = 'Games'
+            self.toys.save()
+
+        self.assertEqual(self.registry.subtree_ids('Toys'), [])
+        self.assertEqual(self.registry.subtree_ids('Games'), [self.toys.pk])
+
+    def test_delete_reloads(self):
+        self.assertEqual(set(self.registry.subtree_ids('Kitchen')), {self.kitchen.pk, self.knives.pk})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.knives.delete()
+
+        self.assertEqual(self.registry.subtree_ids('Knives'), [])
+        self.assertEqual(self.registry.subtree_ids('Kitchen'), [self.kitchen.pk])
+
+    def test_move_reloads_the_subtrees(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.kitchen.parent = self.toys
+            self.kitchen.save()
+
+        self.assertEqual(self.registry.subtree_ids('Home & Garden'), [self.home.pk])
+        self.assertEqual(set(self.registry.subtree_ids('Toys')), {self.toys.pk, self.kitchen.pk, self.knives.pk})
+
+    @override_settings(CATEGORY_REGISTRY_MAX_AGE=60)
+    def test_reloads_after_max_age_without_a_version_change(self):
+        # A rename seen by another process: no version bump reaches this one
+        with mock.patch('categories.registry.time.monotonic', return_value=1000):
+            self.registry.subtree_ids('Toys')
+        Category.objects.filter(pk=self.toys.pk).update(name='Games', name_normalized='games')
+
+        with mock.patch('categories.registry.time.monotonic', return_value=1060):
+            self.assertEqual(self.registry.subtree_ids('Toys'), [self.toys.pk])
+        with mock.patch('categories.registry.time.monotonic', return_value=1061):
+            self.assertEqual(self.registry.subtree_ids('Games'), [self.toys.pk])
+            self.assertEqual(self.registry.subtree_ids('Toys'), [])
+
+
+class NameNormalizedMigrationTests(TransactionTestCase):
+    """
+    0003 refuses to run, and changes nothing, when existing names
+    would collide once normalized.
+    """
+
+    before = [('categories', '0002_category_tree')]
+    after = [('categories', '0003_category_name_normalized')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def setUp(self):
+        self.old_apps = self.migrate(self.before)
+        self.addCleanup(self.restore)
+
+    def restore(self):
+        self.old_apps.get_model('categories', 'Category').objects.all().delete()
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def columns(self):
+        with connection.cursor() as cursor:
+            return {
+                column.name for column in
+                connection.introspection.get_table_description(cursor, 'categories_category')
+            }
+
+    def test_colliding_names_stop_the_migration(self):
+        Category = self.old_apps.get_model('categories', 'Category')
+        Category.objects.create(name='Phones', path='/1/')
+        Category.objects.create(name='phones ', path='/2/')
+        Category.objects.create(name='Toys', path='/3/')
+
+        with self.assertRaisesMessage(ValueError, "'Phones' (id"):
+            self.migrate(self.after)
+
+        self.assertNotIn('name_normalized', self.columns())
+        self.assertEqual(Category.objects.count(), 3)
+
+    def test_names_are_backfilled(self):
+        Category = self.old_apps.get_model('categories', 'Category')
+        Category.objects.create(name='  Home   & Garden ', path='/1/')
+
+        new_apps = self.migrate(self.after)
+
+        self.assertEqual(
+            new_apps.get_model('categories', 'Category').objects.get().name_normalized,
+            'home & garden'
+        )
+
+
+class CategoryParentTests(TestCase):
+    """
+    The API refuses to move a category under itself or one of its
+    descendants, and moves it anywhere else.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create(username='editor'))
+        self.home = Category.objects.create(name='Home')
+        self.kitchen = Category.objects.create(name='Kitchen', parent=self.home)
+        self.knives = Category.objects.create(name='Knives', parent=self.kitchen)
+        self.toys = Category.objects.create(name='Toys')
+
+    def move(self, category, parent):
+        return self.client.patch(
+            f'/api/categories/{category.pk}/', {'parent': parent.pk}, format='json'
+        )
+
+    def test_cannot_move_under_a_descendant(self):
+        for parent in (self.knives, self.kitchen, self.home):
+            response = self.move(self.home, parent)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('parent', response.data)
+
+        self.home.refresh_from_db()
+        self.assertIsNone(self.home.parent_id)
+        self.assertEqual(self.home.path, f'/{self.home.pk}/')
+
+    def test_move_elsewhere_rewrites_the_subtree(self):
+        response = self.move(self.kitchen, self.toys)
+        self.assertEqual(response.status_code, 200)
+
+        self.knives.refresh_from_db()
+        self.assertEqual(self.knives.path, f'/{self.toys.pk}/{self.kitchen.pk}/{self.knives.pk}/')
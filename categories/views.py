@@ -1,13 +1,25 @@
-from rest_framework import viewsets
+from rest_framework import viewsets, status
+from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticatedOrReadOnly
+from rest_framework.response import Response
+from django.core.cache import cache
+from django.db.models import Count, Max, ProtectedError
+
+from ecommerce_api.cache import CachedResponseMixin, versioned_key
+from ecommerce_api.conditional import ConditionalGetMixin
+from products.models import Product
 from .models import Category
 from .serializers import CategorySerializer
 
 
-class CategoryViewSet(viewsets.ModelViewSet):
+class CategoryViewSet(ConditionalGetMixin, CachedResponseMixin, viewsets.ModelViewSet):
     """
     Full CRUD for categories.
     Anyone can read them, only authenticated users can modify.
+    Anonymous list/retrieve responses are cached,
+    and support ETag / Last-Modified conditional GETs.
+    Categories form a tree (see `parent` / `path`);
+    /categories/tree/ returns the whole tree.
     """
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
@@ -16,3 +28,85 @@ class CategoryViewSet(viewsets.ModelViewSet):
     # Enable searching and ordering by name
     search_fields = ['name']
     ordering_fields = ['name', 'created_at']
+
+    # product_count depends on products too
+    cache_models = ('categories.Category', 'products.Product')
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        # Writes go through get_object() too; only reads show the counts
+        if self.action in ('list', 'retrieve'):
+            # Product counts of the fetched categories, from one
+            # extra grouped query over their subtrees
+            queryset = queryset.with_product_counts()
+        return queryset
+
+    def destroy(self, request, *args, **kwargs):
+        try:
+            return super().destroy(request, *args, **kwargs)
+        except ProtectedError:
+            return Response(
+                {"detail": "This category has subcategories. Move or delete them first."},
+                status=status.HTTP_409_CONFLICT
+            )
+
+    @action(detail=False, methods=['get'])
+    def tree(self, request):
+        """
+        The whole category tree, nested.
+        GET /api/categories/tree/
+
+        Built once per category change: the cache key embeds
+        the category version, so any save/delete rebuilds it.
+        """
+        key = versioned_key('category-tree', ('categories.Category',))
+        tree = cache.get(key)
+        if tree is None:
+            tree = Category.objects.as_tree()
+            cache.set(key, tree, None)
+        return Response(tree)
+
+    def get_list_validators(self, queryset):
+        """
+        Categories change with their own rows,
+        and their product_count changes with products.
+        """
+        categories = queryset.order_by().aggregate(
+            last=Max('updated_at'), count=Count('id')
+        )
+        products = Product.objects.order_by().aggregate(
+            last=Max('updated_date'), count=Count('id')
+        )
+        last_modified = max(
+            (value for value in (categories['last'], products['last']) if value),
+            default=None
+        )
+        return last_modified, (
+            categories['last'], categories['count'],
+            products['last'], products['count']
+        )
+
+    def get_object_validators(self):
+        try:
+            row = (
+                Category.objects.filter(pk=self.kwargs[self.lookup_field])
+                .values_list('updated_at', 'path')
+                .first()
+            )
+        except (TypeError, ValueError):
+            row = None
+
+        if row is None:
+            return None  # let retrieve() answer 404
+        category, path = row
+
+        # Counts include the products of subcategories
+        products = Product.objects.filter(
+            category__path__startswith=path
+        ).order_by().aggregate(last=Max('updated_date'), count=Count('id'))
+
+        last_modified = max(
+            (value for value in (category, products['last']) if value),
+            default=None
+        )
+        return last_modified, (category, products['last'], products['count'])
@@ -0,0 +1,209 @@
+import functools
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.response import Response
+
+
+# -------------------------------------------------
+# MODEL VERSION COUNTERS
+# -------------------------------------------------
+# Every cached entry embeds the current version of the models it was
+# built from. Saving/deleting one of those models bumps its version,
+# so old entries are simply never looked up again (and expire on
+# their own). Nothing ever has to scan or delete cache keys.
+#
+# The counters live in the cache itself, so every process must share
+# one cache (Redis/Memcached). With the per-process LocMemCache a bump
+# only reaches the worker that made it (see settings.CACHES).
+
+VERSION_KEY = 'model-version:{label}'
+
+
+def _initial_version():
+    # Time-based, so a version evicted from the cache never
+    # restarts at a number that old entries were stored under.
+    return int(time.time() * 1000)
+
+
+def get_versions(*labels):
+    """
+    Returns {label: version} for model labels like 'products.Product'.
+    """
+    keys = {VERSION_KEY.format(label=label): label for label in labels}
+    found = cache.get_many(keys.keys())
+
+    versions = {}
+    for key, label in keys.items():
+        if key not in found:
+            cache.add(key, _initial_version(), timeout=None)
+            found[key] = cache.get(key)
+        versions[label] = found[key]
+    return versions
+
+
+def bump_version(*labels):
+    """
+    Invalidates every cache entry built from these models.
+    """
+    for label in labels:
+        key = VERSION_KEY.format(label=label)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, _initial_version(), timeout=None)
+
+
+def bump_version_on_commit(*labels, using=None):
+    """
+    bump_version() once the current transaction commits (right away
+    outside of one; never if it rolls back).
+
+    Bumping inside the transaction would let a concurrent request
+    cache the old rows under the new version, where they would stay
+    until they expire.
+    """
+    transaction.on_commit(lambda: bump_version(*labels), using=using)
+
+
+def normalize_query(query_params, ignore=()):
+    """
+    Stable string for a QueryDict: keys sorted, values sorted and
+    stripped, empty values and `ignore`d keys dropped.
+    """
+    normalized = []
+    for key in sorted(query_params.keys()):
+        if key in ignore:
+            continue
+        values = sorted(v.strip() for v in query_params.getlist(key) if v.strip())
+        if values:
+            normalized.append(f"{key}={','.join(values)}")
+    return '&'.join(normalized)
+
+
+def versioned_key(prefix, labels, *parts):
+    """
+    Cache key made of a prefix, the current model versions and
+    a hash of any extra parts (path, normalized query, ...).
+    """
+    versions = get_versions(*labels)
+    version_part = '.'.join(str(versions[label]) for label in labels)
+    digest = hashlib.md5('|'.join(parts).encode('utf-8')).hexdigest()
+    return f'{prefix}:{version_part}:{digest}'
+
+
+# -------------------------------------------------
+# HIT / MISS COUNTERS
+# -------------------------------------------------
+
+STATS_KEYS = {
+    'hits': 'response-cache:hits',
+    'misses': 'response-cache:misses',
+}
+
+
+def _record(stat):
+    key = STATS_KEYS[stat]
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+
+def response_cache_stats():
+    values = cache.get_many(STATS_KEYS.values())
+    stats = {stat: values.get(key, 0) for stat, key in STATS_KEYS.items()}
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_ratio'] = round(stats['hits'] / lookups, 4) if lookups else None
+    return stats
+
+
+# -------------------------------------------------
+# RESPONSE CACHE
+# -------------------------------------------------
+
+def cache_response(view_method):
+    """
+    Decorator for viewset methods/actions of a CachedResponseMixin view.
+
+        @action(detail=True, methods=['get'])
+        @cache_response
+        def reviews(self, request, pk=None):
+            ...
+    """
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        return self.cached_response(view_method, request, *args, **kwargs)
+    return wrapper
+
+
+class CachedResponseMixin:
+    """
+    Caches anonymous GET responses of a viewset.
+
+    - Keyed on path + normalized query params + the versions of
+      `cache_models`, so a save/delete of any of those models
+      invalidates the entries (see bump_version()).
+    - Only successful (200) responses are cached; the serialized
+      data is stored, rendering still follows content negotiation.
+    - Authenticated requests always hit the database.
+    - Set `cache_responses = False` on a view to opt out.
+
+    list and retrieve are cached; custom actions opt in with
+    the @cache_response decorator.
+    """
+    cache_models = ()
+    cache_responses = True
+    cache_timeout = None  # defaults to settings.RESPONSE_CACHE_TIMEOUT
+
+    @cache_response
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @cache_response
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+    def should_cache_response(self, request):
+        return (
+            self.cache_responses and
+            request.method in ('GET', 'HEAD') and
+            not request.user.is_authenticated
+        )
+
+    def get_response_cache_key(self, request):
+        return versioned_key(
+            'response',
+            self.cache_models,
+            request.path,
+            normalize_query(request.query_params),
+        )
+
+    def cached_response(self, view_method, request, *args, **kwargs):
+        if not self.should_cache_response(request):
+            return view_method(self, request, *args, **kwargs)
+
+        key = self.get_response_cache_key(request)
+        cached = cache.get(key)
+
+        if cached is not None:
+            _record('hits')
+            response = Response(cached)
+            response['X-Cache'] = 'HIT'
+            return response
+
+        _record('misses')
+        response = view_method(self, request, *args, **kwargs)
+
+        if response.status_code == 200:
+            timeout = self.cache_timeout
+            if timeout is None:
+                timeout = getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 300)
+            cache.set(key, response.data, timeout)
+
+        response['X-Cache'] = 'MISS'
+        return response
@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    """
+    Cache invalidation bumps version counters stored in the cache,
+    which only works when every worker process uses the same cache.
+    """
+    backend = settings.CACHES.get('default', {}).get('BACKEND')
+    if settings.DEBUG or backend not in PROCESS_LOCAL_CACHES:
+        return []
+    return [
+        Warning(
+            f"The default cache ({backend}) is local to each process.",
+            hint=(
+                "Set REDIS_URL (or CACHE_BACKEND/CACHE_LOCATION) to a shared "
+                "cache, otherwise workers never see each other's invalidations "
+                "and keep serving stale responses."
+            ),
+            id='ecommerce_api.W001',
+        )
+    ]
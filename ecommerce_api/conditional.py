@@ -0,0 +1,117 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from .cache import normalize_query, versioned_key
+
+
+# Query parameters that change paging/sorting/format but not
+# which rows a list covers (its Last-Modified)
+PAGING_PARAMS = {'page', 'page_size', 'cursor', 'pagination', 'ordering', 'format'}
+
+# Stored for views that return no validators, so they are not recomputed
+NO_VALIDATORS = 'none'
+
+
+class ConditionalGetMixin:
+    """
+    Adds ETag / Last-Modified headers to list and retrieve responses
+    and answers If-None-Match / If-Modified-Since with 304 Not Modified.
+
+    Views provide cheap validators instead of serializing the data:
+
+    - get_list_validators(queryset) → for the filtered list queryset
+    - get_object_validators()       → for the object in self.kwargs
+
+    Both return (last_modified, parts) where `parts` is a tuple of
+    values that change whenever the response would change
+    (e.g. MAX(updated_date) and COUNT(*)), or None to skip.
+
+    With `cache_models` set (see CachedResponseMixin), validators are
+    cached under the versions of those models, so they are computed
+    once per data change and filter set; the ETag is then built from
+    the versions and the query string alone, and a revalidation
+    (304 or not) costs no query at all.
+    """
+
+    def get_list_validators(self, queryset):
+        return None
+
+    def get_object_validators(self):
+        return None
+
+    def list(self, request, *args, **kwargs):
+        validators, etag_parts = self.cached_validators(
+            request,
+            lambda: self.get_list_validators(self.filter_queryset(self.get_queryset())),
+        )
+        return self.conditional_response(
+            validators, etag_parts, super().list, request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        validators, etag_parts = self.cached_validators(request, self.get_object_validators)
+        return self.conditional_response(
+            validators, etag_parts, super().retrieve, request, *args, **kwargs
+        )
+
+    def cached_validators(self, request, compute):
+        """
+        Returns (validators, etag_parts).
+
+        The versioned key changes with every save/delete of the
+        `cache_models` (bumped on commit), so it stands in for the
+        validator values in the ETag: same key + same query string
+        → same response. Paging parameters are left out of the
+        cached validators, so every page of a list shares them.
+        """
+        labels = getattr(self, 'cache_models', ())
+        if not labels:
+            validators = compute()
+            return validators, validators[1] if validators else None
+
+        key = versioned_key(
+            'validators',
+            labels,
+            request.path,
+            normalize_query(request.query_params, ignore=PAGING_PARAMS),
+        )
+        validators = cache.get(key)
+        if validators is None:
+            validators = compute()
+            timeout = getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 300)
+            cache.set(key, validators or NO_VALIDATORS, timeout)
+        elif validators == NO_VALIDATORS:
+            validators = None
+
+        return validators, (key, normalize_query(request.query_params))
+
+    def make_etag(self, request, parts):
+        # The renderer is part of the representation (JSON vs browsable API)
+        parts = (request.path, request.accepted_renderer.format, *parts)
+        digest = hashlib.md5(repr(parts).encode('utf-8')).hexdigest()
+        return quote_etag(digest)
+
+    def conditional_response(self, validators, etag_parts, view_method, request, *args, **kwargs):
+        if validators is None:
+            return view_method(request, *args, **kwargs)
+
+        last_modified, _ = validators
+        etag = self.make_etag(request, etag_parts)
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+
+        response = get_conditional_response(
+            request._request, etag=etag, last_modified=timestamp
+        )
+        if response is None:
+            response = view_method(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+
+        response['ETag'] = etag
+        if timestamp is not None:
+            response['Last-Modified'] = http_date(timestamp)
+        return response
@@ -0,0 +1,236 @@
+import base64
+import binascii
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import OrderingFilter
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset ("cursor") pagination.
+
+    Pages are fetched with a WHERE clause on the ordering field
+    plus `id` as tie-breaker, e.g. for -created_date:
+
+        WHERE created_date < X OR (created_date = X AND id < Y)
+        ORDER BY created_date DESC, id DESC
+        LIMIT page_size + 1
+
+    so every page costs the same no matter how deep the client goes,
+    and no COUNT(*) is needed.
+
+    Only one ordering field is supported and it must be listed in the
+    view's `cursor_ordering_fields` (fields backed by an index).
+
+    Subclasses used outside of a view's own queryset (e.g. a nested
+    list in a custom action) can set `ordering` and
+    `cursor_ordering_fields` themselves; ?ordering= is then read
+    from the request directly.
+    """
+    page_size = api_settings.PAGE_SIZE
+    cursor_query_param = 'cursor'
+    ordering_query_param = 'ordering'
+    invalid_cursor_message = 'Invalid cursor.'
+
+    ordering = None
+    cursor_ordering_fields = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.field, self.descending = self.get_ordering(request, queryset, view)
+
+        cursor = self.decode_cursor(request)
+        self.has_cursor = cursor is not None
+        self.reverse = bool(cursor and cursor['r'])
+
+        # Walking backwards → flip direction, then flip the rows back.
+        descending = self.descending != self.reverse
+        queryset = queryset.order_by(*self.order_by(descending))
+
+        if cursor is not None:
+            queryset = queryset.filter(self.after(cursor, descending))
+
+        rows = list(queryset[:self.page_size + 1])
+        self.has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+
+        if self.reverse:
+            rows.reverse()
+
+        self.page = rows
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    # -----------------------------------------
+    # ORDERING
+    # -----------------------------------------
+
+    def get_ordering(self, request, queryset, view):
+        """
+        Returns (field, descending).
+
+        The ordering comes from the view's OrderingFilter when it has one
+        (so ?ordering= keeps working), otherwise from `view.ordering`
+        or the queryset itself.
+
+        Search results ranked by relevance (`search_rank`) have no
+        indexed key to resume from, so they are refused (400) unless
+        ?ordering= asks for another order.
+        """
+        if ('search_rank' in queryset.query.annotations
+                and not request.query_params.get(self.ordering_query_param)):
+            raise ValidationError({
+                'pagination': "Search results are ordered by relevance and cannot be "
+                              "cursor-paginated; use page numbers or pass ?ordering=."
+            })
+
+        ordering = None
+
+        if self.ordering is not None:
+            ordering = request.query_params.get(self.ordering_query_param) or self.ordering
+            allowed = self.cursor_ordering_fields
+        else:
+            for backend in getattr(view, 'filter_backends', []):
+                if issubclass(backend, OrderingFilter):
+                    ordering = backend().get_ordering(request, queryset, view)
+                    break
+            allowed = getattr(view, 'cursor_ordering_fields', ['id'])
+
+        if not ordering:
+            ordering = getattr(view, 'ordering', None) or queryset.query.order_by or ['-id']
+
+        if isinstance(ordering, str):
+            ordering = [ordering]
+
+        field = ordering[0].strip()
+        descending = field.startswith('-')
+        field = field.lstrip('-')
+        if field == 'pk':
+            field = 'id'
+
+        if field not in allowed:
+            raise ValidationError({
+                'ordering': f"Cursor pagination supports ordering by: {', '.join(allowed)}."
+            })
+
+        return field, descending
+
+    def order_by(self, descending):
+        prefix = '-' if descending else ''
+        if self.field == 'id':
+            return [f'{prefix}id']
+        return [f'{prefix}{self.field}', f'{prefix}id']
+
+    def after(self, cursor, descending):
+        """
+        WHERE clause selecting rows after the cursor position.
+        """
+        lookup = 'lt' if descending else 'gt'
+        if self.field == 'id':
+            return Q(**{f'id__{lookup}': cursor['id']})
+        return (
+            Q(**{f'{self.field}__{lookup}': cursor['v']}) |
+            Q(**{self.field: cursor['v'], f'id__{lookup}': cursor['id']})
+        )
+
+    # -----------------------------------------
+    # CURSORS
+    # -----------------------------------------
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+            if cursor['f'] != self.field or not isinstance(cursor['id'], int):
+                raise ValueError
+            cursor.setdefault('v', None)
+            cursor['r'] = bool(cursor.get('r'))
+        except (TypeError, ValueError, KeyError, UnicodeError, binascii.Error):
+            raise ValidationError({self.cursor_query_param: self.invalid_cursor_message})
+
+        return cursor
+
+    def encode_cursor(self, row, reverse):
+        value = getattr(row, self.field)
+        if isinstance(value, (datetime, date)):
+            value = value.isoformat()
+        elif isinstance(value, Decimal):
+            value = str(value)
+
+        payload = {'f': self.field, 'v': value, 'id': row.pk, 'r': reverse}
+        encoded = base64.urlsafe_b64encode(json.dumps(payload).encode('utf-8'))
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, encoded.decode('ascii')
+        )
+
+    def get_next_link(self):
+        # Going forward, the next page exists only if we over-fetched a row.
+        # Coming back from a later page, there is always a next page.
+        if not self.page or not (self.has_more or self.reverse):
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_cursor:
+            return None
+        if not self.page or (self.reverse and not self.has_more):
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+
+class OptionalCursorPagination(PageNumberPagination):
+    """
+    Page-number pagination by default, keyset pagination on request.
+
+    Clients opt in with ?pagination=cursor (or by following a `next`
+    link, which carries ?cursor=). Page-number mode is unchanged.
+    """
+    mode_query_param = 'pagination'
+
+    def use_cursor(self, request):
+        return (
+            KeysetPagination.cursor_query_param in request.query_params or
+            request.query_params.get(self.mode_query_param) == 'cursor'
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if self.use_cursor(request):
+            self.keyset = KeysetPagination()
+            self.keyset.page_size = self.get_page_size(request) or self.page_size
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
@@ -3,6 +3,7 @@ from decouple import config
 from datetime import timedelta
 from decimal import Decimal
 import dj_database_url
+from corsheaders.defaults import default_headers
 import os
 
 # -------------------------------------------------
@@ -59,6 +60,10 @@ else:
 
 CORS_ALLOW_CREDENTIALS = True
 
+# Guest carts travel in the X-Cart-Token header (see cart/guest.py)
+CORS_ALLOW_HEADERS = (*default_headers, 'x-cart-token')
+CORS_EXPOSE_HEADERS = ['X-Cart-Token']
+
 # CSRF Configuration for production
 if not DEBUG:
     CSRF_TRUSTED_ORIGINS = config(
@@ -148,6 +153,40 @@ DATABASES = {
 }
 
 
+# -------------------------------------------------
+# CACHING
+# -------------------------------------------------
+
+# Cache version counters (see ecommerce_api/cache.py) and cached
+# responses must be shared by every gunicorn worker, so production
+# needs a shared backend. Set REDIS_URL, e.g.
+#   REDIS_URL=redis://localhost:6379/1
+# or any Django cache backend with
+#   CACHE_BACKEND=django.core.cache.backends.memcached.PyMemcacheCache
+#   CACHE_LOCATION=127.0.0.1:11211
+# Without them the in-process LocMemCache is used: fine for runserver
+# and tests, but each worker would keep serving its own stale entries
+# (`manage.py check --deploy` warns about it: ecommerce_api.W001).
+REDIS_URL = config('REDIS_URL', default='')
+
+CACHES = {
+    'default': {
+        'BACKEND': config(
+            'CACHE_BACKEND',
+            default=(
+                'django.core.cache.backends.redis.RedisCache' if REDIS_URL
+                else 'django.core.cache.backends.locmem.LocMemCache'
+            )
+        ),
+        'LOCATION': config('CACHE_LOCATION', default=REDIS_URL or 'ecommerce-api'),
+    }
+}
+
+# How long anonymous catalog responses stay cached (seconds).
+# Entries are invalidated earlier whenever the underlying data changes.
+RESPONSE_CACHE_TIMEOUT = config('RESPONSE_CACHE_TIMEOUT', default=300, cast=int)
+
+
 # -------------------------------------------------
 # PASSWORD VALIDATION
 # -------------------------------------------------
@@ -179,6 +218,25 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Product image thumbnails (see products/thumbnails.py)
+PRODUCT_THUMBNAIL_SIZES = (160, 480, 1024)
+PRODUCT_THUMBNAIL_FORMAT = 'WEBP'
+PRODUCT_THUMBNAIL_WORKERS = config('PRODUCT_THUMBNAIL_WORKERS', default=2, cast=int)
+
+# Anonymous carts live in the cache, never in the database (see cart/guest.py).
+# Seconds a guest cart survives without changes, and its maximum size.
+GUEST_CART_TIMEOUT = config('GUEST_CART_TIMEOUT', default=60 * 60 * 24 * 7, cast=int)
+GUEST_CART_MAX_LINES = 100
+
+# Database carts: last_activity is written at most once per interval
+# (seconds); compact_carts deletes carts inactive for longer than
+# CART_RETENTION_DAYS.
+CART_ACTIVITY_INTERVAL = 300
+CART_RETENTION_DAYS = config('CART_RETENTION_DAYS', default=30, cast=int)
+
+# Working files of the recommendation batch jobs (sparse matrices, ...)
+RECOMMENDATIONS_DIR = config('RECOMMENDATIONS_DIR', default=str(BASE_DIR / 'var' / 'recommendations'))
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 
@@ -2,14 +2,16 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
 
+from .cache import response_cache_stats
+
 # JWT Authentication views
-from rest_framework_simplejwt.views import (
-    TokenObtainPairView,
-    TokenRefreshView
-)
+# (login also merges the visitor's guest cart, see cart/guest.py)
+from rest_framework_simplejwt.views import TokenRefreshView
+from accounts.views import CartMergeTokenObtainPairView
 
 @api_view(['GET'])
 def api_root(request):
@@ -28,6 +30,12 @@ def api_root(request):
         }
     })
 
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def cache_stats(request):
+    """Response cache hit/miss counters (admin only)"""
+    return Response(response_cache_stats())
+
 urlpatterns = [
     path('', api_root, name='api-root'),  # ADD THIS LINE
     path('admin/', admin.site.urls),
@@ -35,9 +43,12 @@ urlpatterns = [
     # -------------------------------
     # AUTHENTICATION (JWT)
     # -------------------------------
-    path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
+    path('api/token/', CartMergeTokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
 
+    # Response cache statistics (admin only)
+    path('api/cache-stats/', cache_stats, name='cache-stats'),
+
     # -------------------------------
     # APP ROUTES
     # -------------------------------
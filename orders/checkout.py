@@ -0,0 +1,135 @@
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, F, Q, When
+from django.utils import timezone
+
+from cart.models import Cart, CartItem
+from cart.operations import touch_cart
+from products.models import Product
+from products.signals import products_bulk_changed
+from .models import Order, OrderItem
+
+
+class EmptyCart(Exception):
+    pass
+
+
+class OutOfStock(Exception):
+    """
+    Some cart lines exceed the stock left; `shortages` lists
+    {product, requested, available} for each of them.
+    """
+
+    def __init__(self, shortages):
+        self.shortages = shortages
+        super().__init__(f"{len(shortages)} product(s) are out of stock.")
+
+
+def place_order(user):
+    """
+    Turns the user's cart into an order in one transaction:
+
+    1. lock the cart row (concurrent checkouts of one cart run
+       one after the other; the second finds the cart empty)
+    2. one SELECT of the cart items with their products
+    3. one conditional UPDATE decrementing every product's stock:
+
+         UPDATE products_product
+            SET stock_quantity = CASE WHEN id = 1 THEN stock_quantity - 2 ... END
+          WHERE (id = 1 AND stock_quantity >= 2) OR ...
+
+       If fewer rows than products match, some stock ran out and
+       the whole transaction is rolled back (no overselling)
+    4. one INSERT for the order (total computed in memory from the
+       prices read in 2), one bulk INSERT for its items
+    5. one DELETE emptying the cart
+
+    The query count does not depend on the number of items.
+    Raises Cart.DoesNotExist, EmptyCart or OutOfStock.
+    """
+    with transaction.atomic():
+        cart_id = (
+            Cart.objects.select_for_update()
+            .filter(user=user)
+            .values_list('id', flat=True)
+            .first()
+        )
+        if cart_id is None:
+            raise Cart.DoesNotExist("This user has no cart.")
+
+        items = list(
+            CartItem.objects.filter(cart_id=cart_id)
+            .select_related('product')
+            .only('id', 'cart_id', 'quantity', 'product__id', 'product__price')
+            .order_by('id')
+        )
+        if not items:
+            raise EmptyCart("Your cart is empty.")
+
+        quantities = {item.product_id: item.quantity for item in items}
+        decremented = Product.objects.filter(
+            Q(is_available=True),
+            Q(*[
+                Q(pk=product_id, stock_quantity__gte=quantity)
+                for product_id, quantity in quantities.items()
+            ], _connector=Q.OR),
+        ).update(
+            stock_quantity=Case(
+                *[
+                    When(pk=product_id, then=F('stock_quantity') - quantity)
+                    for product_id, quantity in quantities.items()
+                ],
+                default=F('stock_quantity'),
+            ),
+            updated_date=timezone.now(),
+        )
+
+        if decremented != len(quantities):
+            # Raising rolls back the decrements that did match
+            raise OutOfStock(shortages(quantities))
+
+        order = Order.objects.create(
+            user=user,
+            total_price=sum(
+                (item.product.price * item.quantity for item in items), Decimal('0')
+            ),
+        )
+        OrderItem.objects.bulk_create([
+            OrderItem(
+                order=order,
+                product_id=item.product_id,
+                quantity=item.quantity,
+                price_at_purchase=item.product.price,  # Price snapshot
+            )
+            for item in items
+        ])
+
+        CartItem.objects.filter(cart_id=cart_id).delete()
+
+        products_bulk_changed.send(
+            sender=Product, product_ids=list(quantities), fields=['stock_quantity']
+        )
+
+    touch_cart(cart_id)
+    return order
+
+
+def shortages(quantities):
+    """
+    [{product, requested, available}, ...] for the lines of
+    `quantities` ({product_id: quantity}) that cannot be bought.
+    """
+    products = Product.objects.filter(pk__in=quantities).values_list(
+        'id', 'is_available', 'stock_quantity'
+    )
+    result = []
+    for product_id, is_available, stock in products:
+        available = stock if is_available else 0
+        if quantities[product_id] > available:
+            result.append({
+                'product': product_id,
+                'requested': quantities[product_id],
+                'available': available,
+            })
+    return result
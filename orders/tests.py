@@ -1,3 +1,146 @@
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from cart.models import Cart, CartItem
+from cart.operations import touch_cart
+from categories.models import Category
+from products.models import Product
+from .models import Order, OrderItem
+
+
+class CreateOrderTests(TestCase):
+    """
+    Checkout is one transaction with a fixed number of queries,
+    and never sells more than the stock.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('shopper', 'shopper@example.com', 'password')
+        category = Category.objects.create(name='Groceries')
+        cls.products = Product.objects.bulk_create([
+            Product(
+                name=f'Product {number}', description='', price=Decimal('2.00') + number,
+                category=category, stock_quantity=10,
+            )
+            for number in range(30)
+        ])
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.cart = Cart.objects.create(user=self.user)
+
+    def fill_cart(self, count, quantity=2):
+        CartItem.objects.bulk_create([
+            CartItem(cart=self.cart, product=product, quantity=quantity)
+            for product in self.products[:count]
+        ])
+
+    def checkout(self):
+        return self.client.post('/api/orders/create/')
+
+    def test_order_is_created_and_stock_decremented(self):
+        self.fill_cart(3)
+        response = self.checkout()
+
+        self.assertEqual(response.status_code, 201)
+        expected = sum(2 * product.price for product in self.products[:3])
+        self.assertEqual(Decimal(response.data['total_price']), expected)
+        self.assertEqual(response.data['total_items'], 3)
+        self.assertEqual(
+            list(Product.objects.filter(pk__in=[p.pk for p in self.products[:3]])
+                 .values_list('stock_quantity', flat=True)),
+            [8, 8, 8]
+        )
+        self.assertEqual(Product.objects.get(pk=self.products[3].pk).stock_quantity, 10)
+        self.assertFalse(CartItem.objects.exists())
+
+    def test_items_snapshot_the_price_at_purchase(self):
+        self.fill_cart(2)
+        order = Order.objects.get(pk=self.checkout().data['id'])
+
+        Product.objects.filter(pk=self.products[0].pk).update(price=Decimal('99.00'))
+
+        self.assertEqual(
+            dict(order.items.values_list('product_id', 'price_at_purchase')),
+            {product.pk: product.price for product in self.products[:2]}
+        )
+        self.assertEqual(
+            dict(order.items.values_list('product_id', 'quantity')),
+            {product.pk: 2 for product in self.products[:2]}
+        )
+        order.refresh_from_db()
+        self.assertEqual(order.total_price, 2 * (self.products[0].price + self.products[1].price))
+        self.assertFalse(self.cart.items.exists())
+
+    def test_query_count_does_not_grow_with_items(self):
+        touch_cart(self.cart.pk)
+        counts = []
+        for count in (1, 30):
+            self.fill_cart(count, quantity=1)
+            with CaptureQueriesContext(connection) as queries:
+                response = self.checkout()
+            self.assertEqual(response.status_code, 201)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_insufficient_stock_is_a_conflict_and_changes_nothing(self):
+        self.fill_cart(2)
+        CartItem.objects.filter(product=self.products[1]).update(quantity=11)
+
+        response = self.checkout()
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['items'], [
+            {'product': self.products[1].pk, 'requested': 11, 'available': 10}
+        ])
+        self.assertEqual(Product.objects.get(pk=self.products[0].pk).stock_quantity, 10)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(CartItem.objects.count(), 2)
+
+    def test_every_shortage_is_listed(self):
+        self.fill_cart(3)
+        CartItem.objects.filter(product__in=self.products[1:3]).update(quantity=12)
+        Product.objects.filter(pk=self.products[2].pk).update(stock_quantity=4)
+
+        response = self.checkout()
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(
+            sorted(response.data['items'], key=lambda item: item['product']),
+            [
+                {'product': self.products[1].pk, 'requested': 12, 'available': 10},
+                {'product': self.products[2].pk, 'requested': 12, 'available': 4},
+            ]
+        )
+        self.assertEqual(
+            list(Product.objects.filter(pk__in=[p.pk for p in self.products[:3]])
+                 .order_by('pk').values_list('stock_quantity', flat=True)),
+            [10, 10, 4]
+        )
+        self.assertFalse(OrderItem.objects.exists())
+
+    def test_unavailable_product_is_a_conflict(self):
+        self.fill_cart(1)
+        Product.objects.filter(pk=self.products[0].pk).update(is_available=False)
+        response = self.checkout()
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['items'][0]['available'], 0)
+
+    def test_empty_cart(self):
+        response = self.checkout()
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(OrderItem.objects.exists())
 
-# Create your tests here.
+    def test_missing_cart(self):
+        self.cart.delete()
+        response = self.checkout()
+        self.assertEqual(response.status_code, 404)
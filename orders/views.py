@@ -1,81 +1,97 @@
 from rest_framework import generics, status
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from django.shortcuts import get_object_or_404
+from django.db.models import Prefetch
 
+from ecommerce_api.pagination import OptionalCursorPagination
+
+from .checkout import EmptyCart, OutOfStock, place_order
 from .models import Order, OrderItem
-from cart.models import Cart, CartItem
-from products.models import Product
+from cart.models import Cart
+from products.serializers import ProductSerializer
 from .serializers import OrderSerializer
 
 
+def order_queryset(request):
+    """
+    Orders with their items and the product columns they display
+    (two queries however many items). Supports ?product_fields=.
+    """
+    fields = ProductSerializer.selected_fields(request.query_params, nested=True)
+    items = ProductSerializer.prune_queryset(
+        OrderItem.objects.all(),
+        fields,
+        prefix='product__',
+        keep=['id', 'order', 'product', 'quantity', 'price_at_purchase']
+    )
+    return Order.objects.prefetch_related(Prefetch('items', queryset=items))
+
+
 class CreateOrderView(generics.CreateAPIView):
     """
     Creates a new order from the authenticated user's cart.
-    Steps:
-      1. Get user cart
+    Steps (one transaction, see orders.checkout.place_order):
+      1. Lock the user's cart
       2. Ensure cart is not empty
-      3. Create new Order instance
-      4. Copy CartItems → OrderItems
-      5. Deduct stock quantities
-      6. Compute order total
-      7. Clear cart
+      3. Deduct stock quantities (one conditional UPDATE)
+      4. Create the Order with its total and all OrderItems
+      5. Clear cart
+
+    - no cart → 404, empty cart → 400
+    - not enough stock for any item → 409, nothing is changed
     """
     serializer_class = OrderSerializer
     permission_classes = [IsAuthenticated]
 
     def post(self, request, *args, **kwargs):
-        # Retrieve the user’s cart. If not found → 404
-        cart = get_object_or_404(Cart, user=request.user)
-        items = cart.items.all()
-
-        # Prevent creating empty orders
-        if not items.exists():
+        try:
+            order = place_order(request.user)
+        except Cart.DoesNotExist:
+            return Response({"error": "Cart not found."},
+                            status=status.HTTP_404_NOT_FOUND)
+        except EmptyCart:
             return Response(
                 {"error": "Your cart is empty."},
                 status=status.HTTP_400_BAD_REQUEST
             )
-
-        # Create the main Order object
-        order = Order.objects.create(user=request.user)
-
-        # Loop through cart items and convert each into an OrderItem
-        for item in items:
-            OrderItem.objects.create(
-                order=order,
-                product=item.product,
-                quantity=item.quantity,
-                price_at_purchase=item.product.price  # Save price snapshot
+        except OutOfStock as exc:
+            return Response(
+                {
+                    "error": "Some products do not have enough stock.",
+                    "items": exc.shortages,
+                },
+                status=status.HTTP_409_CONFLICT
             )
 
-            # Deduct purchased quantity from product stock
-            item.product.stock_quantity -= item.quantity
-            item.product.save()
-
-        # Calculate and store the total price
-        order.calculate_total()
-
-        # Clear cart after successful order creation
-        cart.items.all().delete()
-
         # Return detailed order data to the client
+        order = order_queryset(request).get(pk=order.pk)
         return Response(
-            OrderSerializer(order).data,
+            OrderSerializer(order, context={'request': request}).data,
             status=status.HTTP_201_CREATED
         )
 
 
-
 class OrderListView(generics.ListAPIView):
     """
     Returns a list of all orders that belong to the authenticated user.
 
     Example:
       GET /api/orders/
+      GET /api/orders/?pagination=cursor
+      GET /api/orders/?product_fields=id,name
     """
     serializer_class = OrderSerializer
     permission_classes = [IsAuthenticated]
 
+    ordering = ['-created_at']
+    pagination_class = OptionalCursorPagination
+    cursor_ordering_fields = ['created_at']
+
     def get_queryset(self):
-        # Only return orders belonging to the logged-in user
-        return Order.objects.filter(user=self.request.user).order_by('-created_at')
+        # Only return orders belonging to the logged-in user,
+        # with their items and the product columns they display.
+        return (
+            order_queryset(self.request)
+            .filter(user=self.request.user)
+            .order_by('-created_at')
+        )
@@ -38,5 +38,8 @@ class ProductAdmin(admin.ModelAdmin):
 
     # Prevent changing these fields manually
     readonly_fields = [
-        'created_date', 'updated_date', 'created_by'
+        'created_date', 'updated_date', 'created_by',
+        'review_count', 'rating_sum', 'avg_rating',
+        'rating_1_count', 'rating_2_count', 'rating_3_count',
+        'rating_4_count', 'rating_5_count'
     ]
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class ProductsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'products'
+
+    def ready(self):
+        # Connect signal receivers (search index sync, ...)
+        from . import signals  # noqa: F401
+        # Warn when the response cache is not shared by the workers
+        from ecommerce_api import checks  # noqa: F401
@@ -0,0 +1,282 @@
+import heapq
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+
+from django.conf import settings
+from django.db.models import Count
+
+from categories.models import Category
+from .models import Product
+from .search import tokenize
+
+
+# Index at most this many products (most reviewed first) per process
+DEFAULT_MAX_PRODUCTS = 50000
+
+# Seconds before a process reloads its index from the database.
+# Saves/deletes made by this process are applied immediately;
+# the reload picks up other processes' writes and new review counts.
+DEFAULT_REBUILD_INTERVAL = 300
+
+# Results for prefixes this short match a large part of the index,
+# so their top results are cached until a matching entry changes.
+SHORT_PREFIX = 2
+
+
+def normalize(text):
+    """
+    Lowercase, accent-free tokens: "Café Crème" → ['cafe', 'creme'].
+    """
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return tokenize(text)
+
+
+class PrefixIndex:
+    """
+    Compact in-memory prefix index over short names.
+
+    - `vocabulary` is the sorted list of distinct name tokens;
+      a prefix maps to one contiguous range of it (bisect)
+    - `postings` maps token → [(-score, id), ...] sorted best first
+    - `entries` maps id → (name, score, tokens)
+
+    A lookup merges the posting lists of the matching tokens in
+    score order and stops after `limit` entries, so its cost depends
+    on the number of matching tokens, not on the number of products.
+    All access goes through one lock.
+    """
+
+    def __init__(self, max_entries=None):
+        self.max_entries = max_entries
+        self.vocabulary = []
+        self.postings = {}
+        self.entries = {}
+        self.top_cache = {}
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def load(self, rows):
+        """
+        Replaces the contents with (id, name, score) rows.
+        """
+        postings = {}
+        entries = {}
+        for pk, name, score in rows:
+            if self.max_entries is not None and len(entries) >= self.max_entries:
+                break
+            tokens = tuple(sorted(set(normalize(name))))
+            if not tokens:
+                continue
+            entries[pk] = (name, score, tokens)
+            for token in tokens:
+                postings.setdefault(token, []).append((-score, pk))
+
+        for posting in postings.values():
+            posting.sort()
+
+        with self.lock:
+            self.vocabulary = sorted(postings)
+            self.postings = postings
+            self.entries = entries
+            self.top_cache = {}
+
+    def add(self, pk, name, score):
+        tokens = tuple(sorted(set(normalize(name))))
+        with self.lock:
+            self._remove(pk)
+            if not tokens:
+                return
+            if self.max_entries is not None and len(self.entries) >= self.max_entries:
+                # Full; the next reload decides what stays
+                return
+            self.entries[pk] = (name, score, tokens)
+            for token in tokens:
+                if token not in self.postings:
+                    insort(self.vocabulary, token)
+                    self.postings[token] = []
+                insort(self.postings[token], (-score, pk))
+            self._expire(tokens)
+
+    def remove(self, pk):
+        with self.lock:
+            self._remove(pk)
+
+    def _remove(self, pk):
+        entry = self.entries.pop(pk, None)
+        if entry is None:
+            return
+        _, score, tokens = entry
+        for token in tokens:
+            posting = self.postings[token]
+            position = bisect_left(posting, (-score, pk))
+            if position < len(posting) and posting[position][1] == pk:
+                del posting[position]
+            if not posting:
+                del self.postings[token]
+                del self.vocabulary[bisect_left(self.vocabulary, token)]
+        self._expire(tokens)
+
+    def _expire(self, tokens):
+        for token in tokens:
+            for length in range(1, SHORT_PREFIX + 1):
+                self.top_cache.pop(token[:length], None)
+
+    def _matching_tokens(self, prefix):
+        position = bisect_left(self.vocabulary, prefix)
+        vocabulary = self.vocabulary
+        while position < len(vocabulary) and vocabulary[position].startswith(prefix):
+            yield vocabulary[position]
+            position += 1
+
+    def _lookup(self, terms, limit):
+        """
+        Best entries having a token starting with each of `terms`.
+        The longest term drives the merge; the others are checked
+        against each candidate's tokens.
+        """
+        driver, *others = sorted(set(terms), key=len, reverse=True)
+        merged = heapq.merge(*(self.postings[token] for token in self._matching_tokens(driver)))
+
+        results = []
+        seen = set()
+        for negative_score, pk in merged:
+            if pk in seen:
+                continue
+            seen.add(pk)
+            name, score, tokens = self.entries[pk]
+            if all(any(token.startswith(term) for token in tokens) for term in others):
+                results.append((pk, name, score))
+                if len(results) >= limit:
+                    break
+        return results
+
+    def search(self, query, limit=10):
+        """
+        [(id, name, score), ...] for entries whose tokens start
+        with every token of `query`, best score first.
+        """
+        terms = normalize(query)
+        if not terms:
+            return []
+
+        with self.lock:
+            if len(terms) > 1 or len(terms[0]) > SHORT_PREFIX:
+                return self._lookup(terms, limit)
+
+            # One- and two-letter prefixes match many tokens;
+            # their results are kept until a matching entry changes
+            prefix = terms[0]
+            cached_limit, results = self.top_cache.get(prefix, (0, None))
+            if results is None or limit > cached_limit:
+                cached_limit = max(limit, 10)
+                results = self._lookup(terms, cached_limit)
+                self.top_cache[prefix] = (cached_limit, results)
+            return results[:limit]
+
+
+# -----------------------------------------
+# PER-PROCESS INDEX
+# -----------------------------------------
+
+class Autocomplete:
+    """
+    Product and category name indexes of this process.
+
+    Products are ranked by review_count, categories by their
+    number of products. The whole index is reloaded from the
+    database every PRODUCT_AUTOCOMPLETE_REBUILD_INTERVAL seconds
+    (checked lazily on lookup); in between, signals keep it current.
+    """
+
+    def __init__(self):
+        max_products = getattr(settings, 'PRODUCT_AUTOCOMPLETE_MAX_PRODUCTS', DEFAULT_MAX_PRODUCTS)
+        self.products = PrefixIndex(max_entries=max_products)
+        self.categories = PrefixIndex()
+        self.loaded_at = None
+        self.reload_lock = threading.Lock()
+
+    @property
+    def rebuild_interval(self):
+        return getattr(settings, 'PRODUCT_AUTOCOMPLETE_REBUILD_INTERVAL', DEFAULT_REBUILD_INTERVAL)
+
+    def is_stale(self):
+        return self.loaded_at is None or time.monotonic() - self.loaded_at > self.rebuild_interval
+
+    def ensure_loaded(self):
+        if not self.is_stale():
+            return
+        # One thread reloads; the others keep serving the old index
+        if not self.reload_lock.acquire(blocking=self.loaded_at is None):
+            return
+        try:
+            if self.is_stale():
+                self.reload()
+        finally:
+            self.reload_lock.release()
+
+    def reload(self):
+        self.products.load(
+            Product.objects.filter(is_available=True)
+            .order_by('-review_count', 'id')
+            .values_list('id', 'name', 'review_count')
+            .iterator(chunk_size=5000)
+        )
+        self.categories.load(
+            Category.objects.annotate(score=Count('products'))
+            .order_by('-score', 'id')
+            .values_list('id', 'name', 'score')
+        )
+        self.loaded_at = time.monotonic()
+
+    def suggest(self, query, limit=10, category_limit=3):
+        self.ensure_loaded()
+        return {
+            'categories': [
+                {'id': pk, 'name': name, 'product_count': score}
+                for pk, name, score in self.categories.search(query, category_limit)
+            ],
+            'products': [
+                {'id': pk, 'name': name, 'review_count': score}
+                for pk, name, score in self.products.search(query, limit)
+            ],
+        }
+
+    # Incremental updates (no-ops until the index is first used)
+
+    def update_product(self, product):
+        if self.loaded_at is None:
+            return
+        if product.is_available:
+            self.products.add(product.pk, product.name, product.review_count)
+        else:
+            self.products.remove(product.pk)
+
+    def remove_product(self, pk):
+        if self.loaded_at is not None:
+            self.products.remove(pk)
+
+    def update_category(self, category):
+        if self.loaded_at is None:
+            return
+        entry = self.categories.entries.get(category.pk)
+        score = entry[1] if entry else 0
+        self.categories.add(category.pk, category.name, score)
+
+    def remove_category(self, pk):
+        if self.loaded_at is not None:
+            self.categories.remove(pk)
+
+
+_autocomplete = None
+
+
+def get_autocomplete():
+    global _autocomplete
+    if _autocomplete is None:
+        _autocomplete = Autocomplete()
+    return _autocomplete
@@ -0,0 +1,289 @@
+import json
+import os
+import time
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from scipy import sparse
+
+from orders.models import Order, OrderItem
+from ecommerce_api.cache import bump_version
+from .models import FrequentlyBoughtTogether, Product
+
+
+MATRIX_FILE = 'copurchase_counts.npz'
+STATE_FILE = 'copurchase_state.json'
+
+
+def state_dir():
+    return getattr(settings, 'RECOMMENDATIONS_DIR', os.path.join(settings.BASE_DIR, 'var', 'recommendations'))
+
+
+def atomic_write(path, write):
+    """
+    Calls write(temporary_path) and renames the result into place.
+    """
+    temporary = f'{path}.tmp'
+    write(temporary)
+    os.replace(temporary, path)
+
+
+class CoPurchaseBuilder:
+    """
+    Builds the "frequently bought together" table from order history.
+
+    The product × product co-occurrence counts are kept in a sparse
+    matrix C indexed by product id, saved as .npz between runs:
+
+    - C[i, j] = number of orders containing both i and j
+    - C[i, i] = number of orders containing i
+
+    Each run reads only order items newer than the last processed
+    order, turns every chunk of orders into a sparse order × product
+    incidence matrix B and adds B.T @ B to C, so counting happens in
+    scipy rather than in a SQL self-join.
+
+    Neighbours are scored with cosine similarity,
+    C[i, j] / sqrt(C[i, i] * C[j, j]), and the top `top_k` per product
+    are written to FrequentlyBoughtTogether. Only products whose
+    neighbourhood changed are rewritten.
+    """
+    top_k = 10
+    min_count = 1
+    chunk_size = 50000          # orders per incidence matrix
+    write_batch_size = 5000
+
+    # Orders in these states never count as purchases
+    excluded_statuses = ('cancelled',)
+
+    def __init__(self, directory=None, top_k=None, min_count=None):
+        self.directory = directory or state_dir()
+        if top_k:
+            self.top_k = top_k
+        if min_count:
+            self.min_count = min_count
+
+    # -----------------------------------------
+    # STATE
+    # -----------------------------------------
+
+    @property
+    def matrix_path(self):
+        return os.path.join(self.directory, MATRIX_FILE)
+
+    @property
+    def state_path(self):
+        return os.path.join(self.directory, STATE_FILE)
+
+    @staticmethod
+    def empty_state():
+        return sparse.csr_matrix((0, 0), dtype=np.int32), 0, np.array([], dtype=np.int64)
+
+    def load_state(self):
+        """
+        Returns (counts, last_order_id, pending_product_ids).
+        """
+        if not (os.path.exists(self.matrix_path) and os.path.exists(self.state_path)):
+            return self.empty_state()
+
+        with open(self.state_path) as state_file:
+            state = json.load(state_file)
+        counts = sparse.load_npz(self.matrix_path).tocsr()
+        pending = np.array(state.get('pending', []), dtype=np.int64)
+        return counts, state['last_order_id'], pending
+
+    def save_state(self, counts, last_order_id, pending):
+        os.makedirs(self.directory, exist_ok=True)
+        state = {'last_order_id': last_order_id, 'pending': [int(pk) for pk in pending]}
+
+        def write_matrix(path):
+            with open(path, 'wb') as matrix_file:
+                sparse.save_npz(matrix_file, counts)
+
+        def write_state(path):
+            with open(path, 'w') as state_file:
+                json.dump(state, state_file)
+
+        # The matrix goes first: a state file never points
+        # past the orders that the saved matrix contains
+        atomic_write(self.matrix_path, write_matrix)
+        atomic_write(self.state_path, write_state)
+
+    # -----------------------------------------
+    # COUNTING
+    # -----------------------------------------
+
+    def iter_order_chunks(self, after_id, up_to_id):
+        """
+        Yields (order_ids, product_ids) numpy arrays, one pair per
+        chunk of `chunk_size` orders, in order id order.
+        """
+        items = (
+            OrderItem.objects
+            .filter(order_id__gt=after_id, order_id__lte=up_to_id, product_id__isnull=False)
+            .exclude(order__status__in=self.excluded_statuses)
+            .order_by('order_id')
+            .values_list('order_id', 'product_id')
+        )
+
+        order_ids, product_ids = [], []
+        orders_in_chunk = 0
+        previous_order = None
+        for order_id, product_id in items.iterator(chunk_size=self.write_batch_size):
+            if order_id != previous_order:
+                if orders_in_chunk >= self.chunk_size:
+                    yield np.array(order_ids), np.array(product_ids)
+                    order_ids, product_ids, orders_in_chunk = [], [], 0
+                orders_in_chunk += 1
+                previous_order = order_id
+            order_ids.append(order_id)
+            product_ids.append(product_id)
+
+        if order_ids:
+            yield np.array(order_ids), np.array(product_ids)
+
+    @staticmethod
+    def co_occurrence(order_ids, product_ids, size):
+        """
+        B.T @ B for the binary order × product incidence matrix B.
+        """
+        rows = np.unique(order_ids, return_inverse=True)[1]
+        incidence = sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.int32), (rows, product_ids)),
+            shape=(rows.max() + 1, size)
+        )
+        # The same product twice in one order counts once
+        incidence.sum_duplicates()
+        incidence.data[:] = 1
+        return (incidence.T @ incidence).tocsr()
+
+    @staticmethod
+    def resize(counts, size):
+        if counts.shape[0] >= size:
+            return counts
+        counts = counts.tocsr().copy()
+        counts.resize((size, size))
+        return counts
+
+    # -----------------------------------------
+    # TOP-K
+    # -----------------------------------------
+
+    def top_neighbours(self, counts, diagonal, product_ids):
+        """
+        Yields (product_id, [(related_id, co_count, score), ...]) for
+        the given rows of the count matrix, best score first.
+        `diagonal` is counts.diagonal() as floats.
+        """
+        for product_id in product_ids:
+            start, end = counts.indptr[product_id], counts.indptr[product_id + 1]
+            related = counts.indices[start:end]
+            co_counts = counts.data[start:end]
+
+            keep = (related != product_id) & (co_counts >= self.min_count)
+            related, co_counts = related[keep], co_counts[keep]
+            if not len(related):
+                yield product_id, []
+                continue
+
+            scores = co_counts / np.sqrt(diagonal[product_id] * diagonal[related])
+
+            if len(scores) > self.top_k:
+                best = np.argpartition(-scores, self.top_k)[:self.top_k]
+                related, co_counts, scores = related[best], co_counts[best], scores[best]
+
+            # Highest score first, then most co-purchases, then lowest id
+            order = np.lexsort((related, -co_counts, -scores))
+            yield product_id, [
+                (int(related[i]), int(co_counts[i]), float(scores[i])) for i in order
+            ]
+
+    def write(self, counts, product_ids):
+        """
+        Replaces the rows of `product_ids` in the FrequentlyBoughtTogether
+        table; each batch is deleted and re-inserted in one transaction,
+        so readers see either its old or its new rows.
+        """
+        existing = set(Product.objects.values_list('id', flat=True))
+        diagonal = counts.diagonal().astype(np.float64)
+        written = 0
+
+        for start in range(0, len(product_ids), self.write_batch_size):
+            batch = [int(pk) for pk in product_ids[start:start + self.write_batch_size]]
+            rows = [
+                FrequentlyBoughtTogether(
+                    product_id=product_id, related_id=related_id,
+                    co_count=co_count, score=score, rank=rank,
+                )
+                for product_id, neighbours in self.top_neighbours(counts, diagonal, batch)
+                if product_id in existing
+                for rank, (related_id, co_count, score) in enumerate(
+                    [n for n in neighbours if n[0] in existing], start=1
+                )
+            ]
+            with transaction.atomic():
+                FrequentlyBoughtTogether.objects.filter(product_id__in=batch).delete()
+                FrequentlyBoughtTogether.objects.bulk_create(rows, batch_size=self.write_batch_size)
+            written += len(rows)
+
+        return written
+
+    # -----------------------------------------
+    # RUN
+    # -----------------------------------------
+
+    def run(self, full=False):
+        started = time.monotonic()
+
+        counts, last_order_id, pending = self.empty_state() if full else self.load_state()
+
+        up_to_id = Order.objects.order_by('-id').values_list('id', flat=True).first() or 0
+        size = max(
+            counts.shape[0],
+            (Product.objects.order_by('-id').values_list('id', flat=True).first() or 0) + 1
+        )
+        counts = self.resize(counts, size)
+
+        touched = [pending]
+        orders = 0
+        for order_ids, product_ids in self.iter_order_chunks(last_order_id, up_to_id):
+            # Products created after `size` was read
+            if product_ids.max() >= counts.shape[0]:
+                counts = self.resize(counts, int(product_ids.max()) + 1)
+            counts = counts + self.co_occurrence(order_ids, product_ids, counts.shape[0])
+            touched.append(np.unique(product_ids))
+            orders += len(np.unique(order_ids))
+
+        touched = np.unique(np.concatenate(touched)).astype(np.int64)
+
+        # Rows to rewrite: the touched products and every product
+        # co-purchased with one of them (their scores depend on the
+        # touched products' order counts). A full rebuild rewrites
+        # every product id, so stale rows of products that no longer
+        # have neighbours are replaced batch by batch like the others
+        # and the table is never emptied while it is being served.
+        if full:
+            affected = np.arange(counts.shape[0], dtype=np.int64)
+        elif len(touched):
+            affected = np.union1d(touched, counts[touched].indices)
+        else:
+            affected = touched
+
+        # Saved before the table is written, with the rows still to
+        # write, so an interrupted run never counts orders twice
+        self.save_state(counts, up_to_id, affected)
+
+        written = self.write(counts, affected)
+        self.save_state(counts, up_to_id, [])
+
+        if len(affected):
+            bump_version('products.FrequentlyBoughtTogether')
+
+        return {
+            'orders': orders,
+            'products': len(affected),
+            'rows': written,
+            'last_order_id': up_to_id,
+            'seconds': round(time.monotonic() - started, 3),
+        }
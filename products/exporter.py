@@ -0,0 +1,87 @@
+import csv
+import io
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+
+# Same columns the importer reads (category by name), plus read-only ones
+EXPORT_FIELDS = [
+    ('id', 'id'),
+    ('sku', 'sku'),
+    ('name', 'name'),
+    ('description', 'description'),
+    ('price', 'price'),
+    ('category', 'category__name'),
+    ('stock_quantity', 'stock_quantity'),
+    ('image_url', 'image_url'),
+    ('is_available', 'is_available'),
+    ('review_count', 'review_count'),
+    ('avg_rating', 'avg_rating'),
+    ('created_date', 'created_date'),
+    ('updated_date', 'updated_date'),
+]
+
+FORMATS = ('csv', 'jsonl')
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+}
+
+# Rows fetched per database round trip / rows per yielded chunk
+CHUNK_SIZE = 2000
+
+
+def iter_rows(queryset):
+    """
+    Plain tuples straight from the cursor: no model instances,
+    no serializer, `CHUNK_SIZE` rows per fetch.
+    """
+    lookups = [lookup for _, lookup in EXPORT_FIELDS]
+    return queryset.values_list(*lookups).iterator(chunk_size=CHUNK_SIZE)
+
+
+def iter_csv(queryset):
+    """
+    Yields the export as CSV text, one chunk of rows at a time.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([column for column, _ in EXPORT_FIELDS])
+
+    # Header goes out before the first query runs
+    yield buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+
+    for count, row in enumerate(iter_rows(queryset), start=1):
+        writer.writerow(row)
+        if count % CHUNK_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    yield buffer.getvalue()
+
+
+def iter_jsonl(queryset):
+    """
+    Yields the export as JSON Lines, one chunk of rows at a time.
+    """
+    columns = [column for column, _ in EXPORT_FIELDS]
+    encoder = DjangoJSONEncoder()
+    lines = []
+
+    for row in iter_rows(queryset):
+        lines.append(encoder.encode(dict(zip(columns, row))))
+        if len(lines) >= CHUNK_SIZE:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+def iter_export(queryset, file_format):
+    if file_format == 'jsonl':
+        return iter_jsonl(queryset)
+    return iter_csv(queryset)
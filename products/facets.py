@@ -0,0 +1,131 @@
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from categories.models import Category
+from ecommerce_api.cache import normalize_query, versioned_key
+from .models import IN_STOCK, PURCHASABLE
+
+
+# Default price bands for the histogram: [0-25), [25-50), ... [1000+)
+DEFAULT_PRICE_BUCKETS = [0, 25, 50, 100, 250, 500, 1000]
+
+# Query parameters that change paging/sorting but not the facet counts
+IGNORED_PARAMS = {'page', 'page_size', 'cursor', 'pagination', 'ordering', 'format'}
+
+# Facets are invalidated whenever one of these models changes
+FACET_MODELS = ('products.Product', 'categories.Category')
+
+
+def get_price_buckets():
+    edges = getattr(settings, 'PRODUCT_FACET_PRICE_BUCKETS', DEFAULT_PRICE_BUCKETS)
+    return [Decimal(str(edge)) for edge in edges]
+
+
+def facets_cache_key(query_params):
+    """
+    Cache key built from the normalized filter parameters
+    (paging/sorting params dropped) and the product/category
+    versions. So ?max_price=50&category=fruits and
+    ?category=fruits&max_price=50 share one entry, and any
+    product or category change starts a fresh one.
+    """
+    return versioned_key(
+        'product-facets',
+        FACET_MODELS,
+        normalize_query(query_params, ignore=IGNORED_PARAMS),
+    )
+
+
+def compute_facets(queryset):
+    """
+    Computes the sidebar facets for an already-filtered Product queryset
+    in two queries (three when parent categories have no products
+    of their own):
+
+    1. one GROUP BY category → per-category counts, rolled up to
+       every ancestor using the categories' materialized paths
+    2. one aggregate with conditional COUNTs → totals, in-stock,
+       available and every price bucket
+    """
+    queryset = queryset.order_by()
+
+    categories = rollup_category_counts(
+        queryset.values('category_id', 'category__name', 'category__path')
+        .annotate(count=Count('id'))
+    )
+
+    edges = get_price_buckets()
+    buckets = []
+    aggregates = {
+        'total': Count('id'),
+        'in_stock': Count('id', filter=IN_STOCK),
+        'available': Count('id', filter=PURCHASABLE),
+    }
+    for index, low in enumerate(edges):
+        high = edges[index + 1] if index + 1 < len(edges) else None
+        condition = Q(price__gte=low)
+        if high is not None:
+            condition &= Q(price__lt=high)
+        aggregates[f'bucket_{index}'] = Count('id', filter=condition)
+        buckets.append((index, low, high))
+
+    totals = queryset.aggregate(**aggregates)
+
+    return {
+        'total': totals['total'],
+        'in_stock': totals['in_stock'],
+        'available': totals['available'],
+        'categories': categories,
+        'price_ranges': [
+            {
+                'min': str(low),
+                'max': str(high) if high is not None else None,
+                'count': totals[f'bucket_{index}'],
+            }
+            for index, low, high in buckets
+        ],
+    }
+
+
+def rollup_category_counts(rows):
+    """
+    Per-category counts → counts including subcategories:
+    a product in /1/5/12/ counts for categories 1, 5 and 12.
+    """
+    counts = {}
+    names = {}
+    for row in rows:
+        names[row['category_id']] = row['category__name']
+        for pk in row['category__path'].strip('/').split('/'):
+            counts[int(pk)] = counts.get(int(pk), 0) + row['count']
+
+    missing = set(counts) - set(names)
+    if missing:
+        names.update(Category.objects.filter(id__in=missing).values_list('id', 'name'))
+
+    facets = [
+        {'id': pk, 'name': names[pk], 'count': count}
+        for pk, count in counts.items() if pk in names
+    ]
+    facets.sort(key=lambda facet: (-facet['count'], facet['name']))
+    return facets
+
+
+def get_facets(queryset, query_params):
+    """
+    Cached wrapper around compute_facets().
+    Entries are dropped as soon as a product or category changes,
+    and live at most PRODUCT_FACETS_CACHE_TIMEOUT seconds (default 60).
+    """
+    key = facets_cache_key(query_params)
+    facets = cache.get(key)
+
+    if facets is None:
+        facets = compute_facets(queryset)
+        timeout = getattr(settings, 'PRODUCT_FACETS_CACHE_TIMEOUT', 60)
+        cache.set(key, facets, timeout)
+
+    return facets
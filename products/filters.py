@@ -1,5 +1,8 @@
 import django_filters
+from rest_framework import filters
+from categories.registry import get_category_registry
 from .models import Product
+from .search import get_search_backend
 
 
 class ProductFilter(django_filters.FilterSet):
@@ -13,6 +16,7 @@ class ProductFilter(django_filters.FilterSet):
       /api/products/?category=Electronics
       /api/products/?min_price=100&max_price=500
       /api/products/?in_stock=true
+      /api/products/?min_rating=4
     """
 
     # Filter products where name contains a given substring
@@ -20,11 +24,9 @@ class ProductFilter(django_filters.FilterSet):
     name = django_filters.CharFilter(lookup_expr='icontains')
 
     # Allows filtering by category name, not category ID
-    # e.g. /api/products/?category=Fruits
-    category = django_filters.CharFilter(
-        field_name='category__name',  # Follow the FK: Product.category.name
-        lookup_expr='iexact'          # Exact match, but ignore case
-    )
+    # e.g. /api/products/?category=Electronics
+    # Products of subcategories (Electronics > Phones) are included
+    category = django_filters.CharFilter(method='filter_category')
 
     # Minimum price filter (price >= min_price)
     min_price = django_filters.NumberFilter(
@@ -38,6 +40,13 @@ class ProductFilter(django_filters.FilterSet):
         lookup_expr='lte'  # less than or equal
     )
 
+    # Average star rating filter (avg_rating >= min_rating)
+    # Uses the indexed, pre-computed Product.avg_rating column
+    min_rating = django_filters.NumberFilter(
+        field_name='avg_rating',
+        lookup_expr='gte'
+    )
+
     # Boolean filter for checking stock availability
     # Calls custom method filter_in_stock()
     in_stock = django_filters.BooleanFilter(method='filter_in_stock')
@@ -58,6 +67,17 @@ class ProductFilter(django_filters.FilterSet):
 
 
 
+    def filter_category(self, queryset, name, value):
+        """
+        Category name (case-insensitive) or slug → products of that
+        category and all its descendants. The ids come from the
+        in-process category registry, so the query gets a plain
+        indexed predicate and no join:
+
+            category_id IN (1, 5, 12)
+        """
+        return queryset.filter(category_id__in=get_category_registry().subtree_ids(value))
+
     def filter_in_stock(self, queryset, name, value):
         """
         Custom filter function.
@@ -71,5 +91,59 @@ class ProductFilter(django_filters.FilterSet):
         value = False → return products with stock_quantity == 0  
         """
         if value:
-            return queryset.filter(stock_quantity__gt=0)
+            return queryset.in_stock()
         return queryset.filter(stock_quantity=0)
+
+    def filter_queryset(self, queryset):
+        """
+        ?is_available=true&in_stock=true is the most common combination.
+        It is applied as one purchasable() condition, the exact predicate
+        of the product_buyable_* partial indexes; every other filter
+        runs as usual.
+        """
+        data = self.form.cleaned_data
+        if data.get('is_available') is True and data.get('in_stock') is True:
+            queryset = queryset.purchasable()
+            data = {
+                key: value for key, value in data.items()
+                if key not in ('is_available', 'in_stock')
+            }
+
+        for name, value in data.items():
+            queryset = self.filters[name].filter(queryset, value)
+        return queryset
+
+
+
+class ProductSearchFilter(filters.SearchFilter):
+    """
+    Drop-in replacement for DRF's SearchFilter.
+
+    Instead of chaining icontains lookups over `search_fields`,
+    the ?search= terms are sent to the configured full-text
+    backend (see products/search.py), which returns the
+    matching products ranked by relevance.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        search_terms = self.get_search_terms(request)
+        if not search_terms:
+            return queryset
+        return get_search_backend().search(queryset, ' '.join(search_terms))
+
+
+
+class ProductOrderingFilter(filters.OrderingFilter):
+    """
+    OrderingFilter that keeps relevance order for searches.
+
+    If the queryset was ranked by the search backend and the client
+    did not ask for an explicit ?ordering=, the default ordering
+    is skipped so the best matches come first.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        if (self.ordering_param not in request.query_params
+                and 'search_rank' in queryset.query.annotations):
+            return queryset
+        return super().filter_queryset(request, queryset, view)
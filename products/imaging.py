@@ -0,0 +1,64 @@
+import hashlib
+import os
+
+from PIL import Image, ImageOps
+
+
+# This module only depends on Pillow so it can run inside
+# worker processes without setting up Django.
+
+SAVE_OPTIONS = {
+    'WEBP': {'quality': 80, 'method': 4},
+    'JPEG': {'quality': 82, 'optimize': True, 'progressive': True},
+}
+
+
+def hash_stream(stream, chunk_size=1024 * 1024):
+    """
+    SHA-256 hex digest of a binary stream, read in chunks.
+    """
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: stream.read(chunk_size), b''):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def hash_file(path):
+    with open(path, 'rb') as stream:
+        return hash_stream(stream)
+
+
+def render_variants(source_path, targets, image_format='WEBP'):
+    """
+    Writes resized copies of `source_path`.
+
+    targets = [(max_side_px, absolute_output_path), ...], smallest first.
+    Existing outputs are skipped; each file is written to a temporary
+    name and renamed, so readers never see a half-written image.
+
+    Returns the list of paths written.
+    """
+    written = []
+    pending = [(size, path) for size, path in targets if not os.path.exists(path)]
+    if not pending:
+        return written
+
+    with Image.open(source_path) as original:
+        image = ImageOps.exif_transpose(original)
+
+        if image_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        elif image.mode not in ('RGB', 'RGBA', 'L'):
+            image = image.convert('RGBA')
+
+        for size, path in pending:
+            variant = image.copy()
+            variant.thumbnail((size, size), Image.Resampling.LANCZOS)
+
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temporary = f'{path}.{os.getpid()}.tmp'
+            variant.save(temporary, image_format, **SAVE_OPTIONS.get(image_format, {}))
+            os.replace(temporary, path)
+            written.append(path)
+
+    return written
@@ -0,0 +1,198 @@
+import csv
+import io
+import json
+import time
+
+from django.db import transaction
+from rest_framework import serializers
+
+from categories.models import Category
+from .models import Product
+from .serializers import ProductImportSerializer
+from .signals import products_bulk_changed
+
+
+# Columns refreshed when an imported SKU already exists.
+# created_date / created_by / review aggregates are left alone.
+UPSERT_FIELDS = [
+    'name', 'description', 'price', 'category',
+    'stock_quantity', 'image_url', 'is_available', 'updated_date',
+]
+
+FORMATS = ('csv', 'jsonl')
+
+
+def detect_format(filename, default='csv'):
+    name = (filename or '').lower()
+    if name.endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    if name.endswith('.csv'):
+        return 'csv'
+    return default
+
+
+class ProductImporter:
+    """
+    Streaming product importer for supplier feeds.
+
+    - Reads CSV (header row) or JSON Lines one row at a time
+    - Validates every row with ProductImportSerializer
+    - Resolves category names from one prefetched {name: id} map
+    - Upserts on `sku` with bulk_create(update_conflicts=True),
+      `batch_size` rows per transaction
+
+    The report counts written products in `imported`; rows whose SKU
+    repeats later in the same batch are superseded by that later row
+    and counted in `duplicates` instead.
+
+    Only one batch is held in memory, so memory use does not grow
+    with the file size. Per-row errors are collected (up to
+    `max_errors`) and the import carries on with the next row.
+    """
+    batch_size = 1000
+    max_errors = 1000
+
+    def __init__(self, user=None, batch_size=None):
+        self.user = user
+        if batch_size:
+            self.batch_size = batch_size
+
+        categories = {
+            name.casefold(): pk
+            for pk, name in Category.objects.values_list('id', 'name')
+        }
+        self.serializer = ProductImportSerializer(context={'categories': categories})
+
+    # -----------------------------------------
+    # READING
+    # -----------------------------------------
+
+    @staticmethod
+    def open_text(stream):
+        """
+        Wraps a binary file (e.g. an upload) for line-by-line text reading.
+        """
+        if isinstance(stream, io.TextIOBase):
+            return stream
+        return io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+
+    def iter_rows(self, stream, file_format):
+        """
+        Yields (row_number, dict) pairs. Unparseable lines are yielded
+        as (row_number, exception) so they are reported, not fatal.
+        """
+        text = self.open_text(stream)
+
+        if file_format == 'csv':
+            # Row 1 is the header
+            for number, row in enumerate(csv.DictReader(text), start=2):
+                # Empty cells mean "use the default"
+                yield number, {
+                    key: value for key, value in row.items()
+                    if key and value not in ('', None)
+                }
+        else:
+            for number, line in enumerate(text, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    yield number, json.loads(line)
+                except ValueError as exc:
+                    yield number, exc
+
+    # -----------------------------------------
+    # IMPORT
+    # -----------------------------------------
+
+    def run(self, stream, file_format='csv'):
+        if file_format not in FORMATS:
+            raise ValueError(f"Unsupported format '{file_format}'.")
+
+        started = time.monotonic()
+        self.report = {
+            'rows': 0,
+            'imported': 0,
+            'duplicates': 0,
+            'failed': 0,
+            'errors': [],
+        }
+
+        batch = []
+        for number, row in self.iter_rows(stream, file_format):
+            self.report['rows'] += 1
+
+            product = self.build(number, row)
+            if product is not None:
+                batch.append(product)
+
+            if len(batch) >= self.batch_size:
+                self.flush(batch)
+                batch = []
+
+        self.flush(batch)
+
+        elapsed = time.monotonic() - started
+        self.report['seconds'] = round(elapsed, 3)
+        self.report['rows_per_second'] = round(self.report['rows'] / elapsed, 1) if elapsed else None
+        return self.report
+
+    def build(self, number, row):
+        """
+        Validates one row → unsaved Product, or None (error recorded).
+        """
+        if isinstance(row, Exception):
+            self.add_error(number, {'non_field_errors': [f"Invalid JSON: {row}"]})
+            return None
+        if not isinstance(row, dict):
+            self.add_error(number, {'non_field_errors': ["Expected an object."]})
+            return None
+
+        try:
+            data = self.serializer.run_validation(row)
+        except serializers.ValidationError as exc:
+            self.add_error(number, exc.detail)
+            return None
+
+        data['category_id'] = data.pop('category')
+        return Product(created_by=self.user, **data)
+
+    def add_error(self, number, detail):
+        self.report['failed'] += 1
+        if len(self.report['errors']) < self.max_errors:
+            self.report['errors'].append({'row': number, 'errors': detail})
+
+    def flush(self, batch):
+        """
+        Writes one batch in its own transaction:
+        - rows with a SKU → INSERT ... ON CONFLICT (sku) DO UPDATE
+        - rows without one → plain INSERT
+        then re-indexes / invalidates caches once for the whole batch.
+        """
+        if not batch:
+            return
+
+        # Last row wins when a SKU repeats inside one batch
+        with_sku = {product.sku: product for product in batch if product.sku}
+        without_sku = [product for product in batch if not product.sku]
+
+        with transaction.atomic():
+            if with_sku:
+                Product.objects.bulk_create(
+                    with_sku.values(),
+                    update_conflicts=True,
+                    unique_fields=['sku'],
+                    update_fields=UPSERT_FIELDS,
+                )
+            if without_sku:
+                Product.objects.bulk_create(without_sku)
+
+            product_ids = list(
+                Product.objects.filter(sku__in=with_sku.keys()).values_list('id', flat=True)
+            )
+            product_ids += [product.pk for product in without_sku if product.pk]
+
+            products_bulk_changed.send(sender=Product, product_ids=product_ids, fields=None)
+
+        written = len(with_sku) + len(without_sku)
+        self.report['imported'] += written
+        self.report['duplicates'] += len(batch) - written
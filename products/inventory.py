@@ -0,0 +1,160 @@
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+
+from .models import Product
+from .signals import products_bulk_changed
+
+
+# Rows per UPDATE statement (keeps CASE expressions / SQL params bounded)
+UPDATE_CHUNK_SIZE = 500
+
+MIN_PRICE = Decimal('0.01')
+
+
+class PendingChange:
+    """
+    Net change for one product across all entries that mention it.
+
+    Each numeric field is either ('set', value) or ('delta', amount);
+    a delta after a set folds into a new set.
+    """
+
+    def __init__(self, product):
+        self.product = product
+        self.stock_quantity = None
+        self.price = None
+        self.is_available = None
+
+    def apply(self, entry):
+        for field in ('stock_quantity', 'price'):
+            if field not in entry:
+                continue
+            value = entry[field]
+            current = getattr(self, field)
+
+            if entry['mode'] == 'set':
+                setattr(self, field, ('set', value))
+            elif current is None:
+                setattr(self, field, ('delta', value))
+            else:
+                setattr(self, field, (current[0], current[1] + value))
+
+        if 'is_available' in entry:
+            self.is_available = entry['is_available']
+
+    def resulting(self, field):
+        change = getattr(self, field)
+        current = getattr(self.product, field)
+        if change is None:
+            return current
+        kind, value = change
+        return value if kind == 'set' else current + value
+
+    def expression(self, field):
+        """
+        SQL for the new value: a literal for "set",
+        `field + amount` (evaluated by the database) for "delta".
+        """
+        kind, value = getattr(self, field)
+        if kind == 'set':
+            return Value(value)
+        return F(field) + value
+
+
+def apply_inventory_updates(entries):
+    """
+    Applies validated InventoryUpdateSerializer entries in one transaction.
+
+    - one SELECT ... FOR UPDATE for all referenced products
+    - one UPDATE with CASE WHEN per UPDATE_CHUNK_SIZE products
+      (deltas are computed by the database with F())
+    - one products_bulk_changed signal for the whole batch
+
+    Returns {product_id: result} where result has a "status" of
+    "updated", "not_found" or "invalid" (stock/price out of range).
+    """
+    results = {}
+
+    with transaction.atomic():
+        products = Product.objects.select_for_update().only(
+            'id', 'stock_quantity', 'price', 'is_available'
+        ).in_bulk([entry['id'] for entry in entries])
+
+        changes = {}
+        for entry in entries:
+            product = products.get(entry['id'])
+            if product is None:
+                results[entry['id']] = {'id': entry['id'], 'status': 'not_found'}
+                continue
+            changes.setdefault(product.pk, PendingChange(product)).apply(entry)
+
+        valid = []
+        for pk, change in changes.items():
+            stock = change.resulting('stock_quantity')
+            price = change.resulting('price')
+
+            errors = {}
+            if stock < 0:
+                errors['stock_quantity'] = ["Stock quantity cannot be negative."]
+            if price < MIN_PRICE:
+                errors['price'] = ["Price must be greater than 0."]
+
+            if errors:
+                results[pk] = {'id': pk, 'status': 'invalid', 'errors': errors}
+                continue
+
+            valid.append(change)
+            results[pk] = {
+                'id': pk,
+                'status': 'updated',
+                'stock_quantity': stock,
+                'price': str(price),
+                'is_available': (
+                    change.product.is_available
+                    if change.is_available is None else change.is_available
+                ),
+            }
+
+        now = timezone.now()
+        for start in range(0, len(valid), UPDATE_CHUNK_SIZE):
+            update_chunk(valid[start:start + UPDATE_CHUNK_SIZE], now)
+
+        if valid:
+            products_bulk_changed.send(
+                sender=Product,
+                product_ids=[change.product.pk for change in valid],
+                fields=['stock_quantity', 'price', 'is_available']
+            )
+
+    return results
+
+
+def update_chunk(changes, now):
+    """
+    UPDATE products_product SET
+        stock_quantity = CASE WHEN id = 1 THEN stock_quantity + 5 ... ELSE stock_quantity END,
+        ...
+    WHERE id IN (...)
+    """
+    updates = {'updated_date': now}
+
+    for field in ('stock_quantity', 'price', 'is_available'):
+        whens = []
+        for change in changes:
+            if getattr(change, field) is None:
+                continue
+            if field == 'is_available':
+                then = Value(change.is_available)
+            else:
+                then = change.expression(field)
+            whens.append(When(pk=change.product.pk, then=then))
+
+        if whens:
+            updates[field] = Case(*whens, default=F(field))
+
+    Product.objects.filter(
+        pk__in=[change.product.pk for change in changes]
+    ).update(**updates)
@@ -0,0 +1,100 @@
+import os
+import tempfile
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from scipy import sparse
+
+from products.similarity import (
+    DEFAULT_FEATURES, MAX_DOCUMENT_FREQUENCY, SimilarityIndex, inverse_document_frequency,
+    publish_build, read_current, tfidf,
+)
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    """
+    Measures /similar/ query latency on a synthetic catalog.
+
+    Builds an index of --products random products (Zipf-distributed
+    words, like real product text) in a temporary directory, loads it
+    memory-mapped like the API does, then times --queries lookups.
+    No database access.
+
+    Usage:
+        python manage.py benchmark_similarity --products 1000000
+    """
+    help = "Benchmark similar-products query latency."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=1000000)
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--words', type=int, default=30, help="Average words per product")
+        parser.add_argument('--vocabulary', type=int, default=200000)
+        parser.add_argument('--top-k', type=int, default=10)
+        parser.add_argument('--max-df', type=float, default=MAX_DOCUMENT_FREQUENCY)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def synthetic_counts(self, rng, products, words, vocabulary, chunk=100000):
+        chunks = []
+        for start in range(0, products, chunk):
+            rows = min(chunk, products - start)
+            lengths = rng.poisson(words, rows)
+            row_ids = np.repeat(np.arange(rows, dtype=np.int32), lengths)
+            # Zipf: a few very common words, a long tail of rare ones
+            columns = (rng.zipf(1.3, len(row_ids)) % vocabulary).astype(np.int32) % DEFAULT_FEATURES
+            data = np.ones(len(row_ids), dtype=np.float32)
+            matrix = sparse.csr_matrix(
+                (data, (row_ids, columns)), shape=(rows, DEFAULT_FEATURES)
+            )
+            matrix.sum_duplicates()
+            chunks.append(matrix)
+        return sparse.vstack(chunks, format='csr')
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        products = options['products']
+
+        started = time.monotonic()
+        counts = self.synthetic_counts(rng, products, options['words'], options['vocabulary'])
+        document_frequency = np.bincount(counts.indices, minlength=DEFAULT_FEATURES)
+        idf = inverse_document_frequency(document_frequency, products, options['max_df'])
+        matrix = tfidf(counts, idf)
+        ids = np.arange(1, products + 1, dtype=np.int64)
+
+        with tempfile.TemporaryDirectory() as root:
+            publish_build(root, matrix, ids, idf, timezone.now())
+            build_seconds = time.monotonic() - started
+
+            build_dir = os.path.join(root, read_current(root)['build'])
+            size = sum(
+                os.path.getsize(os.path.join(build_dir, name)) for name in os.listdir(build_dir)
+            )
+
+            started = time.monotonic()
+            index = SimilarityIndex(root, read_current(root))
+            load_ms = (time.monotonic() - started) * 1000
+
+            latencies = []
+            candidates = []
+            for row in rng.integers(0, products, options['queries']):
+                start, end = matrix.indptr[row], matrix.indptr[row + 1]
+                features, weights = matrix.indices[start:end], matrix.data[start:end]
+
+                started = time.perf_counter()
+                found, scores = index.scores(features, weights)
+                index.top(found, scores, options['top_k'], exclude=ids[row])
+                latencies.append((time.perf_counter() - started) * 1000)
+                candidates.append(len(found))
+
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+        self.stdout.write(
+            f"{products} products, {matrix.nnz} non-zeros, index {size / 2 ** 20:.0f} MiB, "
+            f"built in {build_seconds:.1f}s, loaded (mmap) in {load_ms:.1f}ms"
+        )
+        self.stdout.write(f"candidates per query: median {int(np.median(candidates))}")
+        self.stdout.write(self.style.SUCCESS(
+            f"top-{options['top_k']} latency over {len(latencies)} queries: "
+            f"p50 {p50:.2f}ms, p95 {p95:.2f}ms, p99 {p99:.2f}ms"
+        ))
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from products.copurchase import CoPurchaseBuilder
+
+
+class Command(BaseCommand):
+    """
+    Updates the "frequently bought together" table from orders placed
+    since the previous run (or from all orders with --full).
+
+    Usage:
+        python manage.py build_copurchases
+        python manage.py build_copurchases --full --top-k 20 --min-count 3
+    """
+    help = "Build frequently-bought-together recommendations from order history."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help="Recount every order")
+        parser.add_argument('--top-k', type=int, default=CoPurchaseBuilder.top_k)
+        parser.add_argument('--min-count', type=int, default=CoPurchaseBuilder.min_count)
+        parser.add_argument('--directory', help="Where the count matrix is kept")
+
+    def handle(self, *args, **options):
+        builder = CoPurchaseBuilder(
+            directory=options['directory'],
+            top_k=options['top_k'],
+            min_count=options['min_count'],
+        )
+        report = builder.run(full=options['full'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{report['orders']} new orders counted, {report['products']} products "
+            f"updated ({report['rows']} rows) up to order #{report['last_order_id']} "
+            f"in {report['seconds']}s."
+        ))
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from products.similarity import SimilarityIndexBuilder
+
+
+class Command(BaseCommand):
+    """
+    Builds the TF-IDF index behind /api/products/{id}/similar/.
+
+    By default only products saved since the last full build are
+    re-vectorized; --full re-vectorizes everything and refreshes
+    the IDF weights.
+
+    Usage:
+        python manage.py build_similarity_index --full
+        python manage.py build_similarity_index
+    """
+    help = "Build or update the similar-products index."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true')
+        parser.add_argument('--directory', help="Where the index files are kept")
+
+    def handle(self, *args, **options):
+        builder = SimilarityIndexBuilder(directory=options['directory'])
+        if options['full']:
+            report = builder.build()
+            kind = "Full build"
+        else:
+            report = builder.build_delta()
+            kind = "Delta"
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{kind}: {report['products']} products vectorized in {report['seconds']}s."
+        ))
@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.http import QueryDict
+
+from products.exporter import FORMATS, iter_export
+from products.filters import ProductFilter
+from products.models import Product
+from products.search import get_search_backend
+
+
+class Command(BaseCommand):
+    """
+    Streams the product catalog to a file or stdout.
+
+    Accepts the same filters as GET /api/products/ as key=value pairs.
+
+    Usage:
+        python manage.py export_products --format csv --output catalog.csv
+        python manage.py export_products --format jsonl in_stock=true category=Electronics
+    """
+    help = "Export products as CSV or JSON Lines."
+
+    def add_arguments(self, parser):
+        parser.add_argument('filters', nargs='*', help="key=value product filters")
+        parser.add_argument('--format', choices=FORMATS, default='csv', dest='file_format')
+        parser.add_argument('--output', help="File path (default: stdout)")
+
+    def handle(self, *args, **options):
+        params = QueryDict(mutable=True)
+        for item in options['filters']:
+            key, sep, value = item.partition('=')
+            if not sep:
+                raise CommandError(f"Filters must be key=value, got '{item}'.")
+            params.appendlist(key, value)
+
+        product_filter = ProductFilter(params, queryset=Product.objects.all())
+        if not product_filter.is_valid():
+            raise CommandError(product_filter.errors.as_json())
+
+        products = product_filter.qs
+        if params.get('search'):
+            products = get_search_backend().search(products, params['search'])
+
+        if not options['output']:
+            for chunk in iter_export(products, options['file_format']):
+                self.stdout.write(chunk, ending='')
+            return
+
+        with open(options['output'], 'w', newline='') as output:
+            for chunk in iter_export(products, options['file_format']):
+                output.write(chunk)
@@ -0,0 +1,110 @@
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from products.imaging import hash_file, render_variants
+from products.models import Product
+from products.signals import products_bulk_changed
+from products.thumbnails import (
+    get_format, mark_variants_ready, source_path, variant_targets, variants_exist,
+)
+
+
+class Command(BaseCommand):
+    """
+    Backfills thumbnails for existing product images.
+
+    1. Hashes images that have no image_hash yet
+    2. Renders the missing variants of every distinct image
+    3. Marks the products whose variants now exist as ready
+       (image_variants_hash), so they are served
+
+    Both steps run in a process pool, one image per task.
+
+    Usage:
+        python manage.py generate_thumbnails
+        python manage.py generate_thumbnails --workers 8
+    """
+    help = "Generate missing product image thumbnails."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int,
+            default=getattr(settings, 'PRODUCT_THUMBNAIL_WORKERS', 2)
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        products = (
+            Product.objects.exclude(image='').exclude(image__isnull=True)
+            .only('id', 'image', 'image_hash')
+        )
+
+        sources = {}
+        for product in products.iterator(chunk_size=1000):
+            path = source_path(product)
+            if path is not None:
+                sources[product.pk] = (path, product.image_hash)
+
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=options['workers'], mp_context=context) as pool:
+            hashes = self.hash_missing(pool, sources)
+
+            # Products sharing an image share its variants
+            images = {}
+            for path, digest in sources.values():
+                if digest and not variants_exist(digest):
+                    images.setdefault(digest, path)
+
+            futures = {
+                pool.submit(render_variants, path, variant_targets(digest), get_format()): digest
+                for digest, path in images.items()
+            }
+            rendered = failed = 0
+            for future in as_completed(futures):
+                try:
+                    rendered += len(future.result())
+                except Exception as exc:
+                    failed += 1
+                    self.stderr.write(f"{futures[future]}: {exc}")
+
+        ready = mark_variants_ready({
+            digest for _, digest in sources.values()
+            if digest and variants_exist(digest)
+        })
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{hashes} images hashed, {rendered} thumbnails written for "
+            f"{len(images)} images ({failed} failed), {len(ready)} products marked ready in "
+            f"{time.monotonic() - started:.1f}s."
+        ))
+
+    def hash_missing(self, pool, sources):
+        """
+        Fills in image_hash where it is empty; updates `sources` in place.
+        """
+        missing = [pk for pk, (_, digest) in sources.items() if not digest]
+        futures = {pool.submit(hash_file, sources[pk][0]): pk for pk in missing}
+
+        updated = []
+        for future in as_completed(futures):
+            pk = futures[future]
+            try:
+                digest = future.result()
+            except OSError as exc:
+                self.stderr.write(f"product {pk}: {exc}")
+                continue
+            sources[pk] = (sources[pk][0], digest)
+            updated.append(Product(pk=pk, image_hash=digest))
+
+        if updated:
+            Product.objects.bulk_update(updated, ['image_hash'], batch_size=1000)
+            products_bulk_changed.send(
+                sender=Product,
+                product_ids=[product.pk for product in updated],
+                fields=['image_hash'],
+            )
+        return len(updated)
@@ -0,0 +1,53 @@
+import json
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from products.importer import FORMATS, ProductImporter, detect_format
+
+
+class Command(BaseCommand):
+    """
+    Streams a supplier feed into the products table.
+
+    Rows are upserted on `sku`; categories are given by name.
+
+    Usage:
+        python manage.py import_products feed.csv
+        python manage.py import_products feed.jsonl --batch-size 5000
+        python manage.py import_products feed.txt --format jsonl --user admin
+    """
+    help = "Import products from a CSV or JSON Lines file."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=FORMATS, dest='file_format')
+        parser.add_argument('--batch-size', type=int, default=ProductImporter.batch_size)
+        parser.add_argument('--user', help="Username recorded as created_by")
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            try:
+                user = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f"User '{options['user']}' does not exist.")
+
+        file_format = options['file_format'] or detect_format(options['path'])
+        importer = ProductImporter(user=user, batch_size=options['batch_size'])
+
+        try:
+            with open(options['path'], 'rb') as stream:
+                report = importer.run(stream, file_format)
+        except OSError as exc:
+            raise CommandError(str(exc))
+
+        for error in report['errors']:
+            self.stderr.write(f"row {error['row']}: {json.dumps(error['errors'])}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{report['imported']} imported, {report['duplicates']} duplicate SKUs skipped, "
+            f"{report['failed']} failed "
+            f"out of {report['rows']} rows in {report['seconds']}s "
+            f"({report['rows_per_second']} rows/s)."
+        ))
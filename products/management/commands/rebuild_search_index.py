@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from products.search import get_search_backend
+
+
+class Command(BaseCommand):
+    """
+    Re-creates the product full-text index from scratch.
+    Useful after bulk imports done with raw SQL or fixtures.
+
+    Usage:
+        python manage.py rebuild_search_index
+    """
+    help = "Rebuild the product full-text search index."
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        backend.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f"Search index rebuilt ({backend.__class__.__name__})."
+        ))
@@ -0,0 +1,99 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Q
+
+from products.models import Product, Review
+from products.signals import products_bulk_changed
+
+
+RATING_FIELDS = [
+    'review_count', 'rating_sum', 'avg_rating',
+    'rating_1_count', 'rating_2_count', 'rating_3_count',
+    'rating_4_count', 'rating_5_count',
+]
+
+
+class Command(BaseCommand):
+    """
+    Recomputes the denormalized rating aggregates on Product
+    (review_count, rating_sum, avg_rating and the star histogram)
+    from the reviews table.
+
+    Run it once after adding the columns (backfill), or after bulk
+    review deletions that bypass Review.delete(). Products left
+    without any review are reset to zero.
+
+    Usage:
+        python manage.py recompute_ratings
+        python manage.py recompute_ratings --batch-size 5000
+    """
+    help = "Recompute product rating aggregates from reviews."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        # One grouped query: (product, stars) → count, streamed in product order
+        stats = (
+            Review.objects.values_list('product_id', 'rating')
+            .annotate(count=Count('id'))
+            .order_by('product_id', 'rating')
+        )
+
+        updated = []
+        batch = []
+        current = None
+
+        with transaction.atomic():
+            for product_id, rating, count in stats.iterator(chunk_size=batch_size):
+                if current is None or current.pk != product_id:
+                    if current is not None:
+                        batch.append(self.finish(current))
+                    current = Product(pk=product_id, **{field: 0 for field in RATING_FIELDS})
+
+                    if len(batch) >= batch_size:
+                        updated += self.save(batch)
+                        batch = []
+
+                current.review_count += count
+                current.rating_sum += rating * count
+                setattr(current, f'rating_{rating}_count', count)
+
+            if current is not None:
+                batch.append(self.finish(current))
+            updated += self.save(batch)
+
+            # Products whose reviews were all deleted have no row in
+            # `stats`; zero whatever aggregates they still carry.
+            emptied = list(
+                Product.objects.filter(
+                    Q(*[~Q(**{field: 0}) for field in RATING_FIELDS], _connector=Q.OR)
+                )
+                .exclude(id__in=Review.objects.values('product_id'))
+                .values_list('id', flat=True)
+            )
+            Product.objects.filter(id__in=emptied).update(
+                **{field: 0 for field in RATING_FIELDS}
+            )
+
+        if updated or emptied:
+            products_bulk_changed.send(
+                sender=Product, product_ids=updated + emptied, fields=RATING_FIELDS
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Rating aggregates recomputed for {len(updated)} reviewed products, "
+            f"reset for {len(emptied)} products without reviews."
+        ))
+
+    @staticmethod
+    def save(batch):
+        Product.objects.bulk_update(batch, RATING_FIELDS)
+        return [product.pk for product in batch]
+
+    @staticmethod
+    def finish(product):
+        product.avg_rating = product.rating_sum / product.review_count
+        return product
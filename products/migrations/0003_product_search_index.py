@@ -0,0 +1,68 @@
+from django.db import migrations, OperationalError
+
+
+def create_search_index(apps, schema_editor):
+    """
+    Creates the full-text index for the current database
+    and fills it from the existing products.
+    Other databases keep using the icontains fallback.
+    """
+    vendor = schema_editor.connection.vendor
+
+    if vendor == 'sqlite':
+        try:
+            schema_editor.execute(
+                "CREATE VIRTUAL TABLE products_product_fts USING fts5("
+                "name, category, description, tokenize = 'porter unicode61')"
+            )
+        except OperationalError:
+            # SQLite compiled without FTS5 → fallback backend
+            return
+        schema_editor.execute(
+            "INSERT INTO products_product_fts (rowid, name, category, description) "
+            "SELECT p.id, p.name, c.name, p.description "
+            "FROM products_product p "
+            "JOIN categories_category c ON c.id = p.category_id"
+        )
+
+    elif vendor == 'postgresql':
+        schema_editor.execute(
+            "CREATE TABLE products_product_search ("
+            "product_id bigint PRIMARY KEY "
+            "REFERENCES products_product (id) ON DELETE CASCADE, "
+            "document tsvector NOT NULL)"
+        )
+        schema_editor.execute(
+            "CREATE INDEX products_product_search_document_gin "
+            "ON products_product_search USING GIN (document)"
+        )
+        schema_editor.execute(
+            "INSERT INTO products_product_search (product_id, document) "
+            "SELECT p.id, "
+            "setweight(to_tsvector('english', p.name), 'A') || "
+            "setweight(to_tsvector('english', c.name), 'B') || "
+            "setweight(to_tsvector('english', p.description), 'C') "
+            "FROM products_product p "
+            "JOIN categories_category c ON c.id = p.category_id"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+
+    if vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS products_product_fts")
+    elif vendor == 'postgresql':
+        schema_editor.execute("DROP TABLE IF EXISTS products_product_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('categories', '0001_initial'),
+        ('products', '0002_alter_wishlist_options_alter_product_price'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 6.0 on 2026-10-18 06:12
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('categories', '0002_category_tree'),
+        ('products', '0008_frequently_bought_together'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_available', True), ('stock_quantity__gt', 0)), fields=['-created_date', '-id'], name='product_buyable_newest_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_available', True), ('stock_quantity__gt', 0)), fields=['price', 'id'], name='product_buyable_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('stock_quantity__gt', 0)), fields=['-created_date', '-id'], name='product_in_stock_newest_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-18 06:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0009_product_partial_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='image_variants_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+    ]
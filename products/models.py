@@ -1,9 +1,33 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, FloatField, Q
+from django.db.models.functions import Cast, Coalesce, NullIf
+from django.utils import timezone
 from decimal import Decimal
 from django.contrib.auth.models import User
 from categories.models import Category
 from django.core.validators import MinValueValidator, MaxValueValidator
 
+
+# Predicates of the partial indexes on Product.
+# Queries must use these exact conditions (or stricter ones)
+# for the database to pick the indexes.
+PURCHASABLE = Q(is_available=True, stock_quantity__gt=0)
+IN_STOCK = Q(stock_quantity__gt=0)
+
+
+class ProductQuerySet(models.QuerySet):
+
+    def purchasable(self):
+        """
+        Products that can be bought: available and in stock.
+        Served by the product_buyable_* partial indexes.
+        """
+        return self.filter(PURCHASABLE)
+
+    def in_stock(self):
+        return self.filter(IN_STOCK)
+
+
 class Product(models.Model):
     """
     Represents a single product in the e-commerce store.
@@ -13,6 +37,10 @@ class Product(models.Model):
     name = models.CharField(max_length=200, db_index=True)
     description = models.TextField()
 
+    # Stock-keeping unit from the supplier feed.
+    # Optional, but unique when set: bulk imports upsert on it.
+    sku = models.CharField(max_length=64, unique=True, null=True, blank=True)
+
     price = models.DecimalField(
         max_digits=10,
         decimal_places=2,
@@ -36,6 +64,13 @@ class Product(models.Model):
     # Actual uploaded image
     image = models.ImageField(upload_to='products/', blank=True, null=True)
 
+    # SHA-256 of the uploaded image; names its thumbnails (see thumbnails.py)
+    image_hash = models.CharField(max_length=64, blank=True, editable=False)
+
+    # image_hash whose thumbnails have been written. Set once generation
+    # finishes; until it matches image_hash the original image is served.
+    image_variants_hash = models.CharField(max_length=64, blank=True, editable=False)
+
     created_date = models.DateTimeField(auto_now_add=True, db_index=True)
     updated_date = models.DateTimeField(auto_now=True)
 
@@ -48,11 +83,45 @@ class Product(models.Model):
 
     is_available = models.BooleanField(default=True)
 
+    # Review aggregates, kept up to date by rating_stats_update()
+    # so list pages never have to read the reviews table.
+    review_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+    avg_rating = models.FloatField(default=0, db_index=True)
+
+    # Star histogram (number of 1★ ... 5★ reviews)
+    rating_1_count = models.PositiveIntegerField(default=0)
+    rating_2_count = models.PositiveIntegerField(default=0)
+    rating_3_count = models.PositiveIntegerField(default=0)
+    rating_4_count = models.PositiveIntegerField(default=0)
+    rating_5_count = models.PositiveIntegerField(default=0)
+
+    objects = ProductQuerySet.as_manager()
+
     class Meta:
         ordering = ['-created_date']  # Newest first
         indexes = [
             models.Index(fields=['name', 'category']),
             models.Index(fields=['price']),
+
+            # Partial indexes: only the rows most queries ask for.
+            # (-created_date, -id) serves the default ordering and
+            # cursor pages; (price, id) serves price sorting both ways.
+            models.Index(
+                fields=['-created_date', '-id'],
+                condition=PURCHASABLE,
+                name='product_buyable_newest_idx',
+            ),
+            models.Index(
+                fields=['price', 'id'],
+                condition=PURCHASABLE,
+                name='product_buyable_price_idx',
+            ),
+            models.Index(
+                fields=['-created_date', '-id'],
+                condition=IN_STOCK,
+                name='product_in_stock_newest_idx',
+            ),
         ]
 
     def __str__(self):
@@ -65,6 +134,44 @@ class Product(models.Model):
         """
         return self.stock_quantity > 0
 
+    @property
+    def rating_histogram(self):
+        """
+        {1: count, 2: count, ... 5: count}
+        """
+        return {
+            stars: getattr(self, f'rating_{stars}_count')
+            for stars in range(1, 6)
+        }
+
+    @staticmethod
+    def rating_stats_update(rating, delta=1):
+        """
+        Returns the kwargs for a single UPDATE that adds (delta=1)
+        or removes (delta=-1) one review of `rating` stars:
+
+            Product.objects.filter(pk=...).update(
+                **Product.rating_stats_update(5)
+            )
+
+        Everything is computed in SQL from the current row values,
+        so concurrent reviews never overwrite each other.
+        """
+        review_count = F('review_count') + delta
+        rating_sum = F('rating_sum') + rating * delta
+
+        return {
+            'review_count': review_count,
+            'rating_sum': rating_sum,
+            f'rating_{rating}_count': F(f'rating_{rating}_count') + delta,
+            'avg_rating': Coalesce(
+                Cast(rating_sum, FloatField()) / NullIf(review_count, 0),
+                0.0,
+                output_field=FloatField()
+            ),
+            'updated_date': timezone.now(),
+        }
+
 
 class Review(models.Model):
     """
@@ -98,10 +205,25 @@ class Review(models.Model):
         # Prevent duplicate reviews from the same user
         unique_together = ('product', 'user')
         ordering = ['-created_at']
+        indexes = [
+            # Product reviews: WHERE product_id = X ORDER BY created_at DESC, id DESC
+            models.Index(fields=['product', 'created_at', 'id']),
+        ]
 
     def __str__(self):
         return f"{self.product.name} - {self.rating}/5 by {self.user.username}"
 
+    def delete(self, *args, **kwargs):
+        """
+        Removes the review from the product's rating aggregates too.
+        (Bulk/cascade deletes bypass this, run `recompute_ratings` after those.)
+        """
+        with transaction.atomic():
+            Product.objects.filter(pk=self.product_id).update(
+                **Product.rating_stats_update(self.rating, delta=-1)
+            )
+            return super().delete(*args, **kwargs)
+
 class Wishlist(models.Model):
     """
     Represents a product bookmarked by a user.
@@ -126,3 +248,42 @@ class Wishlist(models.Model):
 
     def __str__(self):
         return f"{self.user.username} → {self.product.name}"
+
+
+class FrequentlyBoughtTogether(models.Model):
+    """
+    Precomputed "frequently bought together" neighbours of a product.
+
+    Filled by the `build_copurchases` command from order history;
+    `rank` 1 is the strongest neighbour. Reading them is one
+    indexed lookup on (product, rank).
+    """
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='bought_together'
+    )
+
+    related = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='bought_together_with'
+    )
+
+    # Orders containing both products
+    co_count = models.PositiveIntegerField()
+
+    # co_count / sqrt(orders with product × orders with related)
+    score = models.FloatField()
+
+    rank = models.PositiveSmallIntegerField()
+
+    class Meta:
+        ordering = ['product', 'rank']
+        unique_together = ('product', 'related')
+        indexes = [
+            models.Index(fields=['product', 'rank']),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} → {self.related_id} (#{self.rank})"
@@ -0,0 +1,10 @@
+from ecommerce_api.pagination import KeysetPagination
+
+
+class ReviewPagination(KeysetPagination):
+    """
+    Cursor pagination for a product's reviews.
+    Newest first by default; ?ordering=-rating / rating / created_at.
+    """
+    ordering = '-created_at'
+    cursor_ordering_fields = ['created_at', 'rating']
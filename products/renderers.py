@@ -0,0 +1,33 @@
+import json
+
+from rest_framework import renderers
+
+
+class CSVRenderer(renderers.BaseRenderer):
+    """
+    Lets content negotiation accept ?format=csv / Accept: text/csv.
+    The export itself is streamed by the view; this only renders
+    small payloads such as error responses.
+    """
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return json.dumps(data).encode(self.charset)
+
+
+class JSONLinesRenderer(renderers.BaseRenderer):
+    """
+    Same as CSVRenderer, for ?format=jsonl (one JSON object per line).
+    """
+    media_type = 'application/x-ndjson'
+    format = 'jsonl'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return (json.dumps(data) + '\n').encode(self.charset)
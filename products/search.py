@@ -0,0 +1,261 @@
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import FloatField, Q
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+
+# Words we feed to the full-text engines.
+# Anything that is not a word character is dropped, which also means
+# user input can never inject MATCH / tsquery operators.
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(query):
+    return [token.lower() for token in TOKEN_RE.findall(query or '')]
+
+
+class BaseSearchBackend:
+    """
+    Common interface for product search backends.
+
+    - search()  → filter + rank a Product queryset for a text query
+    - index()   → (re)index the given products
+    - remove()  → drop products from the index
+    - rebuild() → re-create the whole index from the products table
+
+    Ranked querysets are annotated with `search_rank`
+    (higher = more relevant) and ordered by it.
+    """
+
+    def search(self, queryset, query):
+        raise NotImplementedError
+
+    def index(self, products):
+        pass
+
+    def remove(self, product_ids):
+        pass
+
+    def rebuild(self):
+        pass
+
+    @staticmethod
+    def document(product):
+        """
+        The three weighted parts of a product document:
+        name (most important), category name, description.
+        """
+        return (
+            product.name,
+            product.category.name if product.category_id else '',
+            product.description,
+        )
+
+
+class DatabaseSearchBackend(BaseSearchBackend):
+    """
+    Fallback backend with no index at all.
+    Every term must appear (icontains) in the name,
+    description or category name. Used for databases
+    without a full-text engine.
+    """
+
+    def search(self, queryset, query):
+        for term in query.split():
+            queryset = queryset.filter(
+                Q(name__icontains=term) |
+                Q(description__icontains=term) |
+                Q(category__name__icontains=term)
+            )
+        return queryset
+
+
+class SQLiteSearchBackend(BaseSearchBackend):
+    """
+    SQLite FTS5 backend.
+
+    Products live in the `products_product_fts` virtual table
+    (rowid = product id), ranked with bm25().
+    Every query token is matched as a prefix, so results
+    show up while the user is still typing.
+    """
+
+    table = 'products_product_fts'
+
+    # bm25() column weights → name, category, description
+    weights = (10.0, 5.0, 1.0)
+
+    def build_match(self, query):
+        return ' '.join(f'"{token}"*' for token in tokenize(query))
+
+    def search(self, queryset, query):
+        match = self.build_match(query)
+        if not match:
+            return queryset.none()
+
+        weights = ', '.join(str(weight) for weight in self.weights)
+        matching_ids = RawSQL(
+            f"SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s",
+            [match]
+        )
+        # bm25() is "lower is better", so negate it.
+        rank = RawSQL(
+            f"SELECT -bm25({self.table}, {weights}) FROM {self.table} "
+            f"WHERE {self.table} MATCH %s AND rowid = products_product.id",
+            [match],
+            output_field=FloatField()
+        )
+        return (
+            queryset.filter(id__in=matching_ids)
+            .annotate(search_rank=rank)
+            .order_by('-search_rank', '-id')
+        )
+
+    def index(self, products):
+        rows = [(product.pk, *self.document(product)) for product in products]
+        if not rows:
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"DELETE FROM {self.table} WHERE rowid = %s",
+                [(row[0],) for row in rows]
+            )
+            cursor.executemany(
+                f"INSERT INTO {self.table} (rowid, name, category, description) "
+                f"VALUES (%s, %s, %s, %s)",
+                rows
+            )
+
+    def remove(self, product_ids):
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"DELETE FROM {self.table} WHERE rowid = %s",
+                [(pk,) for pk in product_ids]
+            )
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table}")
+            cursor.execute(
+                f"INSERT INTO {self.table} (rowid, name, category, description) "
+                f"SELECT p.id, p.name, c.name, p.description "
+                f"FROM products_product p "
+                f"JOIN categories_category c ON c.id = p.category_id"
+            )
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    """
+    PostgreSQL backend.
+
+    Each product has a weighted `tsvector` stored in
+    `products_product_search` (GIN indexed), ranked with ts_rank().
+    """
+
+    table = 'products_product_search'
+    config = 'english'
+
+    document_sql = (
+        "setweight(to_tsvector(%s::regconfig, %s), 'A') || "
+        "setweight(to_tsvector(%s::regconfig, %s), 'B') || "
+        "setweight(to_tsvector(%s::regconfig, %s), 'C')"
+    )
+
+    def build_tsquery(self, query):
+        return ' & '.join(f'{token}:*' for token in tokenize(query))
+
+    def search(self, queryset, query):
+        tsquery = self.build_tsquery(query)
+        if not tsquery:
+            return queryset.none()
+
+        matching_ids = RawSQL(
+            f"SELECT product_id FROM {self.table} "
+            f"WHERE document @@ to_tsquery(%s::regconfig, %s)",
+            [self.config, tsquery]
+        )
+        rank = RawSQL(
+            f"SELECT ts_rank(document, to_tsquery(%s::regconfig, %s)) "
+            f"FROM {self.table} WHERE product_id = products_product.id",
+            [self.config, tsquery],
+            output_field=FloatField()
+        )
+        return (
+            queryset.filter(id__in=matching_ids)
+            .annotate(search_rank=rank)
+            .order_by('-search_rank', '-id')
+        )
+
+    def index(self, products):
+        rows = []
+        for product in products:
+            name, category, description = self.document(product)
+            rows.append((
+                product.pk,
+                self.config, name,
+                self.config, category,
+                self.config, description,
+            ))
+        if not rows:
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {self.table} (product_id, document) "
+                f"VALUES (%s, {self.document_sql}) "
+                f"ON CONFLICT (product_id) DO UPDATE SET document = EXCLUDED.document",
+                rows
+            )
+
+    def remove(self, product_ids):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {self.table} WHERE product_id = ANY(%s)",
+                [list(product_ids)]
+            )
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table}")
+            cursor.execute(
+                f"INSERT INTO {self.table} (product_id, document) "
+                f"SELECT p.id, "
+                f"setweight(to_tsvector(%s::regconfig, p.name), 'A') || "
+                f"setweight(to_tsvector(%s::regconfig, c.name), 'B') || "
+                f"setweight(to_tsvector(%s::regconfig, p.description), 'C') "
+                f"FROM products_product p "
+                f"JOIN categories_category c ON c.id = p.category_id",
+                [self.config] * 3
+            )
+
+
+_backend = None
+
+
+def get_search_backend():
+    """
+    Returns the configured search backend (created once per process).
+
+    settings.PRODUCT_SEARCH_BACKEND may point to a backend class.
+    Otherwise the backend is picked from the database vendor,
+    falling back to plain icontains lookups when no full-text
+    index exists (e.g. SQLite built without FTS5).
+    """
+    global _backend
+
+    if _backend is None:
+        backend_path = getattr(settings, 'PRODUCT_SEARCH_BACKEND', None)
+
+        if backend_path:
+            _backend = import_string(backend_path)()
+        elif connection.vendor == 'postgresql':
+            _backend = PostgresSearchBackend()
+        elif (connection.vendor == 'sqlite'
+              and SQLiteSearchBackend.table in connection.introspection.table_names()):
+            _backend = SQLiteSearchBackend()
+        else:
+            _backend = DatabaseSearchBackend()
+
+    return _backend
@@ -1,15 +1,93 @@
 from rest_framework import serializers
 from .models import Product, Review, Wishlist
+from .thumbnails import variant_urls
 from categories.serializers import CategorySerializer
 
 
-class ProductSerializer(serializers.ModelSerializer):
+def parse_field_list(value):
+    return {name.strip() for name in (value or '').split(',') if name.strip()}
+
+
+class SparseFieldsMixin:
+    """
+    Lets clients choose which fields are returned:
+
+      ?fields=id,name,price   → only these fields
+      ?omit=description,image → every field except these
+
+    When the serializer is nested (e.g. product_details inside a cart),
+    the parameters are prefixed with `nested_param_prefix`:
+
+      /api/cart/?product_fields=id,name,price
+    """
+    fields_param = 'fields'
+    omit_param = 'omit'
+    nested_param_prefix = 'product_'
+
+    @classmethod
+    def selected_fields(cls, query_params, nested=False):
+        """
+        Names of the fields to return for these query params.
+        Raises ValidationError (400) for names the serializer does not have.
+        """
+        prefix = cls.nested_param_prefix if nested else ''
+        available = list(cls.Meta.fields)
+
+        only = parse_field_list(query_params.get(prefix + cls.fields_param))
+        omit = parse_field_list(query_params.get(prefix + cls.omit_param))
+
+        errors = {}
+        for param, names in ((cls.fields_param, only), (cls.omit_param, omit)):
+            unknown = names.difference(available)
+            if unknown:
+                errors[prefix + param] = [f"Unknown field(s): {', '.join(sorted(unknown))}."]
+        if errors:
+            raise serializers.ValidationError(errors)
+
+        selected = [name for name in available if not only or name in only]
+        return [name for name in selected if name not in omit]
+
+    def is_nested(self):
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        return parent is not None
+
+    def get_fields(self):
+        fields = super().get_fields()
+
+        request = self.context.get('request')
+        if request is None:
+            return fields
+
+        selected = set(self.selected_fields(request.query_params, nested=self.is_nested()))
+        return {name: field for name, field in fields.items() if name in selected}
+
+
+class RoundedFloatField(serializers.FloatField):
+    """
+    FloatField whose output is rounded to `decimal_places`.
+    """
+
+    def __init__(self, decimal_places, **kwargs):
+        self.decimal_places = decimal_places
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        return round(super().to_representation(value), self.decimal_places)
+
+
+class ProductSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """
     Serializer for reading product data.
     Includes:
     - Category name
     - Creator username
     - Computed field: in_stock
+    - Rating summary: review_count, avg_rating, rating_histogram
+
+    Supports ?fields= / ?omit= (see SparseFieldsMixin), and
+    prune_queryset() loads only the columns those fields need.
     """
 
     category_name = serializers.CharField(
@@ -24,29 +102,91 @@ class ProductSerializer(serializers.ModelSerializer):
 
     in_stock = serializers.BooleanField(read_only=True)
 
+    # FloatField column: serialized as a number, rounded to 2 decimals (4.33)
+    avg_rating = RoundedFloatField(decimal_places=2, read_only=True)
+
+    rating_histogram = serializers.DictField(
+        child=serializers.IntegerField(),
+        read_only=True
+    )
+
+    image_variants = serializers.SerializerMethodField()
+
     class Meta:
         model = Product
         fields = [
-            'id', 'name', 'description', 'price',
+            'id', 'sku', 'name', 'description', 'price',
 
             'category',            # category ID
             'category_name',       # readable name
 
             'stock_quantity',
-            'image_url', 'image',
+            'image_url', 'image', 'image_variants',
 
             'created_date', 'updated_date',
             'created_by', 'created_by_username',
 
-            'is_available', 'in_stock'
+            'is_available', 'in_stock',
+
+            'review_count', 'avg_rating', 'rating_histogram'
         ]
 
         read_only_fields = [
             'id', 'created_date', 'updated_date',
             'created_by', 'created_by_username',
-            'category_name', 'in_stock'
+            'category_name', 'in_stock', 'image_variants',
+            'review_count', 'avg_rating', 'rating_histogram'
         ]
 
+    # Model columns (and joins) needed by fields that are not plain
+    # columns. Anything not listed here reads the column of the same name.
+    field_sources = {
+        'category_name': ['category__name'],
+        'created_by_username': ['created_by__username'],
+        'in_stock': ['stock_quantity'],
+        'rating_histogram': [f'rating_{stars}_count' for stars in range(1, 6)],
+        'image_variants': ['image', 'image_hash', 'image_variants_hash'],
+    }
+
+    def get_image_variants(self, obj):
+        """
+        {"160": url, "480": url, "1024": url} WebP thumbnails,
+        or None when the product has no uploaded image.
+        """
+        return variant_urls(obj, self.context.get('request'))
+
+    @classmethod
+    def prune_queryset(cls, queryset, field_names, prefix='', keep=()):
+        """
+        Restricts a queryset to the columns and joins that
+        `field_names` need, e.g. ?fields=id,name,price gives
+
+            SELECT id, name, price FROM products_product
+
+        with no category/user JOIN and no description.
+
+        For querysets of another model that points to products
+        (cart items, order items, wishlist), pass the relation as
+        `prefix` ('product__') and that model's own columns in `keep`.
+        """
+        columns = {'id'}
+        for name in field_names:
+            columns.update(cls.field_sources.get(name, [name]))
+
+        relations = sorted({
+            prefix + column.split('__')[0]
+            for column in columns if '__' in column
+        })
+        if prefix:
+            relations = relations or [prefix.rstrip('_')]
+
+        # select_related() with no arguments would follow every FK
+        queryset = queryset.select_related(None)
+        if relations:
+            queryset = queryset.select_related(*relations)
+
+        return queryset.only(*keep, *(prefix + column for column in sorted(columns)))
+
     # Validation ensures clean data BEFORE DB save
     def validate_price(self, value):
         if value <= 0:
@@ -73,7 +213,7 @@ class ProductCreateUpdateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Product
         fields = [
-            'name', 'description', 'price',
+            'sku', 'name', 'description', 'price',
             'category', 'stock_quantity',
             'image_url', 'image', 'is_available'
         ]
@@ -86,6 +226,70 @@ class ProductCreateUpdateSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Product name must be at least 3 characters long.")
         return value
 
+    def validate_sku(self, value):
+        """
+        Blank SKUs are stored as NULL so they don't collide
+        on the unique index.
+        """
+        value = (value or '').strip()
+        return value or None
+
+
+
+class ProductImportSerializer(ProductCreateUpdateSerializer):
+    """
+    Validates one row of a bulk import (CSV / JSON Lines).
+
+    Same rules as ProductCreateUpdateSerializer, except:
+    - `category` is a category name (or id), resolved through the
+      prefetched `categories` map in the context → no query per row
+    - no uniqueness query for `sku` (rows are upserted on it)
+    - no image upload
+    """
+    category = serializers.CharField()
+
+    class Meta(ProductCreateUpdateSerializer.Meta):
+        fields = [
+            'sku', 'name', 'description', 'price',
+            'category', 'stock_quantity',
+            'image_url', 'is_available'
+        ]
+        extra_kwargs = {
+            'sku': {'validators': []},
+        }
+
+    def validate_category(self, value):
+        categories = self.context['categories']
+        key = value.strip().casefold()
+
+        if key in categories:
+            return categories[key]
+        if key.isdigit() and int(key) in categories.values():
+            return int(key)
+
+        raise serializers.ValidationError(f"Unknown category '{value}'.")
+
+class InventoryUpdateSerializer(serializers.Serializer):
+    """
+    One entry of a bulk inventory update (PATCH /api/products/bulk/).
+
+    mode = "set"   → stock_quantity / price are new absolute values
+    mode = "delta" → stock_quantity / price are added to the current ones
+    is_available is always absolute.
+    """
+    id = serializers.IntegerField()
+    mode = serializers.ChoiceField(choices=['set', 'delta'], default='set')
+    stock_quantity = serializers.IntegerField(required=False)
+    price = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+    is_available = serializers.BooleanField(required=False)
+
+    def validate(self, attrs):
+        if not {'stock_quantity', 'price', 'is_available'} & attrs.keys():
+            raise serializers.ValidationError(
+                "Provide at least one of stock_quantity, price, is_available."
+            )
+        return attrs
+
 class ReviewSerializer(serializers.ModelSerializer):
     """
     Serializer for product reviews.
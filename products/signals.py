@@ -0,0 +1,176 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import Signal, receiver
+
+from categories.models import Category
+from ecommerce_api.cache import bump_version_on_commit
+from .models import Product, Review
+from .autocomplete import get_autocomplete
+from .search import get_search_backend
+from .thumbnails import content_hash, schedule_variants
+
+
+# Sent once per batch by bulk writers (imports, bulk updates)
+# that bypass Model.save(), with `product_ids` of the changed rows
+# and `fields`, the columns that changed (None = any column).
+products_bulk_changed = Signal()
+
+# Product columns that are part of the search documents
+SEARCH_FIELDS = {'name', 'description', 'category'}
+
+# Product columns the autocomplete index depends on
+AUTOCOMPLETE_FIELDS = {'name', 'is_available'}
+
+
+# -----------------------------------------
+# SEARCH INDEX SYNC
+# -----------------------------------------
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, raw=False, **kwargs):
+    """
+    Keep the full-text index in sync whenever a product is saved.
+    Skipped for fixture loading (raw=True).
+    """
+    if raw:
+        return
+    get_search_backend().index([instance])
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    get_search_backend().remove([instance.pk])
+
+
+@receiver(products_bulk_changed)
+def index_bulk_products(sender, product_ids, fields=None, **kwargs):
+    if fields is not None and not SEARCH_FIELDS.intersection(fields):
+        return
+    get_search_backend().index(
+        Product.objects.filter(id__in=product_ids)
+        .select_related('category')
+        .iterator(chunk_size=1000)
+    )
+
+
+@receiver(pre_save, sender=Category)
+def remember_category_name(sender, instance, raw=False, **kwargs):
+    """
+    Store the old name so post_save can tell if it changed.
+    """
+    instance._previous_name = None
+    if raw or not instance.pk:
+        return
+    instance._previous_name = (
+        Category.objects.filter(pk=instance.pk)
+        .values_list('name', flat=True)
+        .first()
+    )
+
+
+@receiver(post_save, sender=Category)
+def reindex_category_products(sender, instance, created, raw=False, **kwargs):
+    """
+    Category names are part of every product document,
+    so renaming a category re-indexes its products.
+    """
+    if raw or created:
+        return
+    if getattr(instance, '_previous_name', None) in (None, instance.name):
+        return
+    get_search_backend().index(
+        instance.products.select_related('category').iterator(chunk_size=1000)
+    )
+
+
+# -----------------------------------------
+# AUTOCOMPLETE INDEX SYNC
+# -----------------------------------------
+# Only this process's index is updated here;
+# other processes catch up on their next periodic reload.
+
+@receiver(post_save, sender=Product)
+def autocomplete_product(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    get_autocomplete().update_product(instance)
+
+
+@receiver(post_delete, sender=Product)
+def autocomplete_remove_product(sender, instance, **kwargs):
+    get_autocomplete().remove_product(instance.pk)
+
+
+@receiver(products_bulk_changed)
+def autocomplete_bulk_products(sender, product_ids, fields=None, **kwargs):
+    if fields is not None and not AUTOCOMPLETE_FIELDS.intersection(fields):
+        return
+    autocomplete = get_autocomplete()
+    products = (
+        Product.objects.filter(id__in=product_ids)
+        .only('id', 'name', 'is_available', 'review_count')
+    )
+    for product in products.iterator(chunk_size=1000):
+        autocomplete.update_product(product)
+
+
+@receiver(post_save, sender=Category)
+def autocomplete_category(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    get_autocomplete().update_category(instance)
+
+
+@receiver(post_delete, sender=Category)
+def autocomplete_remove_category(sender, instance, **kwargs):
+    get_autocomplete().remove_category(instance.pk)
+
+
+# -----------------------------------------
+# THUMBNAILS
+# -----------------------------------------
+
+@receiver(pre_save, sender=Product)
+def hash_product_image(sender, instance, raw=False, **kwargs):
+    """
+    Hash a newly uploaded image before it is written to storage,
+    while the upload is still open. Cleared images clear the hash.
+    """
+    if raw:
+        return
+    if not instance.image:
+        instance.image_hash = ''
+        instance.image_variants_hash = ''
+    elif not instance.image._committed:
+        instance.image_hash = content_hash(instance.image)
+
+
+@receiver(post_save, sender=Product)
+def generate_thumbnails(sender, instance, raw=False, **kwargs):
+    """
+    Resizing runs in the thumbnail process pool once the
+    transaction commits, so saving never waits on Pillow.
+    """
+    if raw or not instance.image_hash or instance.image_variants_hash == instance.image_hash:
+        return
+    transaction.on_commit(lambda: schedule_variants(instance))
+
+
+# -----------------------------------------
+# RESPONSE CACHE INVALIDATION
+# -----------------------------------------
+
+# Versions are bumped after commit, so readers never cache
+# rows from a transaction that is still open.
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(products_bulk_changed)
+def bump_product_version(sender, using=None, **kwargs):
+    bump_version_on_commit('products.Product', using=using)
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def bump_review_version(sender, using=None, **kwargs):
+    bump_version_on_commit('products.Review', using=using)
@@ -0,0 +1,382 @@
+import json
+import os
+import shutil
+import threading
+import time
+import zlib
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from scipy import sparse
+
+from .models import Product
+from .search import tokenize
+
+
+# Width of the hashed feature space (tokens are hashed, no vocabulary)
+DEFAULT_FEATURES = 2 ** 18
+
+# A match in the name counts more than one in the description
+FIELD_WEIGHTS = (('name', 3.0), ('category', 2.0), ('description', 1.0))
+
+# Features found in more than this share of products carry little
+# signal ("black", "with", ...) and would make every query scan a large
+# part of the catalog. Small catalogs keep every feature found in
+# up to MIN_PRUNED_FREQUENCY products.
+MAX_DOCUMENT_FREQUENCY = 0.1
+MIN_PRUNED_FREQUENCY = 100
+
+CURRENT_FILE = 'current.json'
+
+
+def index_dir():
+    root = getattr(settings, 'RECOMMENDATIONS_DIR', os.path.join(settings.BASE_DIR, 'var', 'recommendations'))
+    return os.path.join(root, 'similarity')
+
+
+def feature(token, n_features):
+    # crc32 instead of hash(): stable across processes and restarts
+    return zlib.crc32(token.encode('utf-8')) % n_features
+
+
+# -----------------------------------------
+# VECTORIZING
+# -----------------------------------------
+
+def term_frequencies(rows, n_features):
+    """
+    Weighted hashed term counts for (name, category, description) rows,
+    as a CSR matrix with one row per input row.
+    """
+    indptr = [0]
+    indices = []
+    data = []
+    for row in rows:
+        counts = {}
+        for (_, weight), text in zip(FIELD_WEIGHTS, row):
+            for token in tokenize(text):
+                if len(token) > 1:
+                    column = feature(token, n_features)
+                    counts[column] = counts.get(column, 0.0) + weight
+        indices.extend(counts.keys())
+        data.extend(counts.values())
+        indptr.append(len(indices))
+
+    return sparse.csr_matrix(
+        (np.array(data, dtype=np.float32), np.array(indices, dtype=np.int32), np.array(indptr, dtype=np.int64)),
+        shape=(len(indptr) - 1, n_features)
+    )
+
+
+def inverse_document_frequency(document_frequency, n_rows, max_df=MAX_DOCUMENT_FREQUENCY):
+    idf = (np.log((1 + n_rows) / (1 + document_frequency)) + 1).astype(np.float32)
+    idf[document_frequency > max(max_df * n_rows, MIN_PRUNED_FREQUENCY)] = 0
+    return idf
+
+
+def tfidf(term_counts, idf):
+    """
+    Sublinear TF × IDF, rows L2-normalized, so a dot product
+    of two rows is their cosine similarity.
+    """
+    matrix = term_counts.tocsr(copy=True)
+    matrix.data = (1 + np.log(matrix.data)) * idf[matrix.indices]
+    matrix.eliminate_zeros()
+
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    matrix.data /= np.repeat(norms, np.diff(matrix.indptr)).astype(np.float32)
+    return matrix
+
+
+def product_rows(queryset):
+    return queryset.values_list('id', 'name', 'category__name', 'description')
+
+
+# -----------------------------------------
+# STORAGE
+# -----------------------------------------
+# <index_dir>/current.json names the live build directory and its
+# delta. Builds are written to a fresh directory and published by
+# rewriting current.json, so readers never see a half-written index.
+
+def save_arrays(directory, prefix, matrix, ids):
+    os.makedirs(directory, exist_ok=True)
+    for name, array in (
+        ('data', matrix.data), ('indices', matrix.indices),
+        ('indptr', matrix.indptr), ('ids', np.asarray(ids, dtype=np.int64)),
+    ):
+        np.save(os.path.join(directory, f'{prefix}_{name}.npy'), array)
+
+
+def load_arrays(directory, prefix, mmap_mode='r'):
+    return tuple(
+        np.load(os.path.join(directory, f'{prefix}_{name}.npy'), mmap_mode=mmap_mode)
+        for name in ('data', 'indices', 'indptr', 'ids')
+    )
+
+
+def read_current(root):
+    try:
+        with open(os.path.join(root, CURRENT_FILE)) as current_file:
+            return json.load(current_file)
+    except FileNotFoundError:
+        return None
+
+
+def write_current(root, current):
+    path = os.path.join(root, CURRENT_FILE)
+    with open(f'{path}.tmp', 'w') as current_file:
+        json.dump(current, current_file)
+    os.replace(f'{path}.tmp', path)
+
+
+def publish_build(root, matrix, ids, idf, built_at):
+    """
+    Writes a full build (CSR matrix, one row per id) as a
+    feature-major (CSC) inverted index and makes it current.
+    """
+    name = f'build-{time.time_ns()}'
+    directory = os.path.join(root, name)
+    save_arrays(directory, 'base', matrix.tocsc(), ids)
+    np.save(os.path.join(directory, 'idf.npy'), idf)
+
+    previous = read_current(root)
+    write_current(root, {
+        'build': name,
+        'delta': None,
+        'rows': matrix.shape[0],
+        'n_features': matrix.shape[1],
+        'built_at': built_at.isoformat(),
+    })
+
+    # The build before the previous one can no longer be in use
+    for entry in os.listdir(root):
+        if entry.startswith('build-') and entry not in (name, previous and previous['build']):
+            shutil.rmtree(os.path.join(root, entry), ignore_errors=True)
+
+
+def publish_delta(root, current, matrix, ids):
+    name = f'delta-{time.time_ns()}'
+    directory = os.path.join(root, current['build'])
+    save_arrays(directory, name, matrix.tocsr(), ids)
+
+    previous = current.get('delta')
+    write_current(root, {**current, 'delta': name})
+
+    # Keep the previous delta for processes that are loading it right now
+    for entry in os.listdir(directory):
+        prefix = entry.split('_')[0]
+        if prefix.startswith('delta-') and prefix not in (name, previous):
+            os.remove(os.path.join(directory, entry))
+
+
+# -----------------------------------------
+# BUILDING
+# -----------------------------------------
+
+class SimilarityIndexBuilder:
+    """
+    Offline indexer for content-based "similar products".
+
+    - full build: hashed TF-IDF over name, category and description
+      for every product, stored as .npy arrays of a CSC matrix
+      (one column per feature = an inverted index) for np.load(mmap_mode='r')
+    - delta build: products changed since the full build are
+      re-vectorized with the same IDF into a small side matrix;
+      their rows in the full build are ignored at query time
+
+    Run the delta often and the full build now and then
+    (it refreshes the IDF and compacts the delta away).
+    """
+    chunk_size = 10000
+
+    def __init__(self, directory=None, n_features=None):
+        self.root = directory or index_dir()
+        self.n_features = n_features or getattr(settings, 'PRODUCT_SIMILARITY_FEATURES', DEFAULT_FEATURES)
+
+    def vectorize(self, queryset):
+        """
+        (term count matrix, ids) for a queryset, read in chunks.
+        """
+        ids = []
+        chunks = []
+        rows = []
+        for pk, *fields in product_rows(queryset).order_by('id').iterator(chunk_size=self.chunk_size):
+            ids.append(pk)
+            rows.append(fields)
+            if len(rows) >= self.chunk_size:
+                chunks.append(term_frequencies(rows, self.n_features))
+                rows = []
+        if rows or not chunks:
+            chunks.append(term_frequencies(rows, self.n_features))
+        return sparse.vstack(chunks, format='csr'), ids
+
+    def build(self):
+        started = time.monotonic()
+        built_at = timezone.now()
+
+        counts, ids = self.vectorize(Product.objects.all())
+        document_frequency = np.bincount(counts.indices, minlength=self.n_features)
+        idf = inverse_document_frequency(document_frequency, len(ids))
+
+        publish_build(self.root, tfidf(counts, idf), ids, idf, built_at)
+        return {'products': len(ids), 'seconds': round(time.monotonic() - started, 3)}
+
+    def build_delta(self):
+        """
+        Re-vectorizes products saved since the last full build.
+        Falls back to a full build when there is none.
+        """
+        current = read_current(self.root)
+        if current is None or current['n_features'] != self.n_features:
+            return self.build()
+
+        started = time.monotonic()
+        idf = np.load(os.path.join(self.root, current['build'], 'idf.npy'))
+        changed = Product.objects.filter(updated_date__gt=parse_datetime(current['built_at']))
+        counts, ids = self.vectorize(changed)
+
+        publish_delta(self.root, current, tfidf(counts, idf), ids)
+        return {'products': len(ids), 'seconds': round(time.monotonic() - started, 3)}
+
+
+# -----------------------------------------
+# QUERYING
+# -----------------------------------------
+
+class SimilarityIndex:
+    """
+    A loaded build: the memory-mapped base matrix (CSC arrays)
+    plus its delta.
+
+    Scoring a query touches only the columns of the query's features
+    (the rows containing them), never the whole matrix, so the cost
+    grows with the number of candidates, not with the catalog size.
+    """
+
+    def __init__(self, root, current):
+        directory = os.path.join(root, current['build'])
+        self.n_features = current['n_features']
+        self.idf = np.load(os.path.join(directory, 'idf.npy'))
+
+        # CSC arrays of the base matrix, memory-mapped
+        self.data, self.indices, self.indptr, self.base_ids = load_arrays(directory, 'base')
+
+        if current.get('delta'):
+            data, indices, indptr, self.delta_ids = load_arrays(directory, current['delta'], mmap_mode=None)
+            self.delta = sparse.csr_matrix(
+                (data, indices, indptr), shape=(len(self.delta_ids), self.n_features)
+            )
+            # Base rows superseded by the delta
+            self.stale = np.isin(self.base_ids, self.delta_ids)
+        else:
+            self.delta_ids = np.array([], dtype=np.int64)
+            self.delta = None
+            self.stale = None
+
+    def vector(self, name, category, description):
+        """
+        (features, weights) of a product's TF-IDF vector.
+        """
+        row = tfidf(term_frequencies([(name, category, description)], self.n_features), self.idf)
+        return row.indices, row.data
+
+    def scores(self, features, weights):
+        """
+        (ids, scores) of every indexed product sharing a feature with the query.
+        """
+        if not len(features):
+            return np.array([], dtype=np.int64), np.array([], dtype=np.float32)
+
+        # Gather the query's columns of the inverted index
+        # and sum the partial scores per row
+        indptr, indices, data = self.indptr, self.indices, self.data
+        rows = np.concatenate([indices[indptr[f]:indptr[f + 1]] for f in features])
+        partial = np.concatenate([
+            data[indptr[f]:indptr[f + 1]] * weight for f, weight in zip(features, weights)
+        ])
+        if len(rows) * 2 > len(self.base_ids):
+            # Many candidates: a dense accumulator beats sorting
+            dense = np.bincount(rows, weights=partial, minlength=len(self.base_ids))
+            rows = np.flatnonzero(dense)
+            scores = dense[rows].astype(np.float32)
+        else:
+            rows, inverse = np.unique(rows, return_inverse=True)
+            scores = np.bincount(inverse, weights=partial).astype(np.float32)
+
+        if self.stale is not None:
+            fresh = ~self.stale[rows]
+            rows, scores = rows[fresh], scores[fresh]
+        ids = self.base_ids[rows]
+
+        if self.delta is not None and self.delta.shape[0]:
+            query = sparse.csr_matrix(
+                (weights, features, [0, len(features)]), shape=(1, self.n_features)
+            )
+            delta_scores = (self.delta @ query.T).toarray().ravel()
+            rows = np.flatnonzero(delta_scores)
+            ids = np.concatenate([ids, self.delta_ids[rows]])
+            scores = np.concatenate([scores, delta_scores[rows]])
+
+        return ids, scores
+
+    @staticmethod
+    def top(ids, scores, k, exclude=None):
+        """
+        The `k` best (ids, scores), best first.
+        """
+        if exclude is not None:
+            keep = ids != exclude
+            ids, scores = ids[keep], scores[keep]
+        if len(scores) > k:
+            best = np.argpartition(-scores, k)[:k]
+            ids, scores = ids[best], scores[best]
+        order = np.lexsort((ids, -scores))
+        return ids[order], scores[order]
+
+
+_index = None
+_index_key = None
+_index_lock = threading.Lock()
+
+
+def get_similarity_index():
+    """
+    The current build for this process, or None if none was built yet.
+    Reloaded when the indexer publishes a new build or delta.
+    """
+    global _index, _index_key
+    root = index_dir()
+    current = read_current(root)
+    if current is None:
+        return None
+
+    key = (current['build'], current.get('delta'))
+    if key != _index_key:
+        with _index_lock:
+            if key != _index_key:
+                _index = SimilarityIndex(root, current)
+                _index_key = key
+    return _index
+
+
+def similar_products(index, product, k=10, max_candidates=2000):
+    """
+    Yields growing lists of candidate (ids, scores), best first,
+    for a product (which need not be indexed yet).
+
+    Callers filter each list (e.g. in stock only) and stop once
+    they have `k` products; each list is 4x longer than the last.
+    """
+    vector = index.vector(product.name, product.category.name, product.description)
+    ids, scores = index.scores(*vector)
+
+    size = k * 4
+    while True:
+        yield index.top(ids, scores, size, exclude=product.pk)
+        if size >= len(ids) or size >= max_candidates:
+            return
+        size *= 4
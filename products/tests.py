@@ -1,3 +1,1590 @@
-from django.test import TestCase
+import base64
+import csv
+import io
+import json
+import shutil
+import tempfile
+from concurrent.futures import Future
+from decimal import Decimal
+from io import StringIO
+from unittest import SkipTest, mock
+from urllib.parse import parse_qs, urlparse
 
-# Create your tests here.
+from django.contrib.auth.models import User
+import numpy as np
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.http import StreamingHttpResponse
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from rest_framework.exceptions import ValidationError
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from categories.models import Category
+from ecommerce_api.cache import get_versions
+from ecommerce_api.checks import check_shared_cache
+from ecommerce_api.pagination import KeysetPagination
+from orders.models import Order, OrderItem
+from . import thumbnails
+from .autocomplete import PrefixIndex, get_autocomplete
+from .copurchase import CoPurchaseBuilder
+from .exporter import EXPORT_FIELDS, iter_export
+from .facets import compute_facets
+from .imaging import render_variants
+from .importer import ProductImporter
+from .inventory import apply_inventory_updates
+from .management.commands.recompute_ratings import RATING_FIELDS
+from .models import FrequentlyBoughtTogether, Product, Review
+from .search import PostgresSearchBackend, SQLiteSearchBackend, get_search_backend
+from .signals import products_bulk_changed
+from .similarity import SimilarityIndexBuilder, get_similarity_index, similar_products
+from .thumbnails import (
+    finish_variants, get_format, schedule_variants, variant_targets, variant_urls,
+)
+
+
+def make_product(category, name, description='', **fields):
+    fields.setdefault('price', Decimal('10.00'))
+    fields.setdefault('stock_quantity', 5)
+    return Product.objects.create(
+        name=name, description=description, category=category, **fields
+    )
+
+
+# -----------------------------------------
+# FULL-TEXT SEARCH
+# -----------------------------------------
+
+class ProductSearchTests(TestCase):
+    """
+    Search results are ranked by relevance (name > category > description)
+    and the index follows product saves and deletes.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        # Checked against the test database, before any transaction opens
+        if not isinstance(get_search_backend(), (SQLiteSearchBackend, PostgresSearchBackend)):
+            raise SkipTest("the database has no full-text index")
+        super().setUpClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('searcher', 'searcher@example.com', 'password')
+        cls.category = Category.objects.create(name='Outdoor')
+        cls.in_description = make_product(
+            cls.category, 'Camping stove', 'Folds into a compact lantern case.'
+        )
+        cls.in_name = make_product(cls.category, 'Lantern', 'Battery powered.')
+        cls.unrelated = make_product(cls.category, 'Tent', 'Sleeps two.')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def search(self, query):
+        return list(
+            get_search_backend().search(Product.objects.all(), query)
+            .values_list('id', flat=True)
+        )
+
+    def test_name_matches_rank_above_description_matches(self):
+        self.assertEqual(self.search('lantern'), [self.in_name.pk, self.in_description.pk])
+
+    def test_category_matches_rank_above_description_matches(self):
+        gear = Category.objects.create(name='Lantern Gear')
+        in_category = make_product(gear, 'Wick', 'Spare part.')
+
+        self.assertEqual(
+            self.search('lantern'),
+            [self.in_name.pk, in_category.pk, self.in_description.pk]
+        )
+
+    def test_tokens_match_as_prefixes(self):
+        self.assertEqual(self.search('lant'), [self.in_name.pk, self.in_description.pk])
+
+    def test_endpoints_return_ranked_results(self):
+        response = self.client.get('/api/products/search/', {'q': 'lantern'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [product['id'] for product in response.data['results']],
+            [self.in_name.pk, self.in_description.pk]
+        )
+
+        response = self.client.get('/api/products/', {'search': 'lantern'})
+        self.assertEqual(
+            [product['id'] for product in response.data['results']],
+            [self.in_name.pk, self.in_description.pk]
+        )
+
+    def test_search_endpoint_combines_query_category_and_price(self):
+        lighting = Category.objects.create(name='Lighting', parent=self.category)
+        indoor = Category.objects.create(name='Indoor')
+        in_description = make_product(lighting, 'Lamp', 'Lantern style shade.', price=Decimal('20.00'))
+        in_name = make_product(lighting, 'Lantern pro', 'Bright.', price=Decimal('40.00'))
+        make_product(lighting, 'Lantern mini', 'Small.', price=Decimal('5.00'))
+        make_product(lighting, 'Lantern deluxe', 'Brass.', price=Decimal('100.00'))
+        make_product(indoor, 'Lantern desk', 'Office.', price=Decimal('30.00'))
+        make_product(lighting, 'Torch', 'Handheld.', price=Decimal('30.00'))
+
+        response = self.client.get('/api/products/search/', {
+            'q': 'lantern', 'category': 'Lighting', 'min_price': '10', 'max_price': '50',
+        })
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [product['id'] for product in response.data['results']],
+            [in_name.pk, in_description.pk]
+        )
+
+        # A parent category includes Lighting; name matches rank first
+        mini = Product.objects.get(name='Lantern mini')
+        response = self.client.get('/api/products/search/', {
+            'q': 'lantern', 'category': 'Outdoor', 'max_price': '50',
+        })
+        ids = [product['id'] for product in response.data['results']]
+        self.assertEqual(set(ids[:3]), {self.in_name.pk, in_name.pk, mini.pk})
+        self.assertEqual(set(ids[3:]), {self.in_description.pk, in_description.pk})
+
+    def test_cursor_pagination_refuses_relevance_order(self):
+        for path, params in (('/api/products/search/', {'q': 'lantern'}),
+                             ('/api/products/', {'search': 'lantern'})):
+            response = self.client.get(path, {**params, 'pagination': 'cursor'})
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('pagination', response.data)
+
+            response = self.client.get(path, {**params, 'pagination': 'cursor', 'ordering': 'name'})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(
+                [product['id'] for product in response.data['results']],
+                [self.in_description.pk, self.in_name.pk]
+            )
+
+    def test_save_reindexes_the_product(self):
+        self.unrelated.name = 'Hammock'
+        self.unrelated.save()
+
+        self.assertEqual(self.search('hammock'), [self.unrelated.pk])
+        self.assertEqual(self.search('tent'), [])
+
+    def test_delete_removes_the_product_from_the_index(self):
+        pk = self.in_name.pk
+        self.in_name.delete()
+
+        self.assertEqual(self.search('lantern'), [self.in_description.pk])
+        self.assertNotIn(pk, self.search('battery'))
+
+    def test_category_rename_reindexes_its_products(self):
+        self.category.name = 'Expedition'
+        self.category.save()
+
+        self.assertEqual(
+            set(self.search('expedition')),
+            {self.in_description.pk, self.in_name.pk, self.unrelated.pk}
+        )
+        self.assertEqual(self.search('outdoor'), [])
+
+
+# -----------------------------------------
+# KEYSET PAGINATION
+# -----------------------------------------
+
+class PriceKeysetPagination(KeysetPagination):
+    page_size = 4
+    ordering = '-price'
+    cursor_ordering_fields = ['price', 'id']
+
+
+class KeysetPaginationTests(TestCase):
+    """
+    Cursor pages follow (price, id), including across price ties,
+    and never run a COUNT query.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Paging')
+        # Three products share every price, so page boundaries fall inside ties
+        cls.products = [
+            make_product(category, f'Product {number}', price=Decimal(10 + number // 3))
+            for number in range(10)
+        ]
+        cls.expected = [
+            product.pk for product in
+            sorted(cls.products, key=lambda product: (product.price, product.pk), reverse=True)
+        ]
+
+    def paginate(self, url='/items/', **params):
+        paginator = PriceKeysetPagination()
+        request = Request(APIRequestFactory().get(url, params))
+        rows = paginator.paginate_queryset(Product.objects.all(), request)
+        return [row.pk for row in rows], paginator
+
+    def cursor(self, link):
+        return parse_qs(urlparse(link).query)['cursor'][0]
+
+    def test_next_links_walk_every_row_once_across_ties(self):
+        seen = []
+        ids, paginator = self.paginate()
+        seen += ids
+        while paginator.get_next_link():
+            ids, paginator = self.paginate(cursor=self.cursor(paginator.get_next_link()))
+            seen += ids
+
+        self.assertEqual(seen, self.expected)
+        self.assertEqual(len(ids), 2)
+
+    def test_previous_link_returns_the_page_before(self):
+        first, paginator = self.paginate()
+        self.assertIsNone(paginator.get_previous_link())
+
+        second, paginator = self.paginate(cursor=self.cursor(paginator.get_next_link()))
+        self.assertEqual(second, self.expected[4:8])
+
+        back, paginator = self.paginate(cursor=self.cursor(paginator.get_previous_link()))
+        self.assertEqual(back, first)
+        self.assertIsNone(paginator.get_previous_link())
+        self.assertIsNotNone(paginator.get_next_link())
+
+    def test_ascending_ordering_uses_id_as_tie_breaker(self):
+        ids, paginator = self.paginate(ordering='price')
+        self.assertEqual(ids, self.expected[::-1][:4])
+
+        ids, _ = self.paginate(ordering='price', cursor=self.cursor(paginator.get_next_link()))
+        self.assertEqual(ids, self.expected[::-1][4:8])
+
+    def test_invalid_cursors_are_rejected(self):
+        _, paginator = self.paginate()
+        valid = self.cursor(paginator.get_next_link())
+        payload = json.loads(base64.urlsafe_b64decode(valid))
+
+        tampered = [
+            'not-a-cursor',
+            base64.urlsafe_b64encode(b'{"id": 1}').decode(),
+            base64.urlsafe_b64encode(json.dumps({**payload, 'f': 'name'}).encode()).decode(),
+            base64.urlsafe_b64encode(json.dumps({**payload, 'id': 'x'}).encode()).decode(),
+        ]
+        for cursor in tampered:
+            with self.subTest(cursor=cursor), self.assertRaises(ValidationError):
+                self.paginate(cursor=cursor)
+
+    def test_unsupported_ordering_is_rejected(self):
+        with self.assertRaises(ValidationError):
+            self.paginate(ordering='stock_quantity')
+
+    def test_a_page_is_one_query_without_count(self):
+        _, paginator = self.paginate()
+        cursor = self.cursor(paginator.get_next_link())
+
+        with CaptureQueriesContext(connection) as queries:
+            self.paginate(cursor=cursor)
+
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('COUNT(', queries[0]['sql'].upper())
+
+    def test_cursor_mode_on_the_product_list(self):
+        user = User.objects.create_user('pager', 'pager@example.com', 'password')
+        client = APIClient()
+        client.force_authenticate(user)
+
+        response = client.get('/api/products/', {'pagination': 'cursor', 'ordering': '-price'})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('count', response.data)
+        self.assertEqual([product['id'] for product in response.data['results']], self.expected)
+
+        response = client.get('/api/products/', {'cursor': 'bogus'})
+        self.assertEqual(response.status_code, 400)
+
+
+# -----------------------------------------
+# FACETS
+# -----------------------------------------
+
+@override_settings(PRODUCT_FACET_PRICE_BUCKETS=[0, 25, 50])
+class FacetTests(TestCase):
+    """
+    Price bands are [low, high), category counts include
+    subcategories, and a product change drops cached facets.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.electronics = Category.objects.create(name='Electronics')
+        cls.phones = Category.objects.create(name='Phones', parent=cls.electronics)
+        cls.cases = Category.objects.create(name='Cases', parent=cls.phones)
+        cls.garden = Category.objects.create(name='Garden')
+
+        cls.cheap = make_product(cls.cases, 'Case', price=Decimal('24.99'))
+        cls.edge = make_product(cls.phones, 'Basic phone', price=Decimal('25.00'))
+        cls.sold_out = make_product(cls.phones, 'Old phone', price=Decimal('49.99'), stock_quantity=0)
+        cls.hidden = make_product(cls.electronics, 'Radio', price=Decimal('50.00'), is_available=False)
+        cls.hose = make_product(cls.garden, 'Hose', price=Decimal('0.01'))
+
+    def setUp(self):
+        cache.clear()
+
+    def test_price_band_edges(self):
+        facets = compute_facets(Product.objects.all())
+        self.assertEqual(facets['price_ranges'], [
+            {'min': '0', 'max': '25', 'count': 2},
+            {'min': '25', 'max': '50', 'count': 2},
+            {'min': '50', 'max': None, 'count': 1},
+        ])
+
+    def test_stock_and_availability_counts(self):
+        facets = compute_facets(Product.objects.all())
+        self.assertEqual(facets['total'], 5)
+        self.assertEqual(facets['in_stock'], 4)
+        # In stock and available
+        self.assertEqual(facets['available'], 3)
+
+    def test_category_counts_roll_up_to_ancestors(self):
+        facets = compute_facets(Product.objects.all())
+        self.assertEqual(
+            {facet['name']: facet['count'] for facet in facets['categories']},
+            {'Electronics': 4, 'Phones': 3, 'Cases': 1, 'Garden': 1}
+        )
+
+    def test_rollup_names_ancestors_without_own_products(self):
+        facets = compute_facets(Product.objects.filter(pk=self.cheap.pk))
+        self.assertEqual(
+            [(facet['name'], facet['count']) for facet in facets['categories']],
+            [('Cases', 1), ('Electronics', 1), ('Phones', 1)]
+        )
+
+    def test_endpoint_applies_the_list_filters(self):
+        response = self.client.get('/api/products/facets/', {'category': 'Phones'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['total'], 3)
+
+    def test_product_save_invalidates_cached_facets(self):
+        self.assertEqual(self.client.get('/api/products/facets/').data['in_stock'], 4)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.sold_out.stock_quantity = 3
+            self.sold_out.save()
+
+        self.assertEqual(self.client.get('/api/products/facets/').data['in_stock'], 5)
+
+    def test_equivalent_queries_share_a_cache_entry(self):
+        self.client.get('/api/products/facets/', {'category': 'Phones', 'max_price': '60'})
+
+        with self.assertNumQueries(0):
+            self.client.get('/api/products/facets/', {'max_price': '60', 'category': 'Phones', 'page': '2'})
+
+
+# -----------------------------------------
+# LIST FILTERS
+# -----------------------------------------
+
+class StockFilterTests(TestCase):
+    """
+    ?is_available=true&in_stock=true runs as one purchasable()
+    condition and must return what the two filters return apart;
+    the other combinations keep their own meaning.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Tools')
+        cls.buyable = make_product(category, 'Hammer')
+        cls.sold_out = make_product(category, 'Saw', stock_quantity=0)
+        cls.hidden = make_product(category, 'Drill', is_available=False)
+        cls.hidden_sold_out = make_product(category, 'Vice', stock_quantity=0, is_available=False)
+
+    def setUp(self):
+        cache.clear()
+
+    def names(self, **params):
+        response = self.client.get('/api/products/', params)
+        self.assertEqual(response.status_code, 200)
+        return {row['name'] for row in response.data['results']}
+
+    def test_combined_filter_matches_the_separate_filters(self):
+        combined = self.names(is_available='true', in_stock='true')
+        separate = self.names(is_available='true') & self.names(in_stock='true')
+
+        self.assertEqual(combined, {'Hammer'})
+        self.assertEqual(combined, separate)
+
+    def test_in_stock_false(self):
+        self.assertEqual(self.names(in_stock='false'), {'Saw', 'Vice'})
+
+    def test_is_available_false(self):
+        self.assertEqual(self.names(is_available='false'), {'Drill', 'Vice'})
+
+    def test_mixed_values(self):
+        self.assertEqual(self.names(is_available='true', in_stock='false'), {'Saw'})
+        self.assertEqual(self.names(is_available='false', in_stock='true'), {'Drill'})
+
+
+class CategoryFilterTests(TestCase):
+    """
+    Filtering by a parent category returns the products of all
+    its subcategories too, on every endpoint that takes one.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.electronics = Category.objects.create(name='Electronics')
+        cls.phones = Category.objects.create(name='Phones', parent=cls.electronics)
+        cls.cases = Category.objects.create(name='Phone Cases', parent=cls.phones)
+        garden = Category.objects.create(name='Garden')
+
+        cls.radio = make_product(cls.electronics, 'Radio')
+        cls.phone = make_product(cls.phones, 'Phone')
+        cls.case = make_product(cls.cases, 'Case')
+        make_product(garden, 'Hose')
+
+    def setUp(self):
+        cache.clear()
+
+    def names(self, path, **params):
+        response = self.client.get(path, params)
+        self.assertEqual(response.status_code, 200)
+        return {row['name'] for row in response.data['results']}
+
+    def test_list_filter_includes_descendants(self):
+        self.assertEqual(self.names('/api/products/', category='Electronics'), {'Radio', 'Phone', 'Case'})
+        self.assertEqual(self.names('/api/products/', category='phones'), {'Phone', 'Case'})
+        self.assertEqual(self.names('/api/products/', category='phone-cases'), {'Case'})
+
+    def test_by_category_includes_descendants(self):
+        self.assertEqual(
+            self.names('/api/products/by_category/', name='Electronics'), {'Radio', 'Phone', 'Case'}
+        )
+        self.assertEqual(self.names('/api/products/by_category/', name='Phones'), {'Phone', 'Case'})
+        self.assertEqual(self.names('/api/products/by_category/', name='Unknown'), set())
+
+    def test_moved_subtree_follows_its_new_parent(self):
+        garden = Category.objects.get(name='Garden')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.phones.parent = garden
+            self.phones.save()
+
+        self.assertEqual(self.names('/api/products/', category='Electronics'), {'Radio'})
+        self.assertEqual(self.names('/api/products/by_category/', name='Garden'), {'Hose', 'Phone', 'Case'})
+
+
+# -----------------------------------------
+# RATING AGGREGATES
+# -----------------------------------------
+
+class RatingAggregateTests(TestCase):
+    """
+    The denormalized rating columns follow review creates/deletes,
+    and recompute_ratings arrives at the same values.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Books')
+        cls.product = make_product(cls.category, 'Novel')
+        cls.other = make_product(cls.category, 'Atlas')
+        cls.users = [
+            User.objects.create_user(f'reader{number}', f'reader{number}@example.com', 'password')
+            for number in range(4)
+        ]
+
+    def review(self, user, rating, product=None):
+        client = APIClient()
+        client.force_authenticate(user)
+        product = product or self.product
+        response = client.post(
+            f'/api/products/{product.pk}/add_review/', {'rating': rating}, format='json'
+        )
+        self.assertEqual(response.status_code, 201)
+        return Review.objects.get(pk=response.data['id'])
+
+    def stats(self, product=None):
+        return Product.objects.values(*RATING_FIELDS).get(pk=(product or self.product).pk)
+
+    def test_create_and_delete_keep_histogram_and_average(self):
+        reviews = [self.review(user, rating) for user, rating in zip(self.users, [5, 4, 4, 1])]
+
+        product = Product.objects.get(pk=self.product.pk)
+        self.assertEqual(product.review_count, 4)
+        self.assertEqual(product.rating_histogram, {1: 1, 2: 0, 3: 0, 4: 2, 5: 1})
+        self.assertAlmostEqual(product.avg_rating, 3.5)
+
+        reviews[3].delete()
+        product.refresh_from_db()
+        self.assertEqual(product.rating_histogram, {1: 0, 2: 0, 3: 0, 4: 2, 5: 1})
+        self.assertAlmostEqual(product.avg_rating, 13 / 3)
+
+        for review in reviews[:3]:
+            review.delete()
+        self.assertEqual(self.stats(), {field: 0 for field in RATING_FIELDS})
+
+    def test_recompute_matches_incremental_values(self):
+        for user, rating in zip(self.users, [2, 3, 5]):
+            self.review(user, rating)
+        self.review(self.users[0], 4, product=self.other)
+        incremental = [self.stats(), self.stats(self.other)]
+
+        Product.objects.update(**{field: 0 for field in RATING_FIELDS})
+        call_command('recompute_ratings', batch_size=1, stdout=StringIO())
+
+        self.assertEqual([self.stats(), self.stats(self.other)], incremental)
+
+    def test_recompute_resets_products_whose_reviews_were_all_deleted(self):
+        for user, rating in zip(self.users, [5, 3]):
+            self.review(user, rating)
+        # Bulk delete: bypasses Review.delete(), the aggregates go stale
+        Review.objects.filter(product=self.product).delete()
+        self.assertEqual(self.stats()['review_count'], 2)
+
+        out = StringIO()
+        call_command('recompute_ratings', stdout=out)
+
+        self.assertEqual(self.stats(), {field: 0 for field in RATING_FIELDS})
+        self.assertIn('reset for 1 products', out.getvalue())
+
+
+# -----------------------------------------
+# CACHE INVALIDATION
+# -----------------------------------------
+
+class CacheInvalidationTests(TestCase):
+    """
+    Model versions are bumped once the writing transaction commits,
+    never while it is open and never after a rollback.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Kitchen')
+        cls.product = make_product(cls.category, 'Kettle')
+
+    def setUp(self):
+        cache.clear()
+
+    def version(self):
+        return get_versions('products.Product')['products.Product']
+
+    def test_version_is_bumped_on_commit(self):
+        before = self.version()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.price = Decimal('12.00')
+            self.product.save()
+            self.assertEqual(self.version(), before)
+
+        self.assertGreater(self.version(), before)
+
+    def test_rolled_back_writes_do_not_bump(self):
+        before = self.version()
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                self.product.save()
+                raise RuntimeError
+
+        self.assertEqual(callbacks, [])
+        self.assertEqual(self.version(), before)
+
+    def test_bulk_changes_bump_on_commit(self):
+        before = self.version()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            products_bulk_changed.send(
+                sender=Product, product_ids=[self.product.pk], fields=['price']
+            )
+            self.assertEqual(self.version(), before)
+
+        self.assertGreater(self.version(), before)
+
+    def test_cached_response_is_refreshed_after_commit(self):
+        url = f'/api/products/{self.product.pk}/'
+        self.assertEqual(self.client.get(url)['X-Cache'], 'MISS')
+        self.assertEqual(self.client.get(url)['X-Cache'], 'HIT')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.name = 'Electric kettle'
+            self.product.save()
+
+        response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['name'], 'Electric kettle')
+
+    def test_process_local_cache_warns_in_production(self):
+        locmem = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        redis = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache'}}
+
+        with override_settings(DEBUG=False, CACHES=locmem):
+            self.assertEqual(
+                [error.id for error in check_shared_cache(None)], ['ecommerce_api.W001']
+            )
+        with override_settings(DEBUG=True, CACHES=locmem):
+            self.assertEqual(check_shared_cache(None), [])
+        with override_settings(DEBUG=False, CACHES=redis):
+            self.assertEqual(check_shared_cache(None), [])
+
+
+# -----------------------------------------
+# CONDITIONAL GET
+# -----------------------------------------
+
+class ConditionalGetTests(TestCase):
+    """
+    List/detail responses carry ETag and Last-Modified and answer
+    revalidations with 304; validators are cached per model version,
+    so a revalidation runs no query.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('revalidator', 'revalidator@example.com', 'password')
+        cls.category = Category.objects.create(name='Office')
+        cls.products = [make_product(cls.category, f'Pen {number}') for number in range(3)]
+
+    def setUp(self):
+        cache.clear()
+        # Authenticated: skips the response cache, only validators are cached
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_if_none_match_returns_304(self):
+        response = self.client.get('/api/products/', {'category': 'Office'})
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        response = self.client.get('/api/products/', {'category': 'Office'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_if_modified_since_returns_304(self):
+        response = self.client.get(f'/api/products/{self.products[0].pk}/')
+        last_modified = response['Last-Modified']
+
+        response = self.client.get(
+            f'/api/products/{self.products[0].pk}/', HTTP_IF_MODIFIED_SINCE=last_modified
+        )
+        self.assertEqual(response.status_code, 304)
+
+        response = self.client.get('/api/products/')
+        response = self.client.get('/api/products/', HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_revalidation_runs_no_query(self):
+        etag = self.client.get('/api/products/', {'ordering': 'price'})['ETag']
+
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/products/', {'ordering': 'price'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_pages_share_validators(self):
+        self.client.get('/api/products/', {'pagination': 'cursor'})
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/api/products/', {'pagination': 'cursor', 'page_size': '2'})
+
+        # Only the page itself: no COUNT/MAX for the validators
+        self.assertEqual(len(queries), 1)
+
+    def test_etag_changes_with_query_and_data(self):
+        etag = self.client.get('/api/products/')['ETag']
+        self.assertNotEqual(self.client.get('/api/products/', {'ordering': 'name'})['ETag'], etag)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.products[0].price = Decimal('3.00')
+            self.products[0].save()
+
+        response = self.client.get('/api/products/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+# -----------------------------------------
+# SPARSE FIELDSETS
+# -----------------------------------------
+
+class SparseFieldsTests(TestCase):
+    """
+    ?fields= / ?omit= (and ?product_fields= on nested products)
+    prune both the output keys and the SELECTed columns.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('sparse', 'sparse@example.com', 'password')
+        cls.category = Category.objects.create(name='Tools')
+        cls.product = make_product(
+            cls.category, 'Hammer', 'A long description nobody asked for.',
+            review_count=3, rating_sum=13, avg_rating=13 / 3, created_by=cls.user,
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def product_selects(self, queries):
+        return [
+            query['sql'] for query in queries
+            if query['sql'].startswith('SELECT') and 'FROM "products_product"' in query['sql']
+        ]
+
+    def test_fields_prunes_keys_and_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                f'/api/products/{self.product.pk}/', {'fields': 'id,name,price'}
+            )
+
+        self.assertEqual(set(response.data), {'id', 'name', 'price'})
+        sql = self.product_selects(queries)[-1]
+        self.assertIn('"products_product"."name"', sql)
+        self.assertNotIn('"products_product"."description"', sql)
+        self.assertNotIn('categories_category', sql)
+        self.assertNotIn('auth_user', sql)
+
+    def test_omit_prunes_keys_and_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/products/', {'omit': 'description,category_name'})
+
+        product = response.data['results'][0]
+        self.assertNotIn('description', product)
+        self.assertNotIn('category_name', product)
+        self.assertIn('created_by_username', product)
+        sql = self.product_selects(queries)[-1]
+        self.assertNotIn('"products_product"."description"', sql)
+        self.assertNotIn('"categories_category"."name"', sql)
+
+    def test_nested_product_fields(self):
+        cart_item = self.client.post(
+            '/api/cart/add/', {'product': self.product.pk, 'quantity': 1}, format='json'
+        )
+        self.assertEqual(cart_item.status_code, 200)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/cart/', {'product_fields': 'id,name'})
+
+        details = response.data['items'][0]['product_details']
+        self.assertEqual(set(details), {'id', 'name'})
+        sql = ' '.join(query['sql'] for query in queries)
+        self.assertIn('"products_product"."name"', sql)
+        self.assertNotIn('"products_product"."description"', sql)
+
+    def test_unknown_fields_are_rejected(self):
+        response = self.client.get('/api/products/', {'fields': 'name,bogus,zzz'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data, {'fields': ['Unknown field(s): bogus, zzz.']})
+
+        response = self.client.get(f'/api/products/{self.product.pk}/', {'omit': 'bogus'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data, {'omit': ['Unknown field(s): bogus.']})
+
+        response = self.client.get('/api/cart/', {'product_fields': 'id,bogus'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data, {'product_fields': ['Unknown field(s): bogus.']})
+
+    def test_avg_rating_is_a_rounded_number(self):
+        response = self.client.get(f'/api/products/{self.product.pk}/', {'fields': 'avg_rating'})
+        self.assertEqual(response.data, {'avg_rating': 4.33})
+        self.assertEqual(response.json(), {'avg_rating': 4.33})
+
+
+# -----------------------------------------
+# BULK IMPORT
+# -----------------------------------------
+
+class ProductImporterTests(TestCase):
+    """
+    CSV / JSON Lines imports upsert on sku, report invalid rows
+    and superseded duplicates, and send one signal per batch.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('importer', 'importer@example.com', 'password')
+        cls.category = Category.objects.create(name='Garden')
+
+    def run_import(self, text, file_format='csv', batch_size=None):
+        return ProductImporter(user=self.user, batch_size=batch_size).run(StringIO(text), file_format)
+
+    def test_csv_import(self):
+        report = self.run_import(
+            'sku,name,description,price,category,stock_quantity\n'
+            'G-1,Rake,Steel rake,12.50,Garden,4\n'
+            'G-2,Spade,Ash handle,19.90,garden,\n'
+        )
+
+        self.assertEqual((report['rows'], report['imported'], report['failed']), (2, 2, 0))
+        spade = Product.objects.get(sku='G-2')
+        self.assertEqual(spade.price, Decimal('19.90'))
+        self.assertEqual(spade.category, self.category)
+        self.assertEqual(spade.stock_quantity, 0)
+        self.assertEqual(spade.created_by, self.user)
+
+    def test_jsonl_import(self):
+        report = self.run_import(
+            '{"sku": "G-3", "name": "Hose", "description": "20 m", "price": "30", "category": "Garden"}\n'
+            '\n'
+            '{"name": "Gloves", "description": "Test", "price": "5", "category": "Garden"}\n',
+            file_format='jsonl',
+        )
+
+        self.assertEqual((report['rows'], report['imported']), (2, 2))
+        self.assertTrue(Product.objects.filter(name='Gloves', sku=None).exists())
+
+    def test_existing_sku_is_updated(self):
+        rake = make_product(self.category, 'Rake', sku='G-1', stock_quantity=1)
+
+        report = self.run_import(
+            'sku,name,description,price,category,stock_quantity\n'
+            'G-1,Rake XL,Wider,14.00,Garden,9\n'
+        )
+
+        self.assertEqual(report['imported'], 1)
+        rake.refresh_from_db()
+        self.assertEqual((rake.name, rake.price, rake.stock_quantity), ('Rake XL', Decimal('14.00'), 9))
+        self.assertEqual(Product.objects.filter(sku='G-1').count(), 1)
+
+    def test_duplicate_skus_in_a_batch_are_reported_separately(self):
+        report = self.run_import(
+            'sku,name,description,price,category\n'
+            'G-1,Rake,Steel,10,Garden\n'
+            'G-1,Rake v2,Steel,11,Garden\n'
+            'G-2,Spade,Ash,12,Garden\n'
+        )
+
+        self.assertEqual((report['rows'], report['imported'], report['duplicates']), (3, 2, 1))
+        self.assertEqual(Product.objects.get(sku='G-1').name, 'Rake v2')
+
+    def test_invalid_rows_are_reported_and_skipped(self):
+        report = self.run_import(
+            '{"sku": "G-1", "name": "Rake", "description": "Test", "price": "10", "category": "Garden"}\n'
+            '{"sku": "G-2", "name": "Spade", "description": "Test", "price": "-1", "category": "Garden"}\n'
+            '{"sku": "G-3", "name": "Hose", "description": "Test", "price": "5", "category": "Kitchen"}\n'
+            'not json\n'
+            '[1, 2]\n',
+            file_format='jsonl',
+        )
+
+        self.assertEqual((report['rows'], report['imported'], report['failed']), (5, 1, 4))
+        errors = {error['row']: error['errors'] for error in report['errors']}
+        self.assertEqual(sorted(errors), [2, 3, 4, 5])
+        self.assertIn('price', errors[2])
+        self.assertIn('category', errors[3])
+        self.assertEqual(list(Product.objects.values_list('sku', flat=True)), ['G-1'])
+
+    def test_one_signal_per_batch(self):
+        batches = []
+
+        def receiver(sender, product_ids, **kwargs):
+            batches.append(sorted(product_ids))
+
+        products_bulk_changed.connect(receiver)
+        self.addCleanup(products_bulk_changed.disconnect, receiver)
+
+        rows = ''.join(f'G-{number},Item {number},Test,1,Garden\n' for number in range(5))
+        self.run_import('sku,name,description,price,category\n' + rows, batch_size=2)
+
+        self.assertEqual([len(batch) for batch in batches], [2, 2, 1])
+        self.assertEqual(
+            sorted(pk for batch in batches for pk in batch),
+            sorted(Product.objects.values_list('id', flat=True))
+        )
+
+    def test_upload_endpoint(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        upload = SimpleUploadedFile(
+            'feed.jsonl',
+            b'{"sku": "G-9", "name": "Shears", "description": "Test", "price": "8", "category": "Garden"}\n'
+        )
+
+        response = client.post('/api/products/import/', {'file': upload}, format='multipart')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['imported'], 1)
+        self.assertTrue(Product.objects.filter(sku='G-9').exists())
+
+
+# -----------------------------------------
+# BULK INVENTORY UPDATES
+# -----------------------------------------
+
+class InventoryUpdateTests(TestCase):
+    """
+    PATCH /api/products/bulk/ applies absolute values and deltas
+    with set-based UPDATEs, rejects negative results and unknown ids,
+    and signals the whole batch once.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('stocker', 'stocker@example.com', 'password')
+        category = Category.objects.create(name='Warehouse')
+        cls.crate = make_product(category, 'Crate', price=Decimal('10.00'), stock_quantity=10)
+        cls.pallet = make_product(category, 'Pallet', price=Decimal('20.00'), stock_quantity=5)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def patch(self, entries):
+        response = self.client.patch('/api/products/bulk/', entries, format='json')
+        self.assertEqual(response.status_code, 200)
+        return response.data['results']
+
+    def test_absolute_values_and_deltas(self):
+        results = self.patch([
+            {'id': self.crate.pk, 'stock_quantity': 40, 'price': '9.99'},
+            {'id': self.pallet.pk, 'mode': 'delta', 'stock_quantity': -3, 'price': '1.50'},
+            {'id': self.pallet.pk, 'is_available': False},
+        ])
+
+        self.assertEqual([result['status'] for result in results], ['updated'] * 3)
+        self.crate.refresh_from_db()
+        self.pallet.refresh_from_db()
+        self.assertEqual((self.crate.stock_quantity, self.crate.price), (40, Decimal('9.99')))
+        self.assertEqual(
+            (self.pallet.stock_quantity, self.pallet.price, self.pallet.is_available),
+            (2, Decimal('21.50'), False)
+        )
+
+    def test_delta_after_set_folds_into_the_set(self):
+        apply_inventory_updates([
+            {'id': self.crate.pk, 'mode': 'set', 'stock_quantity': 7},
+            {'id': self.crate.pk, 'mode': 'delta', 'stock_quantity': 2},
+        ])
+        self.crate.refresh_from_db()
+        self.assertEqual(self.crate.stock_quantity, 9)
+
+    def test_negative_results_are_rejected(self):
+        results = self.patch([
+            {'id': self.crate.pk, 'mode': 'delta', 'stock_quantity': -11},
+            {'id': self.pallet.pk, 'price': '0'},
+        ])
+
+        self.assertEqual([result['status'] for result in results], ['invalid', 'invalid'])
+        self.assertIn('stock_quantity', results[0]['errors'])
+        self.assertIn('price', results[1]['errors'])
+        self.crate.refresh_from_db()
+        self.pallet.refresh_from_db()
+        self.assertEqual((self.crate.stock_quantity, self.pallet.price), (10, Decimal('20.00')))
+
+    def test_unknown_ids_and_invalid_entries(self):
+        results = self.patch([
+            {'id': 999999, 'stock_quantity': 1},
+            {'id': self.crate.pk},
+            {'id': self.pallet.pk, 'stock_quantity': 6},
+        ])
+
+        self.assertEqual(
+            [result['status'] for result in results], ['not_found', 'invalid', 'updated']
+        )
+        self.pallet.refresh_from_db()
+        self.assertEqual(self.pallet.stock_quantity, 6)
+
+    def test_one_signal_and_constant_queries_per_batch(self):
+        batches = []
+
+        def receiver(sender, product_ids, fields=None, **kwargs):
+            batches.append((sorted(product_ids), fields))
+
+        products_bulk_changed.connect(receiver)
+        self.addCleanup(products_bulk_changed.disconnect, receiver)
+
+        entries = [
+            {'id': self.crate.pk, 'mode': 'set', 'stock_quantity': 1},
+            {'id': self.pallet.pk, 'mode': 'delta', 'stock_quantity': 1},
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            apply_inventory_updates(entries)
+
+        self.assertEqual(
+            batches, [(sorted([self.crate.pk, self.pallet.pk]), ['stock_quantity', 'price', 'is_available'])]
+        )
+        updates = [query for query in queries if query['sql'].startswith('UPDATE "products_product"')]
+        self.assertEqual(len(updates), 1)
+
+
+# -----------------------------------------
+# CATALOG EXPORT
+# -----------------------------------------
+
+class ExportTests(TestCase):
+    """
+    Exports match the catalog row for row and are streamed
+    in chunks rather than built in memory.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('exporter', 'exporter@example.com', 'password')
+        cls.category = Category.objects.create(name='Stationery')
+        cls.products = [
+            make_product(cls.category, f'Notebook {number}', 'Lined, "A5"', sku=f'S-{number}',
+                         price=Decimal('3.25') + number, stock_quantity=number)
+            for number in range(5)
+        ]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def export(self, **params):
+        response = self.client.get('/api/products/export/', params)
+        self.assertEqual(response.status_code, 200)
+        self.assertIsInstance(response, StreamingHttpResponse)
+        return response, b''.join(response.streaming_content).decode('utf-8')
+
+    def test_csv_matches_the_catalog(self):
+        response, body = self.export(format='csv')
+
+        self.assertTrue(response['Content-Type'].startswith('text/csv'))
+        rows = list(csv.DictReader(io.StringIO(body)))
+        self.assertEqual(list(rows[0]), [column for column, _ in EXPORT_FIELDS])
+        self.assertEqual(
+            sorted((row['sku'], row['name'], row['price'], row['category'], row['description'])
+                   for row in rows),
+            sorted((product.sku, product.name, str(product.price), 'Stationery', 'Lined, "A5"')
+                   for product in self.products)
+        )
+
+    def test_jsonl_matches_the_catalog(self):
+        response, body = self.export(format='jsonl')
+
+        self.assertTrue(response['Content-Type'].startswith('application/x-ndjson'))
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual(
+            {row['id']: (row['stock_quantity'], row['category']) for row in rows},
+            {product.pk: (product.stock_quantity, 'Stationery') for product in self.products}
+        )
+
+    def test_filters_apply(self):
+        _, body = self.export(format='jsonl', in_stock='true', max_price='6')
+        self.assertEqual(
+            sorted(json.loads(line)['sku'] for line in body.splitlines()), ['S-1', 'S-2']
+        )
+
+    def test_rows_are_streamed_in_chunks(self):
+        with mock.patch('products.exporter.CHUNK_SIZE', 2):
+            response = self.client.get('/api/products/export/', {'format': 'jsonl'})
+            chunks = list(response.streaming_content)
+
+        self.assertEqual([chunk.count(b'\n') for chunk in chunks], [2, 2, 1])
+
+    def test_csv_header_is_sent_before_any_query(self):
+        chunks = iter_export(Product.objects.all(), 'csv')
+
+        with self.assertNumQueries(0):
+            header = next(chunks)
+        self.assertTrue(header.startswith('id,sku,name'))
+
+    def test_command_writes_the_same_rows(self):
+        out = StringIO()
+        call_command('export_products', '--format', 'jsonl', 'min_price=5', stdout=out)
+
+        self.assertEqual(
+            sorted(json.loads(line)['sku'] for line in out.getvalue().splitlines()),
+            ['S-2', 'S-3', 'S-4']
+        )
+
+
+# -----------------------------------------
+# IMAGE VARIANTS
+# -----------------------------------------
+
+def image_upload(name='photo.png', color='red'):
+    buffer = io.BytesIO()
+    Image.new('RGB', (40, 30), color).save(buffer, 'PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+
+class ImageVariantTests(TestCase):
+    """
+    Variant URLs come from the product's columns (no storage access),
+    and identical uploads share one set of variants.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Photos')
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def make_product(self, name, upload):
+        return make_product(self.category, name, image=upload)
+
+    def test_urls_point_to_the_original_until_variants_are_ready(self):
+        product = self.make_product('Lamp', image_upload())
+        self.assertEqual(len(product.image_hash), 64)
+
+        with mock.patch('products.thumbnails.os.path.exists', side_effect=AssertionError):
+            urls = variant_urls(product)
+        self.assertEqual(set(urls), {'160', '480', '1024'})
+        self.assertEqual(set(urls.values()), {product.image.url})
+
+        product.image_variants_hash = product.image_hash
+        with mock.patch('products.thumbnails.os.path.exists', side_effect=AssertionError):
+            urls = variant_urls(product)
+        self.assertEqual(
+            urls['480'],
+            f'/media/thumbnails/{product.image_hash[:2]}/{product.image_hash}_480.webp'
+        )
+
+    def test_serializer_reads_the_ready_flag(self):
+        product = self.make_product('Lamp', image_upload())
+        Product.objects.filter(pk=product.pk).update(image_variants_hash=product.image_hash)
+
+        response = self.client.get(f'/api/products/{product.pk}/', {'fields': 'image_variants'})
+        self.assertTrue(response.data['image_variants']['160'].endswith('_160.webp'))
+
+    def test_generation_marks_every_product_with_the_image(self):
+        first = self.make_product('Lamp', image_upload('a.png'))
+        second = self.make_product('Lamp shade', image_upload('b.png'))
+        other = self.make_product('Chair', image_upload('c.png', color='blue'))
+        self.assertEqual(first.image_hash, second.image_hash)
+        self.assertNotEqual(first.image_hash, other.image_hash)
+
+        render_variants(first.image.path, variant_targets(first.image_hash), get_format())
+        future = Future()
+        future.set_result([])
+        with mock.patch('products.thumbnails.connections.close_all'):
+            finish_variants(first.image_hash, future)
+
+        ready = dict(Product.objects.values_list('id', 'image_variants_hash'))
+        self.assertEqual(ready[first.pk], first.image_hash)
+        self.assertEqual(ready[second.pk], first.image_hash)
+        self.assertEqual(ready[other.pk], '')
+
+    def test_existing_variants_are_reused_without_rendering(self):
+        first = self.make_product('Lamp', image_upload('a.png'))
+        render_variants(first.image.path, variant_targets(first.image_hash), get_format())
+        second = self.make_product('Lamp shade', image_upload('b.png'))
+
+        with mock.patch('products.thumbnails.get_executor') as get_executor:
+            schedule_variants(second)
+
+        get_executor.assert_not_called()
+        second.refresh_from_db()
+        self.assertEqual(second.image_variants_hash, second.image_hash)
+
+    def test_missing_variants_are_rendered_in_the_pool(self):
+        product = self.make_product('Lamp', image_upload())
+
+        with mock.patch('products.thumbnails.get_executor') as get_executor:
+            with self.captureOnCommitCallbacks(execute=True):
+                product.save()
+
+        get_executor.return_value.submit.assert_called_once_with(
+            render_variants, product.image.path, variant_targets(product.image_hash), 'WEBP'
+        )
+        thumbnails._pending.discard(product.image_hash)
+
+    def test_clearing_the_image_clears_the_variants(self):
+        product = self.make_product('Lamp', image_upload())
+        product.image_variants_hash = product.image_hash
+        product.image = None
+        product.save()
+
+        product.refresh_from_db()
+        self.assertEqual((product.image_hash, product.image_variants_hash), ('', ''))
+        self.assertIsNone(variant_urls(product))
+
+
+# -----------------------------------------
+# AUTOCOMPLETE
+# -----------------------------------------
+
+class PrefixIndexTests(SimpleTestCase):
+    """
+    Word-prefix matching, score ranking and the entry cap.
+    """
+
+    def make_index(self, rows, max_entries=None):
+        index = PrefixIndex(max_entries=max_entries)
+        index.load(rows)
+        return index
+
+    def test_every_query_word_matches_a_word_prefix(self):
+        index = self.make_index([
+            (1, 'Blue chair', 5),
+            (2, 'Blue table', 9),
+            (3, 'Office chair', 7),
+            (4, 'Bluetooth speaker', 1),
+        ])
+
+        self.assertEqual([pk for pk, _, _ in index.search('blue ch')], [1])
+        self.assertEqual([pk for pk, _, _ in index.search('ch')], [3, 1])
+        self.assertEqual([pk for pk, _, _ in index.search('hair')], [])
+
+    def test_results_are_ranked_by_score_and_limited(self):
+        index = self.make_index([(pk, f'Lamp {pk}', score) for pk, score in [(1, 3), (2, 8), (3, 5)]])
+
+        self.assertEqual([pk for pk, _, _ in index.search('la')], [2, 3, 1])
+        self.assertEqual([pk for pk, _, _ in index.search('lamp', limit=2)], [2, 3])
+
+    def test_accents_and_case_are_ignored(self):
+        index = self.make_index([(1, 'Café Crème', 1)])
+        self.assertEqual([pk for pk, _, _ in index.search('CAFE cre')], [1])
+
+    def test_updates_expire_cached_short_prefixes(self):
+        index = self.make_index([(1, 'Mug', 1)])
+        self.assertEqual([pk for pk, _, _ in index.search('m')], [1])
+
+        index.add(2, 'Mat', 10)
+        self.assertEqual([pk for pk, _, _ in index.search('m')], [2, 1])
+
+        index.remove(2)
+        self.assertEqual([pk for pk, _, _ in index.search('m')], [1])
+        self.assertNotIn('mat', index.vocabulary)
+
+    def test_index_is_capped(self):
+        index = self.make_index([(pk, f'Item {pk}', 100 - pk) for pk in range(1, 6)], max_entries=3)
+        self.assertEqual(len(index), 3)
+        self.assertEqual([pk for pk, _, _ in index.search('item')], [1, 2, 3])
+
+        # Full: new entries wait for the next reload
+        index.add(9, 'Item 9', 1000)
+        self.assertEqual(len(index), 3)
+
+
+class AutocompleteTests(TestCase):
+    """
+    The per-process index: loaded from the database on first use
+    (most reviewed products, up to the cap), kept current by this
+    process's signals and reloaded after the rebuild interval.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Seating')
+        cls.stool = make_product(cls.category, 'Bar stool', review_count=2)
+        cls.sofa = make_product(cls.category, 'Sofa', review_count=9)
+        cls.hidden = make_product(cls.category, 'Stowaway stool', is_available=False)
+
+    def setUp(self):
+        # A fresh index per test: never one loaded from another test's rows
+        patcher = mock.patch('products.autocomplete._autocomplete', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def suggest(self, query):
+        response = self.client.get('/api/products/autocomplete/', {'q': query})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_suggestions(self):
+        data = self.suggest('s')
+        self.assertEqual([product['id'] for product in data['products']], [self.sofa.pk, self.stool.pk])
+        self.assertEqual(data['categories'], [
+            {'id': self.category.pk, 'name': 'Seating', 'product_count': 3}
+        ])
+
+    def test_lookups_run_no_query_once_loaded(self):
+        self.suggest('sofa')
+        with self.assertNumQueries(0):
+            self.suggest('bar st')
+
+    def test_local_saves_apply_immediately(self):
+        self.suggest('sofa')
+
+        self.sofa.name = 'Couch'
+        self.sofa.save()
+        self.hidden.is_available = True
+        self.hidden.save()
+
+        self.assertEqual([product['name'] for product in self.suggest('couch')['products']], ['Couch'])
+        self.assertEqual(self.suggest('sofa')['products'], [])
+        self.assertEqual(len(self.suggest('stool')['products']), 2)
+
+    def test_other_writes_show_up_after_the_rebuild_interval(self):
+        autocomplete = get_autocomplete()
+        self.suggest('sofa')
+        # Bypasses signals, like a write made by another process
+        Product.objects.filter(pk=self.sofa.pk).update(name='Couch')
+
+        with mock.patch('products.autocomplete.time.monotonic', return_value=autocomplete.loaded_at + 299):
+            self.assertEqual(self.suggest('couch')['products'], [])
+
+        with mock.patch('products.autocomplete.time.monotonic', return_value=autocomplete.loaded_at + 301):
+            self.assertEqual(len(self.suggest('couch')['products']), 1)
+
+    @override_settings(PRODUCT_AUTOCOMPLETE_MAX_PRODUCTS=1)
+    def test_the_most_reviewed_products_fill_the_cap(self):
+        self.assertEqual([product['id'] for product in self.suggest('s')['products']], [self.sofa.pk])
+
+
+# -----------------------------------------
+# REVIEWS
+# -----------------------------------------
+
+class ReviewEndpointTests(TestCase):
+    """
+    Reviews are cursor-paginated and filterable by rating;
+    a second review by the same user is a 409 that leaves the
+    surrounding transaction usable.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Games')
+        cls.product = make_product(cls.category, 'Chess set')
+        cls.users = User.objects.bulk_create([
+            User(username=f'player{number}') for number in range(12)
+        ])
+        cls.reviews = [
+            Review.objects.create(product=cls.product, user=user, rating=number % 5 + 1)
+            for number, user in enumerate(cls.users)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def url(self):
+        return f'/api/products/{self.product.pk}/reviews/'
+
+    def test_keyset_pages_cover_every_review_once(self):
+        response = self.client.get(self.url())
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('count', response.data)
+        seen = [review['id'] for review in response.data['results']]
+
+        while response.data['next']:
+            response = self.client.get(response.data['next'])
+            seen += [review['id'] for review in response.data['results']]
+
+        # Newest first; created_at ties fall back to id
+        expected = sorted(self.reviews, key=lambda review: (review.created_at, review.pk), reverse=True)
+        self.assertEqual(seen, [review.pk for review in expected])
+
+    def test_rating_filter(self):
+        response = self.client.get(self.url(), {'rating': '4,5', 'ordering': '-rating'})
+        ratings = [review['rating'] for review in response.data['results']]
+        self.assertEqual(ratings, sorted(ratings, reverse=True))
+        self.assertEqual(set(ratings), {4, 5})
+        self.assertEqual(len(ratings), 4)
+
+        self.assertEqual(self.client.get(self.url(), {'rating': '6'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url(), {'rating': 'good'}).status_code, 400)
+
+    def test_duplicate_review_is_a_conflict(self):
+        client = APIClient()
+        client.force_authenticate(self.users[0])
+        Product.objects.filter(pk=self.product.pk).update(review_count=12)
+
+        response = client.post(
+            f'/api/products/{self.product.pk}/add_review/', {'rating': 1}, format='json'
+        )
+
+        self.assertEqual(response.status_code, 409)
+        # The test transaction is still usable and nothing changed
+        self.assertEqual(Review.objects.filter(product=self.product).count(), 12)
+        self.assertEqual(Product.objects.get(pk=self.product.pk).review_count, 12)
+
+        other = make_product(self.category, 'Checkers')
+        response = client.post(f'/api/products/{other.pk}/add_review/', {'rating': 4}, format='json')
+        self.assertEqual(response.status_code, 201)
+
+
+# -----------------------------------------
+# FREQUENTLY BOUGHT TOGETHER
+# -----------------------------------------
+
+class CoPurchaseTests(TestCase):
+    """
+    Top-K neighbours from order co-occurrence; incremental runs
+    match a full build, and a full rebuild never empties the table.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('buyer', 'buyer@example.com', 'password')
+        category = Category.objects.create(name='Coffee')
+        cls.beans, cls.grinder, cls.filters, cls.mug = [
+            make_product(category, name) for name in ('Beans', 'Grinder', 'Filters', 'Mug')
+        ]
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def order(self, *products, status='paid'):
+        order = Order.objects.create(user=self.user, status=status)
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=product, price_at_purchase=product.price)
+            for product in products
+        ])
+        return order
+
+    def table(self):
+        return list(
+            FrequentlyBoughtTogether.objects.order_by('product_id', 'rank')
+            .values_list('product_id', 'related_id', 'co_count', 'rank')
+        )
+
+    def neighbours(self, product):
+        return list(
+            FrequentlyBoughtTogether.objects.filter(product=product).order_by('rank')
+            .values_list('related_id', 'co_count')
+        )
+
+    def test_top_k_counts(self):
+        self.order(self.beans, self.grinder)
+        self.order(self.beans, self.grinder, self.filters)
+        self.order(self.beans, self.filters)
+        self.order(self.beans, self.mug)
+        self.order(self.grinder, self.mug, status='cancelled')
+
+        CoPurchaseBuilder(directory=self.directory, top_k=2).run()
+
+        # Grinder and filters tie (2 of their 2 counted orders): lowest id first
+        self.assertEqual(
+            self.neighbours(self.beans), [(self.grinder.pk, 2), (self.filters.pk, 2)]
+        )
+        self.assertEqual(self.neighbours(self.mug), [(self.beans.pk, 1)])
+        self.assertEqual(
+            self.neighbours(self.grinder), [(self.beans.pk, 2), (self.filters.pk, 1)]
+        )
+
+    def test_incremental_runs_match_a_full_build(self):
+        builder = CoPurchaseBuilder(directory=self.directory)
+        self.order(self.beans, self.grinder)
+        self.order(self.mug, self.filters)
+        builder.run()
+
+        self.order(self.beans, self.mug)
+        self.order(self.grinder, self.filters, self.beans)
+        report = builder.run()
+        self.assertEqual(report['orders'], 2)
+        incremental = self.table()
+
+        fresh = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, fresh, ignore_errors=True)
+        CoPurchaseBuilder(directory=fresh).run(full=True)
+
+        self.assertEqual(self.table(), incremental)
+
+    def test_full_rebuild_replaces_rows_batch_by_batch(self):
+        self.order(self.beans, self.grinder)
+        self.order(self.filters, self.mug)
+        builder = CoPurchaseBuilder(directory=self.directory)
+        builder.run()
+        # Stale row for a pair that no order supports any more
+        FrequentlyBoughtTogether.objects.filter(product=self.mug).update(co_count=99)
+        OrderItem.objects.filter(product=self.mug).delete()
+
+        sizes = []
+        bulk_create = FrequentlyBoughtTogether.objects.bulk_create
+
+        def record_size(*args, **kwargs):
+            sizes.append(FrequentlyBoughtTogether.objects.count())
+            return bulk_create(*args, **kwargs)
+
+        builder.write_batch_size = 1
+        with mock.patch.object(FrequentlyBoughtTogether.objects, 'bulk_create', record_size):
+            builder.run(full=True)
+
+        self.assertNotIn(0, sizes)
+        self.assertEqual(self.neighbours(self.mug), [])
+        self.assertEqual(self.neighbours(self.filters), [])
+        self.assertEqual(self.neighbours(self.beans), [(self.grinder.pk, 1)])
+
+
+# -----------------------------------------
+# SIMILAR PRODUCTS
+# -----------------------------------------
+
+class SimilarityIndexTests(TestCase):
+    """
+    TF-IDF neighbours ranked by shared terms; a delta build gives the
+    same answers as a full build, and processes pick up new builds.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        knitwear = Category.objects.create(name='Knitwear')
+        garden = Category.objects.create(name='Garden')
+        cls.scarf = make_product(knitwear, 'Merino wool scarf', 'Soft and warm')
+        cls.long_scarf = make_product(knitwear, 'Long merino wool scarf', 'Extra long')
+        cls.socks = make_product(knitwear, 'Wool socks', 'Pair of socks')
+        cls.hose = make_product(garden, 'Hose reel', 'Twenty metres')
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        settings_override = override_settings(RECOMMENDATIONS_DIR=self.root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        # No index loaded by another test
+        for name in ('_index', '_index_key'):
+            patcher = mock.patch(f'products.similarity.{name}', None)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.builder = SimilarityIndexBuilder(n_features=2 ** 12)
+
+    def ranked(self, product):
+        product = Product.objects.select_related('category').get(pk=product.pk)
+        ids, scores = next(similar_products(get_similarity_index(), product, k=10))
+        return ids.tolist(), scores.tolist()
+
+    def test_neighbours_are_ranked_by_shared_terms(self):
+        self.builder.build()
+
+        ids, scores = self.ranked(self.scarf)
+        self.assertEqual(ids, [self.long_scarf.pk, self.socks.pk])
+        self.assertGreater(scores[0], scores[1])
+
+        response = self.client.get(f'/api/products/{self.scarf.pk}/similar/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [product['id'] for product in response.data],
+            [self.long_scarf.pk, self.socks.pk]
+        )
+
+    def test_delta_build_matches_a_full_build(self):
+        self.builder.build()
+        # Swapping two products' texts keeps every document frequency
+        # (and so the IDF the delta reuses) identical to a fresh full build
+        texts = {
+            self.long_scarf: (self.socks.name, self.socks.description),
+            self.socks: (self.long_scarf.name, self.long_scarf.description),
+        }
+        for product, (name, description) in texts.items():
+            product.name, product.description = name, description
+            product.save()
+
+        report = self.builder.build_delta()
+        self.assertEqual(report['products'], 2)
+        delta = self.ranked(self.scarf)
+
+        self.builder.build()
+        full = self.ranked(self.scarf)
+
+        self.assertEqual(delta[0], full[0])
+        self.assertEqual(delta[0], [self.socks.pk, self.long_scarf.pk])
+        for delta_score, full_score in zip(delta[1], full[1]):
+            self.assertAlmostEqual(delta_score, full_score, places=5)
+
+    def test_processes_reload_memory_mapped_builds(self):
+        self.assertIsNone(get_similarity_index())
+        self.builder.build()
+
+        index = get_similarity_index()
+        self.assertIsInstance(index.data, np.memmap)
+        self.assertIs(get_similarity_index(), index)
+
+        shawl = make_product(self.scarf.category, 'Merino wool shawl', 'Wide')
+        self.builder.build_delta()
+        self.assertIsNot(get_similarity_index(), index)
+        self.assertIn(shawl.pk, self.ranked(self.scarf)[0])
+
+        self.builder.build()
+        rebuilt = get_similarity_index()
+        self.assertIsInstance(rebuilt.data, np.memmap)
+        self.assertIn(shawl.pk, rebuilt.base_ids.tolist())
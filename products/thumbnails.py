@@ -0,0 +1,173 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import connections
+from django.db.models import F
+
+from .imaging import hash_stream, render_variants
+from .models import Product
+
+
+# Longest side, in pixels, of each generated variant
+DEFAULT_SIZES = (160, 480, 1024)
+
+# Variants live in MEDIA_ROOT/thumbnails/ab/<sha256>_<size>.<ext>,
+# so identical uploads share files and URLs never go stale.
+THUMBNAIL_DIR = 'thumbnails'
+
+EXTENSIONS = {'WEBP': 'webp', 'JPEG': 'jpg'}
+
+
+def get_sizes():
+    return tuple(sorted(getattr(settings, 'PRODUCT_THUMBNAIL_SIZES', DEFAULT_SIZES)))
+
+
+def get_format():
+    return getattr(settings, 'PRODUCT_THUMBNAIL_FORMAT', 'WEBP').upper()
+
+
+def content_hash(file):
+    """
+    SHA-256 of an uploaded file's content.
+    """
+    file.seek(0)
+    digest = hash_stream(file)
+    file.seek(0)
+    return digest
+
+
+def variant_name(digest, size):
+    extension = EXTENSIONS[get_format()]
+    return f'{THUMBNAIL_DIR}/{digest[:2]}/{digest}_{size}.{extension}'
+
+
+def variant_targets(digest):
+    return [
+        (size, os.path.join(settings.MEDIA_ROOT, variant_name(digest, size)))
+        for size in get_sizes()
+    ]
+
+
+def variants_exist(digest):
+    # The largest variant is written last
+    return os.path.exists(variant_targets(digest)[-1][1])
+
+
+def source_path(product):
+    """
+    Filesystem path of the original upload, or None
+    (no image, or a storage without local paths).
+    """
+    if not product.image:
+        return None
+    try:
+        return product.image.path
+    except NotImplementedError:
+        return None
+
+
+# -----------------------------------------
+# BACKGROUND GENERATION
+# -----------------------------------------
+
+_executor = None
+_pending = set()
+
+
+def get_executor():
+    """
+    Process pool shared by this server process.
+    'spawn' workers only import Pillow (see imaging.py),
+    never Django or the parent's database connections.
+    """
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=getattr(settings, 'PRODUCT_THUMBNAIL_WORKERS', 2),
+            mp_context=multiprocessing.get_context('spawn')
+        )
+    return _executor
+
+
+def schedule_variants(product):
+    """
+    Generates the product's variants in the process pool.
+    Returns immediately; does nothing if they are queued.
+
+    An image whose variants are already on disk (the same file
+    uploaded for another product) is marked ready right away.
+    """
+    digest = product.image_hash
+    path = source_path(product)
+    if not digest or path is None or digest in _pending:
+        return
+
+    if variants_exist(digest):
+        mark_variants_ready([digest])
+        return
+
+    _pending.add(digest)
+    future = get_executor().submit(render_variants, path, variant_targets(digest), get_format())
+    future.add_done_callback(lambda future: finish_variants(digest, future))
+
+
+def finish_variants(digest, future):
+    """
+    Done-callback of a pool task; runs in the executor's thread,
+    so it closes the database connection it opens.
+    """
+    _pending.discard(digest)
+    if future.cancelled() or future.exception() is not None:
+        return
+    try:
+        mark_variants_ready([digest])
+    finally:
+        connections.close_all()
+
+
+def mark_variants_ready(digests):
+    """
+    Records that the variants of these image hashes exist, on every
+    product showing one of those images, with one UPDATE.
+    Returns the ids of the products that changed.
+    """
+    # Imported here: the signals module imports this one
+    from .signals import products_bulk_changed
+
+    products = Product.objects.filter(image_hash__in=list(digests)).exclude(
+        image_variants_hash=F('image_hash')
+    )
+    product_ids = list(products.values_list('id', flat=True))
+    if product_ids:
+        Product.objects.filter(id__in=product_ids).update(image_variants_hash=F('image_hash'))
+        products_bulk_changed.send(
+            sender=Product, product_ids=product_ids, fields=['image_variants_hash']
+        )
+    return product_ids
+
+
+def variant_urls(product, request=None):
+    """
+    {size: url} for the product's thumbnails.
+
+    Built from the product's columns only (no storage access):
+    until the variants of the current image are marked ready,
+    every size points to the original image instead.
+    """
+    if not product.image or not product.image_hash:
+        return None
+
+    if product.image_variants_hash == product.image_hash:
+        urls = {
+            str(size): default_storage.url(variant_name(product.image_hash, size))
+            for size in get_sizes()
+        }
+    else:
+        urls = {str(size): product.image.url for size in get_sizes()}
+
+    if request is not None:
+        urls = {size: request.build_absolute_uri(url) for size, url in urls.items()}
+    return urls
@@ -1,34 +1,70 @@
-from rest_framework import viewsets, filters, status
+from rest_framework import viewsets, status
 from rest_framework.decorators import action
+from rest_framework.generics import get_object_or_404
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticatedOrReadOnly, IsAuthenticated
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Q
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max
+from django.http import StreamingHttpResponse
+
+from categories.models import Category
+from categories.registry import get_category_registry
+from ecommerce_api.cache import CachedResponseMixin, cache_response
+from ecommerce_api.conditional import ConditionalGetMixin
+from ecommerce_api.pagination import OptionalCursorPagination
 
 from .models import Product, Review
-from .serializers import ProductSerializer, ProductCreateUpdateSerializer, ReviewSerializer
-from .filters import ProductFilter
+from .serializers import (
+    ProductSerializer, ProductCreateUpdateSerializer, ReviewSerializer,
+    InventoryUpdateSerializer
+)
+from .filters import ProductFilter, ProductSearchFilter, ProductOrderingFilter
+from .pagination import ReviewPagination
+from .search import get_search_backend
+from .facets import get_facets
+from .autocomplete import get_autocomplete
+from .similarity import get_similarity_index, similar_products
+from .importer import FORMATS, ProductImporter, detect_format
+from .inventory import apply_inventory_updates
+from .exporter import CONTENT_TYPES, iter_export
+from .renderers import CSVRenderer, JSONLinesRenderer
 
 
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(ConditionalGetMixin, CachedResponseMixin, viewsets.ModelViewSet):
     """
     Main viewset for managing products.
 
     Features:
     - CRUD operations
-    - Search (name, description, category)
+    - Full-text search (name, description, category), ranked by relevance
     - Filtering (price range, category, availability)
     - Ordering (price, name, date created)
+    - Pagination by page number, or by cursor with ?pagination=cursor
+    - Anonymous list/retrieve/reviews responses are cached
+    - ETag / Last-Modified on list and retrieve (304 when unchanged)
+    - Sparse fieldsets (?fields=id,name,price or ?omit=description)
     """
     queryset = Product.objects.select_related('category', 'created_by').all()
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, ProductSearchFilter, ProductOrderingFilter]
     filterset_class = ProductFilter
     permission_classes = [IsAuthenticatedOrReadOnly]
 
     search_fields = ['name', 'description', 'category__name']
-    ordering_fields = ['price', 'name', 'created_date', 'stock_quantity']
+    ordering_fields = ['price', 'name', 'created_date', 'stock_quantity', 'avg_rating']
     ordering = ['-created_date']
 
+    # Cursor pagination only supports orderings backed by an index
+    pagination_class = OptionalCursorPagination
+    cursor_ordering_fields = ['created_date', 'price', 'name', 'avg_rating']
+
+    # Cached responses are invalidated when any of these change
+    cache_models = (
+        'products.Product', 'products.Review', 'categories.Category',
+        'products.FrequentlyBoughtTogether',
+    )
+
     def get_serializer_class(self):
         """
         Use a smaller serializer for create/update,
@@ -38,12 +74,60 @@ class ProductViewSet(viewsets.ModelViewSet):
             return ProductCreateUpdateSerializer
         return ProductSerializer
 
+    def get_queryset(self):
+        """
+        For reads, only load the columns/joins needed by the
+        fields picked with ?fields= / ?omit=.
+        """
+        queryset = super().get_queryset()
+        if self.get_serializer_class() is not ProductSerializer:
+            return queryset
+
+        fields = ProductSerializer.selected_fields(self.request.query_params)
+        return ProductSerializer.prune_queryset(queryset, fields)
+
     def perform_create(self, serializer):
         """
         Automatically attach the user who created the product.
         """
         serializer.save(created_by=self.request.user)
 
+    # -----------------------------------------
+    # CONDITIONAL GET VALIDATORS
+    # -----------------------------------------
+
+    def get_list_validators(self, queryset):
+        """
+        MAX(updated_date) + COUNT(*) over the filtered products
+        (a create/update bumps the max, a delete changes the count),
+        plus the newest category change since every product
+        shows its category name.
+        """
+        products = queryset.order_by().aggregate(
+            last=Max('updated_date'), count=Count('id')
+        )
+        categories_last = Category.objects.aggregate(last=Max('updated_at'))['last']
+
+        last_modified = max(
+            (value for value in (products['last'], categories_last) if value),
+            default=None
+        )
+        return last_modified, (products['last'], products['count'], categories_last)
+
+    def get_object_validators(self):
+        try:
+            row = (
+                Product.objects.filter(pk=self.kwargs[self.lookup_field])
+                .values_list('updated_date', 'category__updated_at')
+                .first()
+            )
+        except (TypeError, ValueError):
+            row = None
+
+        if row is None:
+            return None  # let retrieve() answer 404
+        return max(row), row
+
     # -----------------------------------------
     # CUSTOM ENDPOINTS
     # -----------------------------------------
@@ -53,7 +137,7 @@ class ProductViewSet(viewsets.ModelViewSet):
         """
         Advanced search endpoint.
         Supports multiple query parameters:
-        - q (text search)
+        - q (full-text search, results ranked by relevance)
         - category
         - min_price
         - max_price
@@ -62,15 +146,14 @@ class ProductViewSet(viewsets.ModelViewSet):
         products = self.get_queryset()
 
         if query:
-            products = products.filter(
-                Q(name__icontains=query) |
-                Q(description__icontains=query) |
-                Q(category__name__icontains=query)
-            )
+            products = get_search_backend().search(products, query)
 
         category = request.query_params.get("category")
         if category:
-            products = products.filter(category__name__iexact=category)
+            # The category and its subcategories
+            products = products.filter(
+                category_id__in=get_category_registry().subtree_ids(category)
+            )
 
         min_price = request.query_params.get("min_price")
         if min_price:
@@ -90,7 +173,8 @@ class ProductViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def by_category(self, request):
         """
-        Get all products belonging to a specific category.
+        Get all products belonging to a specific category
+        or one of its subcategories.
         Example: /products/by_category/?name=Electronics
         """
         category_name = request.query_params.get("name")
@@ -99,7 +183,9 @@ class ProductViewSet(viewsets.ModelViewSet):
             return Response({"error": "Category name is required."},
                             status=status.HTTP_400_BAD_REQUEST)
 
-        products = self.get_queryset().filter(category__name__iexact=category_name)
+        products = self.get_queryset().filter(
+            category_id__in=get_category_registry().subtree_ids(category_name)
+        )
 
         page = self.paginate_queryset(products)
         if page is not None:
@@ -115,10 +201,7 @@ class ProductViewSet(viewsets.ModelViewSet):
         - Are marked as available
         - Have stock greater than 0
         """
-        products = self.get_queryset().filter(
-            is_available=True,
-            stock_quantity__gt=0
-        )
+        products = self.get_queryset().purchasable()
 
         page = self.paginate_queryset(products)
         if page is not None:
@@ -126,40 +209,308 @@ class ProductViewSet(viewsets.ModelViewSet):
             return self.get_paginated_response(serializer.data)
 
         return Response(self.get_serializer(products, many=True).data)
-    
+
+    @action(
+        detail=False,
+        methods=['get'],
+        permission_classes=[IsAuthenticated],
+        renderer_classes=[CSVRenderer, JSONLinesRenderer]
+    )
+    def export(self, request):
+        """
+        Streams the whole (filtered) catalog in one response.
+        GET /api/products/export/?format=csv
+        GET /api/products/export/?format=jsonl&in_stock=true
+
+        Accepts the same filters as the list endpoint. Rows are read
+        with .values_list().iterator(), so memory stays flat and the
+        first bytes go out before the full result is fetched.
+        """
+        file_format = request.accepted_renderer.format
+        products = self.filter_queryset(self.get_queryset())
+
+        response = StreamingHttpResponse(
+            iter_export(products, file_format),
+            content_type=CONTENT_TYPES[file_format]
+        )
+        response['Content-Disposition'] = f'attachment; filename="products.{file_format}"'
+        return response
+
+    @action(detail=False, methods=['get'])
+    def facets(self, request):
+        """
+        Sidebar counts for the current filters, in one response:
+        - per-category counts
+        - price histogram buckets
+        - total / in-stock / available counts
+
+        Accepts the same parameters as the list endpoint.
+        Example: /products/facets/?search=phone&max_price=500
+        """
+        products = self.filter_queryset(self.get_queryset())
+        return Response(get_facets(products, request.query_params))
+
     @action(detail=True, methods=['get'])
+    @cache_response
+    def frequently_bought_together(self, request, pk=None):
+        """
+        Products most often bought in the same order as this one,
+        strongest first (see the build_copurchases command).
+        GET /api/products/{id}/frequently_bought_together/?limit=5
+
+        Reads the precomputed neighbours with one indexed lookup
+        on (product, rank); unavailable products are skipped.
+        """
+        product = self.get_object()
+        try:
+            limit = min(max(int(request.query_params.get('limit', 10)), 1), 20)
+        except ValueError:
+            limit = 10
+
+        related = (
+            self.get_queryset()
+            .filter(
+                bought_together_with__product_id=product.pk,
+                is_available=True
+            )
+            .annotate(
+                bought_together_rank=F('bought_together_with__rank'),
+                bought_together_score=F('bought_together_with__score')
+            )
+            .order_by('bought_together_rank')[:limit]
+        )
+
+        serializer = self.get_serializer(related, many=True)
+        results = serializer.data
+        for item, row in zip(results, related):
+            item['score'] = round(row.bought_together_score, 4)
+        return Response(results)
+
+    @action(detail=True, methods=['get'])
+    def similar(self, request, pk=None):
+        """
+        Products with the most similar name, category and description
+        (TF-IDF cosine similarity), most similar first.
+        GET /api/products/{id}/similar/?limit=5&in_stock=true
+
+        Works for products added after the last index build too,
+        since the query vector is computed from the product itself.
+        """
+        # Only the text columns; ?fields= applies to the results
+        product = get_object_or_404(
+            Product.objects.select_related('category')
+            .only('id', 'name', 'description', 'category__name'),
+            pk=pk
+        )
+        index = get_similarity_index()
+        if index is None:
+            return Response(
+                {"detail": "The similarity index has not been built yet."},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
+
+        try:
+            limit = min(max(int(request.query_params.get('limit', 10)), 1), 50)
+        except ValueError:
+            limit = 10
+
+        products = self.get_queryset()
+        if request.query_params.get('in_stock', '').lower() in ('1', 'true', 'yes'):
+            products = products.purchasable()
+        else:
+            products = products.filter(is_available=True)
+
+        # Candidates come from the index; the database only
+        # drops deleted / unavailable / out-of-stock ones
+        ranked = []
+        for ids, scores in similar_products(index, product, k=limit):
+            found = products.in_bulk(ids.tolist())
+            ranked = [
+                (found[pk], score)
+                for pk, score in zip(ids.tolist(), scores.tolist()) if pk in found
+            ]
+            if len(ranked) >= limit:
+                break
+        ranked = ranked[:limit]
+
+        serializer = self.get_serializer([item for item, _ in ranked], many=True)
+        results = serializer.data
+        for item, (_, score) in zip(results, ranked):
+            item['score'] = round(score, 4)
+        return Response(results)
+
+    @action(detail=False, methods=['get'])
+    def autocomplete(self, request):
+        """
+        Typeahead suggestions from the in-memory name index
+        (no database query per keystroke).
+
+        Every word of `q` is matched as a word prefix;
+        products are ranked by review count.
+        Example: /products/autocomplete/?q=blue ch&limit=5
+        """
+        query = request.query_params.get('q', '').strip()
+        try:
+            limit = min(max(int(request.query_params.get('limit', 10)), 1), 20)
+        except ValueError:
+            limit = 10
+
+        suggestions = get_autocomplete().suggest(query, limit=limit)
+        return Response({'query': query, **suggestions})
+
+    @action(detail=True, methods=['get'])
+    @cache_response
     def reviews(self, request, pk=None):
         """
-        Returns all reviews for a specific product.
+        Returns the reviews of a specific product, cursor-paginated.
         GET /api/products/{id}/reviews/
+
+        - ?rating=5 or ?rating=4,5 → only these star ratings
+        - ?ordering=-rating / rating / created_at (default -created_at)
         """
         product = self.get_object()
-        reviews = product.reviews.all()
-        serializer = ReviewSerializer(reviews, many=True)
-        return Response(serializer.data)
+        reviews = (
+            Review.objects.filter(product_id=product.pk)
+            .select_related('user')
+            .only('id', 'rating', 'comment', 'created_at', 'user__username')
+        )
 
+        rating = request.query_params.get('rating')
+        if rating:
+            try:
+                ratings = {int(value) for value in rating.split(',') if value.strip()}
+            except ValueError:
+                ratings = None
+            if not ratings or not ratings <= {1, 2, 3, 4, 5}:
+                return Response(
+                    {"rating": "Use one or more ratings from 1 to 5, e.g. ?rating=4,5."},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            reviews = reviews.filter(rating__in=ratings)
+
+        paginator = ReviewPagination()
+        page = paginator.paginate_queryset(reviews, request, view=self)
+        serializer = ReviewSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
 
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
     def add_review(self, request, pk=None):
         """
         Allows an authenticated user to submit a review for a product.
         POST /api/products/{id}/add_review/
+
+        The product's rating aggregates are updated
+        in the same transaction as the review insert.
+        Returns the created review, or 409 if the user
+        has already reviewed this product.
         """
         product = self.get_object()
 
         serializer = ReviewSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
+        rating = serializer.validated_data['rating']
 
-        # Create review linked to user and product
-        Review.objects.create(
-            product=product,
-            user=request.user,
-            rating=serializer.validated_data['rating'],
-            comment=serializer.validated_data.get('comment', '')
-        )
+        try:
+            with transaction.atomic():
+                # Create review linked to user and product
+                review = Review.objects.create(
+                    product=product,
+                    user=request.user,
+                    rating=rating,
+                    comment=serializer.validated_data.get('comment', '')
+                )
+
+                Product.objects.filter(pk=product.pk).update(
+                    **Product.rating_stats_update(rating)
+                )
+        except IntegrityError:
+            # unique_together (product, user)
+            return Response(
+                {"detail": "You have already reviewed this product."},
+                status=status.HTTP_409_CONFLICT
+            )
 
         return Response(
-            {"message": "Review added successfully"},
+            ReviewSerializer(review).data,
             status=status.HTTP_201_CREATED
         )
 
+    @action(
+        detail=False,
+        methods=['post'],
+        url_path='import',
+        permission_classes=[IsAuthenticated],
+        parser_classes=[MultiPartParser]
+    )
+    def import_products(self, request):
+        """
+        Bulk import from an uploaded CSV or JSON Lines file.
+        POST /api/products/import/   (multipart, field "file")
+
+        The format comes from the file extension, or the
+        "file_format" form field (csv / jsonl).
+        Rows are upserted on `sku` and categories are given by name.
+        Returns counts, per-row errors and rows/sec.
+        """
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({"error": "A file is required."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        file_format = request.data.get('file_format') or detect_format(upload.name)
+        if file_format not in FORMATS:
+            return Response({"error": f"file_format must be one of: {', '.join(FORMATS)}."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        report = ProductImporter(user=request.user).run(upload, file_format)
+        return Response(report, status=status.HTTP_200_OK)
+
+    @action(
+        detail=False,
+        methods=['patch'],
+        url_path='bulk',
+        permission_classes=[IsAuthenticated]
+    )
+    def bulk_inventory(self, request):
+        """
+        Bulk stock / price / availability update for inventory sync.
+        PATCH /api/products/bulk/
+
+        [
+          {"id": 1, "stock_quantity": 40, "price": "9.99"},
+          {"id": 2, "mode": "delta", "stock_quantity": -3},
+          {"id": 3, "is_available": false}
+        ]
+
+        All entries are applied in one transaction with set-based
+        UPDATEs. Returns one result per entry, in request order.
+        """
+        if not isinstance(request.data, list):
+            return Response({"error": "Expected a list of updates."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        valid = []
+        invalid = {}
+        for index, entry in enumerate(request.data):
+            serializer = InventoryUpdateSerializer(data=entry)
+            if serializer.is_valid():
+                valid.append(serializer.validated_data)
+            else:
+                invalid[index] = serializer.errors
+
+        results = apply_inventory_updates(valid) if valid else {}
+
+        response = []
+        valid_entries = iter(valid)
+        for index, entry in enumerate(request.data):
+            if index in invalid:
+                response.append({
+                    'id': entry.get('id') if isinstance(entry, dict) else None,
+                    'status': 'invalid',
+                    'errors': invalid[index],
+                })
+            else:
+                response.append(results[next(valid_entries)['id']])
+
+        return Response({'results': response}, status=status.HTTP_200_OK)
+
@@ -4,18 +4,25 @@ from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
 
 from .models import Wishlist, Product
-from .serializers import WishlistSerializer
+from .serializers import WishlistSerializer, ProductSerializer
 
 
 class WishlistView(generics.ListAPIView):
     """
     Returns all products in the user's wishlist.
+    Supports ?product_fields= / ?product_omit= for product_details.
     """
     serializer_class = WishlistSerializer
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        return Wishlist.objects.filter(user=self.request.user)
+        fields = ProductSerializer.selected_fields(self.request.query_params, nested=True)
+        return ProductSerializer.prune_queryset(
+            Wishlist.objects.filter(user=self.request.user),
+            fields,
+            prefix='product__',
+            keep=['id', 'user', 'product', 'created_at']
+        )
 
 
 class AddToWishlistView(generics.CreateAPIView):